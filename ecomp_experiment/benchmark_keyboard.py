@@ -0,0 +1,126 @@
+"""Compare the timestamps of key presses from psychopy.event and psychtoolbox.
+
+Each key press is collected through both paths at once: ``psychopy.event.waitKeys``
+(the "keyboard" INPUT_BACKEND) timestamps it when the event loop processes it,
+and the psychtoolbox keyboard queue (the "psychtoolbox" INPUT_BACKEND) timestamps
+it when it arrives from the device. Both response times are relative to the flip
+of a prompt, as in the experiment. The difference between the two shows the
+additional latency of the event loop, and its standard deviation the additional
+jitter.
+
+Run from the root of the repository, then press a key on each prompt::
+
+    python -m ecomp_experiment.benchmark_keyboard --n-presses 50
+
+"""
+
+import numpy as np
+
+
+def summarize_latencies(event_rts, ptb_rts):
+    """Summarize the latency of event timestamps relative to psychtoolbox ones.
+
+    Parameters
+    ----------
+    event_rts, ptb_rts : array-like, shape(n_presses,)
+        The response times in seconds of the same key presses, from
+        ``psychopy.event`` and from the psychtoolbox keyboard queue.
+
+    Returns
+    -------
+    summary : dict
+        Contains the keys "n_presses", "mean_ms", "sd_ms", "min_ms", "max_ms"
+        of the differences ``event_rts - ptb_rts`` in milliseconds.
+    """
+    latencies_ms = (np.asarray(event_rts) - np.asarray(ptb_rts)) * 1000
+    summary = dict(
+        n_presses=latencies_ms.size,
+        mean_ms=latencies_ms.mean(),
+        sd_ms=latencies_ms.std(ddof=1) if latencies_ms.size > 1 else np.nan,
+        min_ms=latencies_ms.min(),
+        max_ms=latencies_ms.max(),
+    )
+    return summary
+
+
+def run_benchmark(n_presses, monitor_name):
+    """Collect key presses through both paths.
+
+    Parameters
+    ----------
+    n_presses : int
+        The number of key presses to collect.
+    monitor_name : str
+        The name of the psychopy monitor profile to open a window on.
+
+    Returns
+    -------
+    event_rts, ptb_rts : np.ndarray, shape(n_presses,)
+        The response times in seconds relative to the flip of each prompt.
+    """
+    from psychopy import core, event, monitors, visual
+    from psychopy.hardware import keyboard
+
+    from ecomp_experiment.define_input import get_key_press_time
+    from ecomp_experiment.define_settings import TEXT_HEIGHT_DVA
+    from ecomp_experiment.define_stimuli import get_central_text_stim
+
+    kb = keyboard.Keyboard(backend="ptb")
+    if kb.getBackend() != "ptb":
+        raise RuntimeError("The psychtoolbox keyboard backend is not available.")
+
+    my_monitor = monitors.Monitor(name=monitor_name)
+    win = visual.Window(
+        color=(-1, -1, -1),
+        fullscr=True,
+        monitor=my_monitor,
+        units="deg",
+        winType="pyglet",
+        size=my_monitor.getSizePix(),
+    )
+    text_stim = get_central_text_stim(win, height=TEXT_HEIGHT_DVA)
+    rt_clock = core.Clock()
+
+    event_rts = np.full(n_presses, np.nan)
+    ptb_rts = np.full(n_presses, np.nan)
+    for ipress in range(n_presses):
+        text_stim.text = f"Press a key ({ipress + 1}/{n_presses})"
+        text_stim.draw()
+        kb.clearEvents()
+        win.callOnFlip(rt_clock.reset)
+        win.flip()
+        key_rt = event.waitKeys(timeStamped=rt_clock)
+        keys = kb.getKeys(waitRelease=False)
+        if len(keys) == 0:
+            continue
+        event_rts[ipress] = key_rt[0][1]
+        ptb_rts[ipress] = get_key_press_time(keys[0], rt_clock)
+
+        # wait a random time, so that presses are not locked to the refresh
+        core.wait(np.random.uniform(0.2, 0.5))
+
+    win.close()
+    return event_rts, ptb_rts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ecomp_experiment.define_settings import MONITOR_NAME
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--n-presses", type=int, default=50, help="Number of key presses to collect."
+    )
+    args = parser.parse_args()
+
+    event_rts, ptb_rts = run_benchmark(args.n_presses, MONITOR_NAME)
+    valid = ~np.isnan(ptb_rts)
+    summary = summarize_latencies(event_rts[valid], ptb_rts[valid])
+    print(f"Key presses collected by both paths: {summary['n_presses']}")
+    print(f"Response time psychtoolbox: {np.median(ptb_rts[valid]) * 1000:.1f} ms")
+    print(
+        "Latency of psychopy.event relative to psychtoolbox: "
+        f"{summary['mean_ms']:.2f} ms (SD {summary['sd_ms']:.2f} ms, "
+        f"range {summary['min_ms']:.2f} to {summary['max_ms']:.2f} ms)"
+    )
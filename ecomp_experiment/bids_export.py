@@ -0,0 +1,660 @@
+"""Export the data of all sessions to a BIDS dataset.
+
+Each session (participant and stream) is converted to files in the ``beh``
+directory of the participant, with the stream as the task of the session:
+
+- ``*_beh.tsv`` and ``*_beh.json``: the trials of the behavioral logfile
+- ``*_events.tsv`` and ``*_events.json``: the TTL triggers (see
+  define_ttl.get_ttl_dict), with their onsets as received by the eye-tracker
+- ``*_recording-eye1_physio.tsv.gz`` and ``*_recording-eye1_physio.json``: the
+  eye-tracking samples (and ``eye2`` for binocular recordings)
+- ``*_recording-eye1_physioevents.tsv.gz`` and its json file: the fixations,
+  saccades, blinks, and messages of the eye-tracker
+
+Participant info is collected in ``participants.tsv``. The eye-tracking data are
+read from the ``*_eyetrack.asc`` file next to the ``*_eyetrack.edf`` file. If it does
+not exist, it is converted with the ``edf2asc`` tool of the EyeLink Developers Kit
+(if that is installed), and parsed with parse_asc.parse_asc.
+
+Sessions are exported in parallel. The SHA-256 checksums of the input files of
+each session are recorded in a manifest (``.export_manifest.json`` in the BIDS
+directory), and re-runs only export the parts of sessions (behavior, or
+eye-tracking) whose inputs changed or whose outputs are missing. Checksums are only
+recomputed for files whose size or modification time changed.
+
+To export all sessions to a ``bids`` directory on 4 processes, run from the root
+of the repository::
+
+    python -m ecomp_experiment.bids_export bids --n-jobs 4
+
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+import ecomp_experiment
+from ecomp_experiment.cohort import INFO_COLUMNS, find_sessions
+from ecomp_experiment.define_eyetracking import get_sha256
+from ecomp_experiment.define_settings import NSAMPLES
+from ecomp_experiment.define_ttl import get_ttl_dict
+
+BIDS_VERSION = "1.10.0"
+
+# increment to export all sessions again, e.g., after changing the output format
+EXPORT_VERSION = 1
+
+# descriptions of the columns of the behavioral logfiles (see main.py)
+BEH_COLUMNS = dict(
+    trial=dict(Description="Index of the trial in the session, starting at 0."),
+    direction=dict(Description="Side of the key that was pressed (left or right)."),
+    choice=dict(
+        Description="The choice: lower/higher (single stream), or red/blue "
+        "(dual stream)."
+    ),
+    ambiguous=dict(Description="Whether the trial had no objectively correct choice."),
+    rt=dict(Description="Response time.", Units="s"),
+    validity=dict(Description="Whether the response was given in time."),
+    iti=dict(Description="Duration of the inter-trial interval.", Units="ms"),
+    correct=dict(
+        Description="Whether the choice was correct (random for ambiguous trials)."
+    ),
+    stream=dict(Description="The task: single or dual stream."),
+    state=dict(
+        Description="Side of the options: 0 for left=red/higher and "
+        "right=blue/lower, 1 for the opposite."
+    ),
+)
+BEH_COLUMNS.update(
+    {
+        f"sample{i}": dict(
+            Description=f"Digit shown at position {i}, negative for red and "
+            "positive for blue."
+        )
+        for i in range(1, NSAMPLES + 1)
+    }
+)
+
+# the kinds of eye-tracker events in the physioevents files, by their ASC keyword
+PHYSIO_EVENTS = dict(EFIX="fixation", ESACC="saccade", EBLINK="blink", MSG="message")
+
+# the number of rows to write at once to compressed files
+CHUNKSIZE = 100_000
+
+
+def get_session_files(beh_fname):
+    """Get the identifiers and the eye-tracking file of a session.
+
+    Parameters
+    ----------
+    beh_fname : pathlib.Path
+        The ``*_beh.tsv`` logfile of the session.
+
+    Returns
+    -------
+    substr : str
+        The subject identifier.
+    stream : str
+        The stream of the session.
+    eyetrack_fname : pathlib.Path | None
+        The ``*_eyetrack.edf`` file, or if it does not exist, the
+        ``*_eyetrack.asc`` file. None if neither exists.
+    """
+    beh_fname = Path(beh_fname)
+    substr, stream = re.fullmatch(
+        r"sub-(.+)_stream-(.+)_beh\.tsv", beh_fname.name
+    ).groups()
+    eyetrack_fname = None
+    for ext in [".edf", ".asc"]:
+        fname = beh_fname.parent / f"sub-{substr}_stream-{stream}_eyetrack{ext}"
+        if fname.exists():
+            eyetrack_fname = fname
+            break
+    return substr, stream, eyetrack_fname
+
+
+def hash_file(fname, previous=None):
+    """Get the size, modification time, and SHA-256 checksum of a file.
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        The file.
+    previous : dict | None
+        A previous result for the file. If its size and modification time are
+        unchanged, its checksum is used instead of reading the file again.
+
+    Returns
+    -------
+    entry : dict
+        Contains the keys "fname", "size", "mtime_ns", and "sha256".
+    """
+    stat = os.stat(fname)
+    entry = dict(fname=str(fname), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    if previous is not None and all(
+        previous.get(key) == entry[key] for key in ["fname", "size", "mtime_ns"]
+    ):
+        entry["sha256"] = previous["sha256"]
+    else:
+        entry["sha256"] = get_sha256(fname)
+    return entry
+
+
+def convert_edf_to_asc(edf_fname):
+    """Convert an EDF file to ASC format with the edf2asc tool.
+
+    Parameters
+    ----------
+    edf_fname : pathlib.Path
+        The EDF file. The ASC file is written next to it.
+
+    Returns
+    -------
+    asc_fname : pathlib.Path | None
+        The ASC file, or None if edf2asc is not installed.
+    """
+    edf2asc = shutil.which("edf2asc")
+    if edf2asc is None:
+        return None
+    # "-y" overwrites ASC files from previous (e.g., interrupted) conversions
+    subprocess.run([edf2asc, "-y", str(edf_fname)], check=True, capture_output=True)
+    return Path(edf_fname).with_suffix(".asc")
+
+
+def _write_json(fname, data):
+    """Write a json sidecar file."""
+    with open(fname, "w") as fout:
+        json.dump(data, fout, indent=4)
+        fout.write("\n")
+
+
+def export_beh(beh_fname, beh_dir, prefix):
+    """Export the behavioral logfile of a session.
+
+    Parameters
+    ----------
+    beh_fname : pathlib.Path
+        The ``*_beh.tsv`` logfile of the session.
+    beh_dir : pathlib.Path
+        The ``beh`` directory of the participant in the BIDS dataset.
+    prefix : str
+        The prefix of the file names, e.g., "sub-01_task-single".
+
+    Returns
+    -------
+    outputs : list of pathlib.Path
+        The files that were written.
+    """
+    # the logfile is already a TSV file with "n/a" for missing values
+    outputs = [beh_dir / f"{prefix}_beh.tsv", beh_dir / f"{prefix}_beh.json"]
+    shutil.copyfile(beh_fname, outputs[0])
+    with open(beh_fname, "r") as fin:
+        columns = fin.readline().rstrip("\n").split("\t")
+    _write_json(
+        outputs[1],
+        {
+            column: BEH_COLUMNS.get(column, dict(Description="n/a"))
+            for column in columns
+        },
+    )
+    return outputs
+
+
+def make_events(asc_events, start_time):
+    """Make the events table of the TTL triggers received by the eye-tracker.
+
+    Parameters
+    ----------
+    asc_events : pandas.DataFrame
+        The events of the ASC file, see parse_asc.read_asc_events.
+    start_time : float
+        The eye-tracker time at onset 0, in milliseconds.
+
+    Returns
+    -------
+    events : pandas.DataFrame
+        The columns "onset" (in seconds), "duration", "trial_type" (the name of
+        the trigger in define_ttl.get_ttl_dict, "n/a" for unknown codes, e.g.,
+        the reset to 0 at the start of a session), and "value" (the trigger code).
+    """
+    import pandas as pd
+
+    names = {ord(byte): name for name, byte in get_ttl_dict().items()}
+    is_trigger = (asc_events["kind"] == "MSG") & asc_events["text"].str.fullmatch(
+        r"\d+", na=False
+    )
+    triggers = asc_events[is_trigger]
+    values = triggers["text"].astype(int).to_numpy()
+    events = pd.DataFrame(
+        dict(
+            onset=(triggers["time"].to_numpy() - start_time) / 1000,
+            duration=0.0,
+            trial_type=[names.get(value, "n/a") for value in values],
+            value=values,
+        )
+    )
+    return events
+
+
+def make_physioevents(asc_events, start_time):
+    """Make the table of fixations, saccades, blinks, and messages.
+
+    Parameters
+    ----------
+    asc_events : pandas.DataFrame
+        The events of the ASC file, see parse_asc.read_asc_events.
+    start_time : float
+        The eye-tracker time at onset 0, in milliseconds.
+
+    Returns
+    -------
+    physioevents : pandas.DataFrame
+        The columns "onset" and "duration" (in seconds), "trial_type" (see
+        `PHYSIO_EVENTS`), "eye" (for fixations, saccades, and blinks), and
+        "message".
+    """
+    import pandas as pd
+
+    asc_events = asc_events[asc_events["kind"].isin(list(PHYSIO_EVENTS))]
+    texts = asc_events["text"].fillna("")
+    is_message = (asc_events["kind"] == "MSG").to_numpy()
+
+    # e.g., "EFIX R 1000 1020 21 ...": the text after the start time is
+    # "R 1020 21 ...", with the eye, the end time, and the duration
+    tokens = texts.str.split(n=3, expand=True).reindex(columns=range(3))
+    duration = pd.to_numeric(tokens[2], errors="coerce").to_numpy() / 1000
+    physioevents = pd.DataFrame(
+        dict(
+            onset=(asc_events["time"].to_numpy() - start_time) / 1000,
+            duration=np.where(is_message, 0.0, duration),
+            trial_type=asc_events["kind"].map(PHYSIO_EVENTS).to_numpy(),
+            eye=np.where(is_message, "n/a", tokens[0].fillna("n/a").to_numpy()),
+            message=np.where(is_message, texts.to_numpy(), "n/a"),
+        )
+    )
+    return physioevents
+
+
+def _get_eyes_and_rate(asc_events, n_eyes):
+    """Get the recorded eyes and the sampling frequency from the ASC header."""
+    eyes, rate = ["left", "right"][:n_eyes], None
+    samples_lines = asc_events.loc[asc_events["kind"] == "SAMPLES", "text"]
+    if samples_lines.size > 0:
+        tokens = samples_lines.iloc[0].split()
+        recorded = [token.lower() for token in tokens if token in ["LEFT", "RIGHT"]]
+        if len(recorded) == n_eyes:
+            eyes = recorded
+        if "RATE" in tokens:
+            rate = float(tokens[tokens.index("RATE") + 1])
+    return eyes, rate
+
+
+def _write_headerless_tsv_gz(fname, df):
+    """Write a table to a compressed TSV file without a header, in chunks."""
+    with gzip.open(fname, "wt", compresslevel=6, newline="") as fout:
+        for start in range(0, max(df.shape[0], 1), CHUNKSIZE):
+            df.iloc[start : start + CHUNKSIZE].to_csv(
+                fout, sep="\t", header=False, index=False, na_rep="n/a"
+            )
+
+
+def export_eyetrack(eyetrack_fname, beh_dir, prefix, cache_dir, resume=True):
+    """Export the eye-tracking data of a session.
+
+    Parameters
+    ----------
+    eyetrack_fname : pathlib.Path
+        The ``*_eyetrack.edf`` or ``*_eyetrack.asc`` file of the session.
+    beh_dir : pathlib.Path
+        The ``beh`` directory of the participant in the BIDS dataset.
+    prefix : str
+        The prefix of the file names, e.g., "sub-01_task-single".
+    cache_dir : pathlib.Path
+        The directory for the parsed ASC file, see parse_asc.parse_asc.
+    resume : bool
+        Whether to continue a previous parsing of the ASC file. Defaults to True.
+
+    Returns
+    -------
+    outputs : list of pathlib.Path | None
+        The files that were written, or None if an EDF file could not be converted
+        because edf2asc is not installed.
+    """
+    import pandas as pd
+
+    from ecomp_experiment.parse_asc import (
+        parse_asc,
+        read_asc_events,
+        read_asc_samples,
+    )
+
+    asc_fname = eyetrack_fname
+    if Path(eyetrack_fname).suffix == ".edf":
+        asc_fname = convert_edf_to_asc(eyetrack_fname)
+        if asc_fname is None:
+            return None
+
+    parsed_dir = Path(cache_dir) / f"{prefix}_asc"
+    parse_asc(asc_fname, parsed_dir, resume=resume)
+    times, samples = read_asc_samples(parsed_dir)
+    asc_events = read_asc_events(parsed_dir)
+
+    # onsets are relative to the first sample (or the start of the recording)
+    start_time = times[0] if times.size > 0 else 0
+    if times.size == 0:
+        starts = asc_events.loc[asc_events["kind"] == "START", "time"]
+        start_time = starts.iloc[0] if starts.size > 0 else 0
+
+    outputs = [beh_dir / f"{prefix}_events.tsv", beh_dir / f"{prefix}_events.json"]
+    events = make_events(asc_events, start_time)
+    events.to_csv(outputs[0], sep="\t", index=False, na_rep="n/a")
+    levels = {str(ord(byte)): name for name, byte in get_ttl_dict().items()}
+    _write_json(
+        outputs[1],
+        dict(
+            onset=dict(
+                Description="Onset of the trigger, relative to the first "
+                "eye-tracking sample.",
+                Units="s",
+            ),
+            trial_type=dict(Description="Name of the trigger, see define_ttl.py."),
+            value=dict(
+                Description="TTL trigger code, sent to the EEG and the eye-tracker.",
+                Levels=levels,
+            ),
+        ),
+    )
+
+    physioevents = make_physioevents(asc_events, start_time)
+    n_eyes = samples.shape[1] // 3
+    eyes, rate = _get_eyes_and_rate(asc_events, n_eyes)
+    if rate is None and times.size > 1:
+        rate = 1000 / np.median(np.diff(times[: CHUNKSIZE + 1]))
+    for ieye, eye in enumerate(eyes):
+        recording = f"{prefix}_recording-eye{ieye + 1}"
+        physio_fname = beh_dir / f"{recording}_physio.tsv.gz"
+        physio = pd.DataFrame(
+            samples[:, 3 * ieye : 3 * ieye + 3],
+            columns=["x_coordinate", "y_coordinate", "pupil_size"],
+        )
+        physio.insert(0, "timestamp", times)
+        _write_headerless_tsv_gz(physio_fname, physio)
+        _write_json(
+            beh_dir / f"{recording}_physio.json",
+            dict(
+                PhysioType="eyetrack",
+                RecordedEye=eye,
+                SamplingFrequency=rate,
+                StartTime=0,
+                Columns=list(physio.columns),
+                timestamp=dict(Description="Eye-tracker time.", Units="ms"),
+                x_coordinate=dict(Description="Gaze position.", Units="pixel"),
+                y_coordinate=dict(Description="Gaze position.", Units="pixel"),
+                pupil_size=dict(Description="Pupil area.", Units="arbitrary"),
+                Manufacturer="SR-Research",
+                ManufacturersModelName="EyeLink 1000 Plus",
+                SampleCoordinateSystem="gaze-on-screen",
+                EnvironmentCoordinates="top-left",
+            ),
+        )
+
+        # events of both eyes are in the files of each eye, as recorded
+        physioevents_fname = beh_dir / f"{recording}_physioevents.tsv.gz"
+        _write_headerless_tsv_gz(physioevents_fname, physioevents)
+        _write_json(
+            beh_dir / f"{recording}_physioevents.json",
+            dict(
+                Columns=list(physioevents.columns),
+                onset=dict(Units="s"),
+                duration=dict(Units="s"),
+                trial_type=dict(Levels={kind: kind for kind in PHYSIO_EVENTS.values()}),
+            ),
+        )
+        outputs += [
+            physio_fname,
+            beh_dir / f"{recording}_physio.json",
+            physioevents_fname,
+            beh_dir / f"{recording}_physioevents.json",
+        ]
+    return outputs
+
+
+def _is_unchanged(entry, previous, bids_root):
+    """Check whether the input of a part of a session and its outputs are as before."""
+    return (
+        previous is not None
+        and previous["input"]["sha256"] == entry["sha256"]
+        and previous["input"]["fname"] == entry["fname"]
+        and all((Path(bids_root) / fname).exists() for fname in previous["outputs"])
+    )
+
+
+def export_session(beh_fname, bids_root, previous=None):
+    """Export a session, skipping the parts whose inputs did not change.
+
+    Parameters
+    ----------
+    beh_fname : pathlib.Path
+        The ``*_beh.tsv`` logfile of the session.
+    bids_root : pathlib.Path
+        The BIDS directory.
+    previous : dict | None
+        The entry of the session in the manifest of a previous export.
+
+    Returns
+    -------
+    result : dict
+        Contains the keys "session" (the prefix of the file names), "parts" (the
+        manifest entry: for "beh" and "eyetrack", the "input" file and the
+        "outputs" relative to `bids_root`), "exported" (the parts that were
+        exported), "warnings", and "error" (None, or the traceback if the export
+        failed).
+    """
+    bids_root = Path(bids_root)
+    previous = dict() if previous is None else previous
+    substr, stream, eyetrack_fname = get_session_files(beh_fname)
+    prefix = f"sub-{substr}_task-{stream}"
+    result = dict(session=prefix, parts=dict(), exported=[], warnings=[], error=None)
+    try:
+        beh_dir = bids_root / f"sub-{substr}" / "beh"
+        os.makedirs(beh_dir, exist_ok=True)
+        inputs = dict(beh=beh_fname, eyetrack=eyetrack_fname)
+        for part, fname in inputs.items():
+            if fname is None:
+                continue
+            previous_part = previous.get(part)
+            entry = hash_file(
+                fname, None if previous_part is None else previous_part["input"]
+            )
+            if _is_unchanged(entry, previous_part, bids_root):
+                result["parts"][part] = previous_part
+                continue
+
+            if part == "beh":
+                outputs = export_beh(fname, beh_dir, prefix)
+            else:
+                # only resume parsing the ASC file if the EDF file is the same
+                resume = (
+                    previous_part is not None
+                    and previous_part["input"]["sha256"] == entry["sha256"]
+                )
+                outputs = export_eyetrack(
+                    fname, beh_dir, prefix, bids_root / ".cache", resume=resume
+                )
+                if outputs is None:
+                    result["warnings"].append(
+                        f"{fname.name} not exported: edf2asc is not installed"
+                    )
+                    continue
+            result["parts"][part] = dict(
+                input=entry,
+                outputs=[str(output.relative_to(bids_root)) for output in outputs],
+            )
+            result["exported"].append(part)
+    except Exception:
+        result["error"] = traceback.format_exc()
+    return result
+
+
+def write_dataset_files(bids_root, sessions):
+    """Write the dataset description and the participants table.
+
+    Parameters
+    ----------
+    bids_root : pathlib.Path
+        The BIDS directory.
+    sessions : list of tuple
+        The ``(beh_fname, info_fname)`` of each session, see cohort.find_sessions.
+    """
+    import pandas as pd
+
+    _write_json(
+        Path(bids_root) / "dataset_description.json",
+        dict(
+            Name="eComp experiment",
+            BIDSVersion=BIDS_VERSION,
+            DatasetType="raw",
+            GeneratedBy=[
+                dict(
+                    Name="ecomp_experiment.bids_export",
+                    Version=ecomp_experiment.__version__,
+                )
+            ],
+        ),
+    )
+
+    participants = dict()
+    for beh_fname, info_fname in sessions:
+        substr, _, _ = get_session_files(beh_fname)
+        if participants.get(substr) is None and info_fname.exists():
+            with open(info_fname, "r") as fin:
+                participants[substr] = json.load(fin)
+        participants.setdefault(substr, None)
+    columns = ["age", "sex", "handedness"]
+    info_keys = {column: key for key, column in INFO_COLUMNS.items()}
+    df = pd.DataFrame(
+        [
+            [f"sub-{substr}"]
+            + [(info or dict()).get(info_keys[column]) for column in columns]
+            for substr, info in participants.items()
+        ],
+        columns=["participant_id"] + columns,
+    )
+    df.to_csv(Path(bids_root) / "participants.tsv", sep="\t", index=False, na_rep="n/a")
+
+
+def export_bids(data_dir, bids_root, n_jobs=1, include_test=False):
+    """Export all sessions that are new or changed since the last export.
+
+    Parameters
+    ----------
+    data_dir : pathlib.Path
+        The experiment_data directory.
+    bids_root : pathlib.Path
+        The BIDS directory. Will be created if it does not exist.
+    n_jobs : int
+        The number of processes to use for exporting sessions. Defaults to 1,
+        which exports the sessions in the current process.
+    include_test : bool
+        Whether to include data of the "test" subject (from training runs).
+        Defaults to False.
+
+    Returns
+    -------
+    results : list of dict
+        The result of each session, see :func:`export_session`, in the order of
+        cohort.find_sessions.
+    """
+    bids_root = Path(bids_root)
+    os.makedirs(bids_root, exist_ok=True)
+    manifest_fname = bids_root / ".export_manifest.json"
+    manifest = dict(version=EXPORT_VERSION, sessions=dict())
+    if manifest_fname.exists():
+        with open(manifest_fname, "r") as fin:
+            previous = json.load(fin)
+        if previous.get("version") == EXPORT_VERSION:
+            manifest = previous
+
+    def update_manifest(result):
+        """Record the exported parts of a session, and write the manifest."""
+        if result["error"] is None:
+            manifest["sessions"][result["session"]] = result["parts"]
+        manifest_fname_tmp = bids_root / ".export_manifest.json.tmp"
+        with open(manifest_fname_tmp, "w") as fout:
+            json.dump(manifest, fout, indent=4)
+        os.replace(manifest_fname_tmp, manifest_fname)
+
+    sessions = find_sessions(data_dir, include_test=include_test)
+    beh_fnames = [beh_fname for beh_fname, _ in sessions]
+    prefixes = ["sub-{}_task-{}".format(*get_session_files(f)[:2]) for f in beh_fnames]
+    previous = [manifest["sessions"].get(prefix) for prefix in prefixes]
+    results = [None] * len(sessions)
+    if n_jobs > 1 and len(sessions) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = {
+                executor.submit(export_session, beh_fname, bids_root, prev): i
+                for i, (beh_fname, prev) in enumerate(zip(beh_fnames, previous))
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                update_manifest(results[futures[future]])
+    else:
+        for i, (beh_fname, prev) in enumerate(zip(beh_fnames, previous)):
+            results[i] = export_session(beh_fname, bids_root, prev)
+            update_manifest(results[i])
+
+    write_dataset_files(bids_root, sessions)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from time import perf_counter
+
+    from ecomp_experiment.cohort import get_data_dir
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("bids_root", type=Path, help="The BIDS directory.")
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="The experiment_data directory. Defaults to the one in this repository.",
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, default=1, help="Number of processes for exporting."
+    )
+    parser.add_argument(
+        "--include-test",
+        action="store_true",
+        help="Also export the sessions of the test subject.",
+    )
+    args = parser.parse_args()
+
+    start = perf_counter()
+    data_dir = get_data_dir() if args.data_dir is None else args.data_dir
+    results = export_bids(
+        data_dir, args.bids_root, n_jobs=args.n_jobs, include_test=args.include_test
+    )
+    n_failed = sum(result["error"] is not None for result in results)
+    n_exported = sum(
+        len(result["exported"]) > 0 and result["error"] is None for result in results
+    )
+    for result in results:
+        for warning in result["warnings"]:
+            print(f"{result['session']}: {warning}")
+        if result["error"] is not None:
+            print(f"{result['session']} failed:\n{result['error']}")
+    print(
+        f"Sessions: {len(results)} ({n_exported} exported, {n_failed} failed, "
+        f"{len(results) - n_exported - n_failed} unchanged) "
+        f"in {perf_counter() - start:.1f} s\nWritten to: {args.bids_root}"
+    )
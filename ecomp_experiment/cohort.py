@@ -0,0 +1,305 @@
+"""Aggregate the behavioral data of all participants into one table.
+
+The data are read from the experiment_data directory, where the experiment
+routine saves the data of each participant (see define_routines.display_survey_gui).
+Parsed sessions are cached, and only new or changed sessions are parsed again.
+
+To calculate the bonus money of all participants, run from the root of the
+repository::
+
+    python -m ecomp_experiment.cohort --n-jobs 4 bonus
+
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from ecomp_experiment.define_settings import NSAMPLES
+from ecomp_experiment.utils import map_accuracy_to_bonus
+
+# pandas dtypes of the columns in the behavioral logfiles (see main.py).
+# "n/a" values are read as missing values.
+BEH_DTYPES = dict(
+    trial="int16",
+    direction=str,
+    choice=str,
+    ambiguous="bool",
+    rt="float32",
+    validity="bool",
+    iti="float32",
+    correct="boolean",
+    stream=str,
+    state="int8",
+)
+BEH_DTYPES.update({f"sample{i}": "int8" for i in range(1, NSAMPLES + 1)})
+
+# fields in the participant info files, and the column names to use for them
+INFO_COLUMNS = dict(
+    Age="age",
+    Sex="sex",
+    Handedness="handedness",
+    experiment_version="experiment_version",
+    recording_datetime="recording_datetime",
+    same_trials_over_conditions="same_trials_over_conditions",
+    adaptive_difficulty="adaptive_difficulty",
+)
+
+
+def get_data_dir():
+    """Get the default experiment_data directory of this repository."""
+    return Path(__file__).resolve().parent.parent / "experiment_data"
+
+
+def find_sessions(data_dir, include_test=False):
+    """Find the behavioral logfiles and participant info files of all sessions.
+
+    Parameters
+    ----------
+    data_dir : pathlib.Path
+        The experiment_data directory.
+    include_test : bool
+        Whether to include data of the "test" subject (from training runs).
+        Defaults to False.
+
+    Returns
+    -------
+    sessions : list of tuple
+        Each entry is a tuple of ``(beh_fname, info_fname)`` pointing to the
+        ``*_beh.tsv`` and ``*_info.json`` files of one session. The info file
+        may not exist.
+    """
+    sessions = []
+    for stream in ["single", "dual"]:
+        pattern = f"sub-*/{stream}/sub-*_stream-{stream}_beh.tsv"
+        for beh_fname in sorted(Path(data_dir).glob(pattern)):
+            subjdir = beh_fname.parent.parent
+            substr = subjdir.name[len("sub-") :]
+            if substr == "test" and not include_test:
+                continue
+            info_fname = subjdir / f"sub-{substr}_stream-{stream}_info.json"
+            sessions.append((beh_fname, info_fname))
+
+    # sort by subject, then stream
+    sessions.sort(key=lambda session: str(session[0].parent.parent))
+    return sessions
+
+
+def read_session(beh_fname, info_fname=None):
+    """Read the behavioral data of a session with fixed dtypes.
+
+    Parameters
+    ----------
+    beh_fname : pathlib.Path
+        The ``*_beh.tsv`` logfile of the session.
+    info_fname : pathlib.Path | None
+        The ``*_info.json`` file of the session. If None or if it does not exist,
+        the participant info columns will contain missing values.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        The trials of the session, with an additional "subject" column, and
+        columns for the participant info (see `INFO_COLUMNS`).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(
+        beh_fname,
+        sep="\t",
+        dtype=BEH_DTYPES,
+        na_values=["n/a"],
+        keep_default_na=False,
+    )
+
+    info = dict()
+    if info_fname is not None and Path(info_fname).exists():
+        with open(info_fname, "r") as fin:
+            info = json.load(fin)
+
+    substr = Path(beh_fname).name.split("_")[0][len("sub-") :]
+    df.insert(0, "subject", substr)
+    for key, column in INFO_COLUMNS.items():
+        df[column] = info.get(key, None)
+
+    return df
+
+
+def _get_cache_key(fnames):
+    """Get a list of (size, mtime) of files, with None for missing files."""
+    key = []
+    for fname in fnames:
+        try:
+            stat = os.stat(fname)
+        except FileNotFoundError:
+            key.append(None)
+            continue
+        key.append([stat.st_size, stat.st_mtime_ns])
+    return key
+
+
+def load_cohort(data_dir=None, n_jobs=1, cache_dir=None, include_test=False):
+    """Load the behavioral data of all sessions into one table.
+
+    Each session is parsed with :func:`read_session`. The parsed sessions are
+    cached in `cache_dir`, together with an index of the size and modification time
+    of their files. On subsequent calls, only sessions that are new or whose files
+    changed are parsed again.
+
+    Parameters
+    ----------
+    data_dir : pathlib.Path | None
+        The experiment_data directory. If None, use the experiment_data
+        directory of this repository.
+    n_jobs : int
+        The number of processes to use for parsing sessions. Defaults to 1,
+        which parses the sessions in the current process.
+    cache_dir : pathlib.Path | None
+        The directory in which to cache parsed sessions. If None, use
+        a ".cache" directory within `data_dir`.
+    include_test : bool
+        Whether to include data of the "test" subject (from training runs).
+        Defaults to False.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        The trials of all sessions, sorted by subject and stream.
+    """
+    import pandas as pd
+
+    data_dir = get_data_dir() if data_dir is None else Path(data_dir)
+    cache_dir = data_dir / ".cache" if cache_dir is None else Path(cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    index_fname = cache_dir / "index.json"
+    index = dict()
+    if index_fname.exists():
+        with open(index_fname, "r") as fin:
+            index = json.load(fin)
+
+    # find sessions that are new or changed since they were cached
+    sessions = find_sessions(data_dir, include_test=include_test)
+    keys = [_get_cache_key(session) for session in sessions]
+    cache_fnames = [cache_dir / f"{beh_fname.stem}.pkl" for beh_fname, _ in sessions]
+    to_parse = []
+    for isession, (beh_fname, _) in enumerate(sessions):
+        cached = cache_fnames[isession].exists()
+        if index.get(beh_fname.name) != keys[isession] or not cached:
+            to_parse.append(isession)
+
+    # parse and cache them
+    if n_jobs > 1 and len(to_parse) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            parsed = list(
+                executor.map(read_session, *zip(*[sessions[i] for i in to_parse]))
+            )
+    else:
+        parsed = [read_session(*sessions[i]) for i in to_parse]
+
+    for isession, df in zip(to_parse, parsed):
+        df.to_pickle(cache_fnames[isession])
+        index[sessions[isession][0].name] = keys[isession]
+
+    # remove sessions from the index that do not exist anymore
+    names = [beh_fname.name for beh_fname, _ in sessions]
+    index = {name: key for name, key in index.items() if name in names}
+    index_fname_tmp = cache_dir / "index.json.tmp"
+    with open(index_fname_tmp, "w") as fout:
+        json.dump(index, fout, indent=4)
+    os.replace(index_fname_tmp, index_fname)
+
+    dfs = dict(zip(to_parse, parsed))
+    dfs = [
+        dfs[isession] if isession in dfs else pd.read_pickle(cache_fname)
+        for isession, cache_fname in enumerate(cache_fnames)
+    ]
+    if len(dfs) == 0:
+        columns = ["subject"] + list(BEH_DTYPES) + list(INFO_COLUMNS.values())
+        return pd.DataFrame(columns=columns)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def calc_bonuses(df):
+    """Calculate bonus money for all participants in a cohort table.
+
+    The bonus is calculated as in :func:`utils.calc_bonus`, but for all
+    participants at once.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The cohort table, see :func:`load_cohort`.
+
+    Returns
+    -------
+    payouts : pandas.DataFrame
+        One row per participant with data for both single and dual stream,
+        with columns "subject", "acc_single", "acc_dual", "accuracy",
+        and "bonus_euro".
+    """
+    import pandas as pd
+
+    # "n/a" for "correct" means timeout, calculate as incorrect
+    correct = df["correct"].fillna(False).astype(int)
+    grouped = correct.groupby([df["subject"], df["stream"]])
+    acc = (grouped.sum() / grouped.size()) * 100
+
+    # round up and turn into int, as in utils.calc_accuracy
+    acc = np.ceil(acc).astype(int).unstack("stream")
+    acc = acc.reindex(columns=["single", "dual"])
+    incomplete = acc.index[acc.isna().any(axis=1)].tolist()
+    if len(incomplete) > 0:
+        print(f"Skipping subjects without single and dual stream data: {incomplete}")
+    acc = acc.dropna().astype(int)
+
+    payouts = pd.DataFrame(
+        dict(
+            subject=acc.index.to_numpy(),
+            acc_single=acc["single"].to_numpy(),
+            acc_dual=acc["dual"].to_numpy(),
+        )
+    )
+    payouts["accuracy"] = payouts[["acc_single", "acc_dual"]].mean(axis=1)
+    payouts["bonus_euro"] = payouts["accuracy"].map(map_accuracy_to_bonus)
+    return payouts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="The experiment_data directory. Defaults to the one in this repository.",
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, default=1, help="Number of processes for parsing."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_bonus = subparsers.add_parser(
+        "bonus", help="Calculate bonus money for all participants."
+    )
+    parser_bonus.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="TSV file to write the payouts to. Defaults to bonus_payouts.tsv "
+        "in the experiment_data directory.",
+    )
+    args = parser.parse_args()
+
+    data_dir = get_data_dir() if args.data_dir is None else args.data_dir
+    df = load_cohort(data_dir, n_jobs=args.n_jobs)
+
+    if args.command == "bonus":
+        payouts = calc_bonuses(df)
+        output = data_dir / "bonus_payouts.tsv" if args.output is None else args.output
+        payouts.to_csv(output, sep="\t", index=False)
+        print(payouts.to_string(index=False))
+        print(f"\nTotal: {payouts['bonus_euro'].sum()}€\nWritten to: {output}")
@@ -3,16 +3,262 @@
 See also the eye-tracking directory for more information.
 """
 
+import hashlib
+import os
+import threading
+from math import exp, hypot
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
 from ecomp_experiment.define_settings import FULLSCR
 
+# value of pylink.MISSING_DATA, used by the EyeLink for missing gaze data
+MISSING_DATA = -32768
+
 
 class DummyEyeLink:
-    """Convenience class to run the code without true EyeLink connection."""
+    """Convenience class to run the code without true EyeLink connection.
+
+    Parameters
+    ----------
+    sample_source : callable | None
+        A function without arguments, returning the current gaze position as
+        a tuple ``(x, y)`` in screen pixels (origin at the top left, as for the
+        EyeLink), or None if there is no gaze data. For example a
+        :class:`SimulatedGaze` object. If None (default), there are no samples.
+    """
+
+    def __init__(self, sample_source=None):
+        """Initialize the dummy."""
+        self.sample_source = sample_source
 
     def sendMessage(self, msg):
         """Take a message string and return it (do nothing)."""
         return msg
 
+    def getNewestSample(self):
+        """Return a sample from the `sample_source`, or None."""
+        if self.sample_source is None:
+            return None
+        gaze = self.sample_source()
+        if gaze is None:
+            return None
+        return DummySample(gaze)
+
+
+class DummySample:
+    """Mimic the parts of a pylink sample that are used in this experiment."""
+
+    def __init__(self, gaze):
+        """Take the gaze position as a tuple ``(x, y)``."""
+        self._gaze = gaze
+
+    def isRightSample(self):
+        """Return True, there is always data for the right eye."""
+        return True
+
+    def isLeftSample(self):
+        """Return False, there is no data for the left eye."""
+        return False
+
+    def getRightEye(self):
+        """Return the data of the right eye."""
+        return self
+
+    def getGaze(self):
+        """Return the gaze position."""
+        return self._gaze
+
+
+class SimulatedGaze:
+    """Simulate the gaze of a participant who mostly fixates the screen center.
+
+    The gaze is normally distributed around the screen center. At random times
+    (a Poisson process), the participant looks away from the center for
+    `lapse_s` seconds.
+
+    Parameters
+    ----------
+    screen_size : tuple of int
+        The width and height of the screen in pixels.
+    sd_pix : float
+        The standard deviation of the gaze around the center in pixels.
+    lapse_rate : float
+        The expected number of times per second that the participant starts to
+        look away from the center.
+    lapse_s : float
+        How long the participant looks away from the center, in seconds.
+    clock : callable | None
+        A function returning the current time in seconds. If None, use
+        ``time.perf_counter``.
+    seed : int | None
+        The seed for the random number generator.
+    """
+
+    def __init__(
+        self, screen_size, sd_pix=10, lapse_rate=0.2, lapse_s=0.3, clock=None, seed=None
+    ):
+        """Initialize the simulation."""
+        self.center = np.asarray(screen_size) / 2
+        self.sd_pix = sd_pix
+        self.lapse_rate = lapse_rate
+        self.lapse_s = lapse_s
+        self.clock = perf_counter if clock is None else clock
+        self.rng = np.random.default_rng(seed)
+        self._last_t = self.clock()
+        self._lapse_until = -np.inf
+
+    def __call__(self):
+        """Return the current gaze position in pixels."""
+        now = self.clock()
+        dt = now - self._last_t
+        self._last_t = now
+
+        p_lapse = 1 - exp(-self.lapse_rate * dt)
+        if now >= self._lapse_until and self.rng.random() < p_lapse:
+            self._lapse_until = now + self.lapse_s
+
+        if now < self._lapse_until:
+            # look at a location halfway between center and upper left corner
+            return tuple(self.center / 2)
+        return tuple(self.center + self.rng.normal(0, self.sd_pix, 2))
+
+
+class FixationChecker:
+    """Check whether gaze is stable on the screen center, once per frame.
+
+    The newest sample of the eye-tracker is polled once per call to
+    :meth:`update`, so there is a hard limit of one (non-blocking) poll per frame.
+    The time spent polling is measured and compared to a budget. After
+    `max_overruns` consecutive polls over budget, polling is turned off for the
+    rest of the session, and :meth:`update` reports stable fixation without
+    polling, so that inter-trial-intervals are not extended anymore.
+
+    Parameters
+    ----------
+    tk : DummyEyeLink | EyeLinkCBind
+        The eye-tracker.
+    screen_size : tuple of int
+        The width and height of the screen in pixels.
+    radius_pix : float
+        The maximum distance of the gaze from the screen center in pixels
+        to count as fixating.
+    stable_frames : int
+        For how many consecutive frames gaze must be in `radius_pix` to count
+        as stable fixation.
+    budget_s : float
+        The time budget for polling the eye-tracker in each frame, in seconds.
+    max_overruns : int
+        After how many consecutive polls over budget to turn off polling.
+        Defaults to 3.
+    clock : callable
+        Returns the current time in seconds. Defaults to time.perf_counter.
+
+    Attributes
+    ----------
+    poll_durations : list of float
+        The time in seconds that each poll took.
+    n_overruns : int
+        How often a poll took longer than `budget_s`.
+    enabled : bool
+        Whether the eye-tracker is still polled.
+    """
+
+    def __init__(
+        self,
+        tk,
+        screen_size,
+        radius_pix,
+        stable_frames,
+        budget_s,
+        max_overruns=3,
+        clock=perf_counter,
+    ):
+        """Initialize the checker."""
+        self.tk = tk
+        self.center = np.asarray(screen_size) / 2
+        self.radius_pix = radius_pix
+        self.stable_frames = stable_frames
+        self.budget_s = budget_s
+        self.max_overruns = max_overruns
+        self.clock = clock
+        self.poll_durations = []
+        self.n_overruns = 0
+        self.n_stable = 0
+        self.enabled = True
+        self._n_consecutive_overruns = 0
+
+    def reset(self):
+        """Reset the count of consecutive frames with fixation."""
+        self.n_stable = 0
+
+    def update(self):
+        """Poll the newest sample and return whether fixation is stable.
+
+        Returns
+        -------
+        stable : bool
+            Whether gaze was on the screen center for the last `stable_frames`
+            calls. Always True once polling was turned off.
+        """
+        if not self.enabled:
+            return True
+
+        start = self.clock()
+        gaze = get_gaze(self.tk.getNewestSample())
+        duration = self.clock() - start
+        self.poll_durations.append(duration)
+        if duration > self.budget_s:
+            self.n_overruns += 1
+            self._n_consecutive_overruns += 1
+        else:
+            self._n_consecutive_overruns = 0
+        if self._n_consecutive_overruns >= self.max_overruns:
+            self.enabled = False
+            print(
+                f"Polling the eye-tracker took longer than {self.budget_s * 1000:.3f} "
+                f"ms in {self.max_overruns} frames in a row, turning off the "
+                "gaze-contingent inter-trial-interval."
+            )
+            return True
+
+        fixating = False
+        if gaze is not None:
+            dist = hypot(gaze[0] - self.center[0], gaze[1] - self.center[1])
+            fixating = dist <= self.radius_pix
+
+        self.n_stable = self.n_stable + 1 if fixating else 0
+        return self.n_stable >= self.stable_frames
+
+
+def get_gaze(sample):
+    """Get the gaze position from a sample of the eye-tracker.
+
+    Parameters
+    ----------
+    sample : pylink.Sample | DummySample | None
+        The sample, as returned by ``tk.getNewestSample()``.
+
+    Returns
+    -------
+    gaze : tuple of float | None
+        The gaze position ``(x, y)`` in screen pixels of the right eye, or the
+        left eye if there is no data for the right eye. None if there is no data.
+    """
+    if sample is None:
+        return None
+    if sample.isRightSample():
+        gaze = sample.getRightEye().getGaze()
+    elif sample.isLeftSample():
+        gaze = sample.getLeftEye().getGaze()
+    else:
+        return None
+    if MISSING_DATA in gaze:
+        return None
+    return gaze
+
 
 def start_eye_recording(tk):
     """Start eye-tracking."""
@@ -22,8 +268,31 @@ def start_eye_recording(tk):
     return error
 
 
-def stop_eye_recording(tk, edf_fname, edf_fname_local):
-    """Stop eye-tracking and transfer an EDF file to local PC."""
+def stop_eye_recording(tk, edf_fname, edf_fname_local, background=False, n_retries=3):
+    """Stop eye-tracking and transfer an EDF file to local PC.
+
+    Parameters
+    ----------
+    tk : DummyEyeLink | EyeLinkCBind
+        The eye-tracker.
+    edf_fname : str
+        The name of the EDF file on the EyeLink host PC.
+    edf_fname_local : str
+        The path to which to save the EDF file on the local PC.
+    background : bool
+        If True, transfer the file in a background thread and return it.
+        Defaults to False, which blocks until the transfer is done and then
+        closes the connection to the eye-tracker.
+    n_retries : int
+        How often to retry if the transfer is incomplete. Defaults to 3.
+
+    Returns
+    -------
+    transfer : EDFTransfer | None
+        The transfer if `background` is True, else None. After the transfer is
+        done (see ``transfer.join``), :func:`close_eyetracker` must be called.
+        Also None if `tk` is a DummyEyeLink.
+    """
     if isinstance(tk, DummyEyeLink):
         return
     import pylink
@@ -33,11 +302,152 @@ def stop_eye_recording(tk, edf_fname, edf_fname_local):
     tk.setOfflineMode()
     tk.closeDataFile()
     pylink.pumpDelay(100)
-    tk.receiveDataFile(edf_fname, edf_fname_local)
+
+    transfer = EDFTransfer(tk, edf_fname, edf_fname_local, n_retries=n_retries)
+    if background:
+        transfer.start()
+        return transfer
+
+    transfer.run()
+    close_eyetracker(tk)
+    if not transfer.ok:
+        raise RuntimeError(f"Transfer of {edf_fname} failed: {transfer.error}")
+
+
+def close_eyetracker(tk):
+    """Close the connection to the eye-tracker and the calibration graphics."""
+    if isinstance(tk, DummyEyeLink):
+        return
+    import pylink
+
     tk.close()
     pylink.closeGraphics()
 
 
+class EDFTransfer(threading.Thread):
+    """Transfer an EDF file from the EyeLink host PC and check its size.
+
+    The file is received into a temporary file next to `edf_fname_local`. The
+    transfer is successful if the number of received bytes reported by the
+    eye-tracker is positive and matches the size of the temporary file, which
+    is then renamed to `edf_fname_local`. Otherwise, the transfer is retried.
+    The size check is the only check of the transfer itself. For later audits of
+    the saved file, its SHA-256 checksum is written to a sidecar file with the
+    additional extension ".sha256" (in the format of ``sha256sum``), see
+    :func:`verify_sha256`.
+
+    Parameters
+    ----------
+    tk : EyeLinkCBind
+        The eye-tracker, in offline mode with the data file closed.
+    edf_fname : str
+        The name of the EDF file on the EyeLink host PC.
+    edf_fname_local : str
+        The path to which to save the EDF file on the local PC.
+    n_retries : int
+        How often to retry if the transfer is incomplete. Defaults to 3.
+
+    Attributes
+    ----------
+    ok : bool
+        Whether the transfer succeeded.
+    n_attempts : int
+        The number of attempts so far.
+    checksum : str | None
+        The SHA-256 checksum of the transferred file.
+    error : str | None
+        A description of the last problem during the transfer.
+    """
+
+    def __init__(self, tk, edf_fname, edf_fname_local, n_retries=3):
+        """Prepare the transfer."""
+        super().__init__(daemon=True)
+        self.tk = tk
+        self.edf_fname = edf_fname
+        self.edf_fname_local = Path(edf_fname_local)
+        self.fname_tmp = self.edf_fname_local.with_name(
+            self.edf_fname_local.name + ".part"
+        )
+        self.n_retries = n_retries
+        self.ok = False
+        self.n_attempts = 0
+        self.checksum = None
+        self.error = None
+
+    @property
+    def bytes_received(self):
+        """The number of bytes received so far in the current attempt."""
+        for fname in [self.fname_tmp, self.edf_fname_local]:
+            try:
+                return os.path.getsize(fname)
+            except FileNotFoundError:
+                continue
+        return 0
+
+    def run(self):
+        """Transfer the file, retrying if it is incomplete."""
+        while not self.ok and self.n_attempts <= self.n_retries:
+            self.n_attempts += 1
+            try:
+                size = self.tk.receiveDataFile(self.edf_fname, str(self.fname_tmp))
+            except RuntimeError as err:
+                self.error = str(err)
+                continue
+
+            if size is None or size <= 0:
+                self.error = f"receiveDataFile returned {size}"
+                continue
+            size_local = self.bytes_received
+            if size_local != size:
+                self.error = f"Received {size_local} of {size} bytes"
+                continue
+
+            self.checksum = get_sha256(self.fname_tmp)
+            os.replace(self.fname_tmp, self.edf_fname_local)
+            fname_checksum = self.edf_fname_local.with_name(
+                self.edf_fname_local.name + ".sha256"
+            )
+            with open(fname_checksum, "w") as fout:
+                fout.write(f"{self.checksum}  {self.edf_fname_local.name}\n")
+            self.ok = True
+            self.error = None
+
+
+def get_sha256(fname, chunksize=2**20):
+    """Calculate the SHA-256 checksum of a file."""
+    sha256 = hashlib.sha256()
+    with open(fname, "rb") as fin:
+        for chunk in iter(lambda: fin.read(chunksize), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def verify_sha256(fname):
+    """Check a file against the checksum in its ".sha256" sidecar file.
+
+    This detects changes of a saved file since it was transferred, e.g., when
+    auditing data before an analysis.
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        The file, with a sidecar file as written by :class:`EDFTransfer`.
+
+    Returns
+    -------
+    ok : bool
+        Whether the SHA-256 checksum of the file matches the recorded one. False
+        if the file or the sidecar file does not exist.
+    """
+    fname = Path(fname)
+    try:
+        with open(fname.with_name(fname.name + ".sha256"), "r") as fin:
+            checksum = fin.read().split()[0]
+        return get_sha256(fname) == checksum
+    except (FileNotFoundError, IndexError):
+        return False
+
+
 def setup_eyetracker(dummy_mode, mon, edf_fname, calibration_type):
     """Do setup and calibrate the EyeLink.
 
@@ -0,0 +1,321 @@
+"""Define where key presses come from.
+
+All key presses in the experiment are collected through an input object with
+``waitKeys``, ``getKeys``, and ``clearEvents`` methods that mimic the functions of
+``psychopy.event`` (``clearEvents`` additionally takes the length of the upcoming
+response window as `maxWait`). ``waitKeys`` blocks until a key is pressed,
+``getKeys`` returns the keys pressed since the last call without blocking. Which
+object is used is set by INPUT_BACKEND in define_settings.py:
+
+- "keyboard": :class:`KeyboardInput`, the keyboard via ``psychopy.event``
+- "psychtoolbox": :class:`PsychtoolboxKeyboard`, the keyboard via the
+  hardware-timestamped keyboard queue of psychtoolbox
+- "scripted": :class:`ScriptedResponder`, simulated key presses from a response
+  model, to run complete sessions without a participant
+"""
+
+from time import perf_counter
+
+import numpy as np
+
+from ecomp_experiment.define_settings import KEYLIST_DICT
+
+
+class KeyboardInput:
+    """Get key presses from the keyboard via ``psychopy.event``."""
+
+    def waitKeys(self, maxWait=float("inf"), keyList=None, timeStamped=False):
+        """Wait for a key press, see ``psychopy.event.waitKeys``."""
+        from psychopy import event
+
+        return event.waitKeys(maxWait=maxWait, keyList=keyList, timeStamped=timeStamped)
+
+    def getKeys(self, keyList=None, timeStamped=False):
+        """Get the keys pressed so far, see ``psychopy.event.getKeys``."""
+        from psychopy import event
+
+        return event.getKeys(keyList=keyList, timeStamped=timeStamped)
+
+    def clearEvents(self, maxWait=float("inf")):
+        """Discard key presses so far. `maxWait` is not used."""
+        from psychopy import event
+
+        event.clearEvents(eventType="keyboard")
+
+
+class PsychtoolboxKeyboard:
+    """Get key presses from the keyboard queue of psychtoolbox.
+
+    Key presses are timestamped when they arrive at the keyboard queue, instead of
+    when they are processed in the event loop as for :class:`KeyboardInput`.
+    Response times are calculated relative to the last reset of the clock passed
+    as `timeStamped` to :meth:`waitKeys`. To get response times relative to the
+    flip of a prompt, reset the clock on that flip with
+    ``win.callOnFlip(clock.reset)``.
+
+    See Also
+    --------
+    ecomp_experiment.benchmark_keyboard
+    """
+
+    def __init__(self):
+        """Start the keyboard queue."""
+        from psychopy.hardware import keyboard
+
+        self.kb = keyboard.Keyboard(backend="ptb")
+        if self.kb.getBackend() != "ptb":
+            raise RuntimeError("The psychtoolbox keyboard backend is not available.")
+
+    def waitKeys(self, maxWait=float("inf"), keyList=None, timeStamped=False):
+        """Wait for a key press, see ``psychopy.event.waitKeys``.
+
+        Key presses from before the call are discarded. If `timeStamped` is
+        a ``psychopy.core.Clock``, the returned time is the hardware timestamp
+        of the key press relative to the last reset of the clock. If it is True,
+        the returned time is the absolute hardware timestamp.
+        """
+        self.kb.clearEvents()
+        keys = self.kb.waitKeys(maxWait=maxWait, keyList=keyList, waitRelease=False)
+        if not keys:
+            return None
+        return self._convert_keys(keys[:1], timeStamped)
+
+    def getKeys(self, keyList=None, timeStamped=False):
+        """Get the keys pressed so far, see ``psychopy.event.getKeys``.
+
+        The times are as for :meth:`waitKeys`.
+        """
+        keys = self.kb.getKeys(keyList=keyList, waitRelease=False)
+        return self._convert_keys(keys, timeStamped)
+
+    def clearEvents(self, maxWait=float("inf")):
+        """Discard key presses so far. `maxWait` is not used."""
+        self.kb.clearEvents()
+
+    def _convert_keys(self, keys, timeStamped):
+        """Convert key presses to key names, optionally with times."""
+        if timeStamped is False:
+            return [key.name for key in keys]
+        clock = None if timeStamped is True else timeStamped
+        return [(key.name, get_key_press_time(key, clock)) for key in keys]
+
+
+def get_key_press_time(key, clock=None):
+    """Get the time of a key press from ``psychopy.hardware.keyboard``.
+
+    ``key.tDown`` is relative to the last reset of ``psychopy.logging.defaultClock``,
+    whereas the last reset of a ``psychopy.core.Clock`` is an absolute time. So
+    ``key.tDown`` is converted to an absolute time first.
+
+    Parameters
+    ----------
+    key : psychopy.hardware.keyboard.KeyPress
+        The key press.
+    clock : psychopy.core.Clock | None
+        If not None, return the time relative to the last reset of this clock.
+        Defaults to None, which returns the absolute time.
+
+    Returns
+    -------
+    t : float
+        The time of the key press in seconds.
+    """
+    from psychopy import logging
+
+    t = key.tDown + logging.defaultClock.getLastResetTime()
+    if clock is not None:
+        t -= clock.getLastResetTime()
+    return t
+
+
+class ScriptedResponder:
+    """Simulate key presses of a participant.
+
+    Response times are drawn from a log-normal distribution. Keys are taken from
+    KEYLIST_DICT in define_settings.py: choices are made between the "left" and
+    "right" keys, and if only "quit" keys are accepted (e.g., during hard block
+    breaks), a "quit" key is pressed as the experimenter would.
+
+    For :meth:`getKeys`, a response is scheduled at :meth:`clearEvents`, and
+    returned by the first call to :meth:`getKeys` after its response time passed.
+    Responses that would come after the response window passed to
+    :meth:`clearEvents` are counted as timeouts.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window | define_window.VirtualWindow | None
+        If the window has a simulated clock (with ``wait`` and ``getTime``
+        methods, as a :class:`define_window.VirtualWindow`), that clock is
+        advanced by the response times. Otherwise, responses are returned
+        immediately, and the drawn response times are reported. Defaults to None.
+    rt_median_s : float
+        The median response time in seconds. Defaults to 0.6.
+    rt_sigma : float
+        The standard deviation of the logarithm of the response times.
+        Defaults to 0.4.
+    timeout_rate : float
+        The probability to not respond within `maxWait`, when a finite `maxWait`
+        is passed to :meth:`waitKeys`. Defaults to 0.02.
+    policy : {"random", "left", "right"} | callable
+        How to choose between "left" and "right". If callable, it is passed
+        a ``np.random.Generator`` and must return "left" or "right".
+        Defaults to "random".
+    seed : int | None
+        The seed for the random number generator. Defaults to None.
+
+    Attributes
+    ----------
+    n_presses : int
+        The number of simulated key presses.
+    n_timeouts : int
+        The number of simulated timeouts.
+    """
+
+    def __init__(
+        self,
+        win=None,
+        rt_median_s=0.6,
+        rt_sigma=0.4,
+        timeout_rate=0.02,
+        policy="random",
+        seed=None,
+    ):
+        """Initialize the responder."""
+        if not callable(policy) and policy not in ["random", "left", "right"]:
+            raise ValueError(f"Unknown policy: {policy}")
+        self.win = win
+        self.simulated = hasattr(win, "wait") and hasattr(win, "getTime")
+        self.rt_median_s = rt_median_s
+        self.rt_sigma = rt_sigma
+        self.timeout_rate = timeout_rate
+        self.policy = policy
+        self.rng = np.random.default_rng(seed)
+        self.n_presses = 0
+        self.n_timeouts = 0
+        self._due = None
+
+    def _choose_key(self, keyList):
+        """Choose a key to press out of `keyList`."""
+        actions = ["left", "right"]
+        if keyList is not None:
+            actions = [
+                action
+                for action in actions
+                if any(key in keyList for key in KEYLIST_DICT[action])
+            ]
+        if len(actions) == 0:
+            quit_keys = [key for key in keyList if key in KEYLIST_DICT["quit"]]
+            return quit_keys[0] if len(quit_keys) > 0 else keyList[0]
+
+        if callable(self.policy):
+            action = self.policy(self.rng)
+        elif self.policy == "random":
+            action = self.rng.choice(actions)
+        else:
+            action = self.policy
+        keys = KEYLIST_DICT[action]
+        if keyList is not None:
+            keys = [key for key in keys if key in keyList]
+        return keys[0]
+
+    def _wait(self, secs):
+        """Advance the simulated clock of the window."""
+        if self.simulated:
+            self.win.wait(secs)
+
+    def _now(self):
+        """Get the simulated time of the window, or the real time."""
+        if self.simulated:
+            return self.win.getTime()
+        return perf_counter()
+
+    def _draw_rt(self, maxWait):
+        """Draw a response time, or None for a timeout."""
+        rt = self.rng.lognormal(np.log(self.rt_median_s), self.rt_sigma)
+        timeout = np.isfinite(maxWait) and self.rng.random() < self.timeout_rate
+        if timeout or rt > maxWait:
+            return None
+        return rt
+
+    def waitKeys(self, maxWait=float("inf"), keyList=None, timeStamped=False):
+        """Simulate waiting for a key press, see ``psychopy.event.waitKeys``.
+
+        Returns
+        -------
+        keys : list | None
+            A list with the pressed key, or a list with a tuple ``(key, rt)``
+            if `timeStamped` is a clock or True. None if there was no key press
+            within `maxWait`.
+        """
+        rt = self._draw_rt(maxWait)
+        if rt is None:
+            self._wait(maxWait)
+            self.n_timeouts += 1
+            return None
+
+        self._wait(rt)
+        return self._press(keyList, timeStamped, rt)
+
+    def getKeys(self, keyList=None, timeStamped=False):
+        """Get the simulated key press, once its response time passed.
+
+        Returns
+        -------
+        keys : list
+            As for :meth:`waitKeys`, but empty if there is no key press (yet).
+        """
+        if self._due is None or self._now() < self._due[0]:
+            return []
+        _, rt = self._due
+        self._due = None
+        return self._press(keyList, timeStamped, rt)
+
+    def clearEvents(self, maxWait=float("inf")):
+        """Schedule a response for :meth:`getKeys`, counting from now.
+
+        With probability `timeout_rate`, or if the drawn response time is longer
+        than `maxWait` (the length of the response window in seconds), no
+        response is scheduled, and a timeout is counted.
+        """
+        rt = self._draw_rt(maxWait=np.inf)
+        if self.rng.random() < self.timeout_rate or rt > maxWait:
+            self.n_timeouts += 1
+            self._due = None
+        else:
+            self._due = (self._now() + rt, rt)
+
+    def _press(self, keyList, timeStamped, rt):
+        """Choose a key and return it as ``psychopy.event`` would."""
+        self.n_presses += 1
+        key = self._choose_key(keyList)
+        if timeStamped is False:
+            return [key]
+        if timeStamped is not True and self.simulated:
+            rt = timeStamped.getTime()
+        return [(key, rt)]
+
+
+def get_input(backend, win=None, seed=None):
+    """Get the object from which to collect key presses.
+
+    Parameters
+    ----------
+    backend : {"keyboard", "psychtoolbox", "scripted"}
+        The kind of input, see INPUT_BACKEND in define_settings.py.
+    win : psychopy.visual.Window | define_window.VirtualWindow | None
+        The window of the experiment, used by the "scripted" backend.
+    seed : int | None
+        The seed for the "scripted" backend.
+
+    Returns
+    -------
+    keyboard : KeyboardInput | PsychtoolboxKeyboard | ScriptedResponder
+        An object with ``waitKeys``, ``getKeys``, and ``clearEvents`` methods.
+    """
+    if backend == "keyboard":
+        return KeyboardInput()
+    elif backend == "psychtoolbox":
+        return PsychtoolboxKeyboard()
+    elif backend == "scripted":
+        return ScriptedResponder(win=win, seed=seed)
+    raise ValueError(f"Unknown input backend: {backend}")
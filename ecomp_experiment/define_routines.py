@@ -8,9 +8,9 @@ import shutil
 from pathlib import Path
 
 import numpy as np
-from psychopy import core, event, gui
 
 import ecomp_experiment
+from ecomp_experiment.define_input import KeyboardInput
 from ecomp_experiment.define_settings import (
     BLOCKSIZE,
     KEYLIST_DICT,
@@ -18,12 +18,12 @@ from ecomp_experiment.define_settings import (
     NSAMPLES,
     TEXT_HEIGHT_DVA,
 )
-from ecomp_experiment.define_stimuli import get_central_text_stim
+from ecomp_experiment.define_stimuli import get_stim_factory
 from ecomp_experiment.define_ttl import send_trigger
-from ecomp_experiment.utils import calc_accuracy, calc_bonus
+from ecomp_experiment.utils import calc_bonus
 
 
-def display_instructions(win, stream):
+def display_instructions(win, stream, keyboard=None):
     """Display participant instructions.
 
     Parameters
@@ -32,8 +32,12 @@ def display_instructions(win, stream):
         The psychopy window on which to draw the stimuli.
     stream : {"single", "dual"}
         The stream to run in the experiment.
+    keyboard : object | None
+        The input from which to collect key presses, see define_input.get_input.
+        If None (default), use the keyboard.
     """
-    text_stim = get_central_text_stim(win=win, height=TEXT_HEIGHT_DVA)
+    keyboard = KeyboardInput() if keyboard is None else keyboard
+    text_stim = get_stim_factory(win).get_central_text_stim(win, height=TEXT_HEIGHT_DVA)
 
     # prepare instructions
     common_instructions_start = [
@@ -99,7 +103,7 @@ def display_instructions(win, stream):
         text_stim.text = instructions[itext]
         text_stim.draw()
         win.flip()
-        keys = event.waitKeys(keyList=key_list)
+        keys = keyboard.waitKeys(keyList=key_list)
         if keys[0] in KEYLIST_DICT["quit"]:
             break
         elif keys[0] in KEYLIST_DICT["left"]:
@@ -133,6 +137,8 @@ def display_survey_gui():
     substr : str | None
         The subject identifier string, either of format f"{int}:02", or "test".
     """
+    from psychopy import core, gui
+
     # Check for real experiment or just a test run
     survey_gui1 = gui.Dlg(title="eComp Experiment")
     survey_gui1.addField(
@@ -239,7 +245,37 @@ def display_survey_gui():
     return run_type, streamdir, stream, substr
 
 
-def display_iti(win, min_ms, max_ms, fps, rng, trigger_kwargs):
+def update_info(info_fname, **fields):
+    """Add fields to the participant info file of a session.
+
+    Parameters
+    ----------
+    info_fname : pathlib.Path
+        The ``*_info.json`` file, see :func:`display_survey_gui`. It is created
+        if it does not exist.
+    **fields : dict
+        The fields to add or overwrite.
+    """
+    data = dict()
+    if Path(info_fname).exists():
+        with open(info_fname, "r") as fin:
+            data = json.load(fin)
+    data.update(fields)
+    with open(info_fname, "w") as fout:
+        json.dump(data, fout, indent=4, ensure_ascii=False, sort_keys=True)
+
+
+def display_iti(
+    win,
+    min_ms,
+    max_ms,
+    fps,
+    rng,
+    trigger_kwargs,
+    fixation_checker=None,
+    max_extra_frames=0,
+    idle_tasks=None,
+):
     """Display and return an inter-trial-interval.
 
     Parameters
@@ -256,6 +292,17 @@ def display_iti(win, min_ms, max_ms, fps, rng, trigger_kwargs):
     trigger_kwargs : dict
         Contains keys ser, tk, and byte. To be passed to the send_trigger
         function.
+    fixation_checker : define_eyetracking.FixationChecker | None
+        If not None, poll the eye-tracker once after each frame, and extend the
+        inter-trial-interval until fixation is stable, but by at most
+        `max_extra_frames`. Defaults to None, which does not check fixation.
+    max_extra_frames : int
+        The maximum number of frames by which to extend the inter-trial-interval
+        when using `fixation_checker`. Defaults to 0.
+    idle_tasks : list of callable | None
+        Functions to call without arguments, one after each frame (e.g., to
+        prepare the next trial), as long as there are frames left.
+        Defaults to None.
 
     Returns
     -------
@@ -266,9 +313,25 @@ def display_iti(win, min_ms, max_ms, fps, rng, trigger_kwargs):
     high = int(np.ceil((max_ms / 1000) * fps))
     iti_frames = rng.integers(low, high + 1)
 
+    idle_tasks = [] if idle_tasks is None else list(idle_tasks)
     win.callOnFlip(send_trigger, **trigger_kwargs)
-    for frame in range(iti_frames):
-        win.flip()
+    if fixation_checker is None:
+        for frame in range(iti_frames):
+            win.flip()
+            if len(idle_tasks) > 0:
+                idle_tasks.pop(0)()
+    else:
+        fixation_checker.reset()
+        max_frames = iti_frames + max_extra_frames
+        stable = False
+        frame = 0
+        while frame < iti_frames or (not stable and frame < max_frames):
+            win.flip()
+            stable = fixation_checker.update()
+            if len(idle_tasks) > 0:
+                idle_tasks.pop(0)()
+            frame += 1
+        iti_frames = frame
 
     iti_ms = (iti_frames / fps) * 1000
     return iti_ms
@@ -316,8 +379,86 @@ def display_trial(
         stim.setOpacity(orig_opacity)
 
 
+def display_response_window(
+    win,
+    choice_stims,
+    keyboard,
+    key_list,
+    max_frames,
+    rt_clock,
+    trigger_kwargs,
+    idle_tasks=None,
+    fps=None,
+):
+    """Display the response prompt and collect a response, flipping every frame.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window
+        The psychopy window on which to draw the stimuli.
+    choice_stims : list of psychopy.visual.text.TextStim
+        The stimuli of the response prompt, see define_stimuli.get_choice_stims.
+    keyboard : object
+        The input from which to collect key presses, see define_input.get_input.
+        It is polled once after each frame, without blocking.
+    key_list : list of str
+        The keys to accept.
+    max_frames : int
+        The maximum number of frames to wait for a response.
+    rt_clock : psychopy.core.Clock
+        The clock to time responses with. It is reset on the flip of the prompt.
+    trigger_kwargs : dict
+        Contains keys ser, tk, and byte. To be passed to the send_trigger
+        function on the flip of the prompt.
+    idle_tasks : list of callable | None
+        Functions without arguments to call in frames without a response, one
+        per frame, e.g., to flush the logfile. Tasks that are not done before
+        the response are dropped. Defaults to None.
+    fps : int | None
+        Refreshrate of the screen. If not None, the length of the response window
+        in seconds is passed to ``keyboard.clearEvents`` as `maxWait`, so that
+        a define_input.ScriptedResponder times out for late responses.
+        Defaults to None.
+
+    Returns
+    -------
+    key_rt : list of tuple | None
+        A list with a tuple of the pressed key and the response time in
+        seconds, as returned by ``psychopy.event.waitKeys``. None if there was no
+        response within `max_frames`.
+    n_frames : int
+        The number of frames that were shown, including the frame after which
+        the response was collected.
+    """
+    idle_tasks = [] if idle_tasks is None else list(idle_tasks)
+    keyboard.clearEvents(maxWait=float("inf") if fps is None else max_frames / fps)
+    win.callOnFlip(rt_clock.reset)
+    win.callOnFlip(send_trigger, **trigger_kwargs)
+    for frame in range(max_frames):
+        for stim in choice_stims:
+            stim.draw()
+        win.flip()
+
+        keys = keyboard.getKeys(keyList=key_list, timeStamped=rt_clock)
+        if len(keys) > 0:
+            return keys[:1], frame + 1
+
+        if len(idle_tasks) > 0:
+            idle_tasks.pop(0)()
+
+    return None, max_frames
+
+
 def display_block_break(
-    win, logfile, itrial, ntrials, blocksize, block_counter, hard_break, trigger_kwargs
+    win,
+    acc_tracker,
+    itrial,
+    ntrials,
+    blocksize,
+    block_counter,
+    hard_break,
+    trigger_kwargs,
+    keyboard=None,
 ):
     """Display a break screen, including feedback.
 
@@ -325,8 +466,9 @@ def display_block_break(
     ----------
     win : psychopy.visual.Window
         The psychopy window on which to draw the stimuli.
-    logfile : pathlib.Path
-        Path object pointing to the logfile for this stream.
+    acc_tracker : utils.AccuracyTracker
+        The running accuracy statistics for this stream, updated with all trials
+        up to and including the current trial.
     itrial : int
         The current trial number
     ntrials : int
@@ -343,6 +485,9 @@ def display_block_break(
     trigger_kwargs : dict
         Contains keys ser, tk, and byte. To be passed to the send_trigger
         function.
+    keyboard : object | None
+        The input from which to collect key presses, see define_input.get_input.
+        If None (default), use the keyboard.
 
     Returns
     -------
@@ -350,8 +495,9 @@ def display_block_break(
         A simple block counter, incremented by one compared to how it was passed
         into this function.
     """
+    keyboard = KeyboardInput() if keyboard is None else keyboard
     do_hard_break = block_counter % hard_break == 0
-    acc_overall, acc_block = calc_accuracy(logfile, blocksize)
+    acc_overall, acc_block = acc_tracker.get_accuracy()
 
     text = f"You have completed {itrial+1} of {ntrials} trials.\n\n"
     text += f"Your choices in the past {blocksize} trials "
@@ -363,19 +509,19 @@ def display_block_break(
     else:
         text += "Press any key to continue."
 
-    text_stim = get_central_text_stim(win, TEXT_HEIGHT_DVA, text)
+    text_stim = get_stim_factory(win).get_central_text_stim(win, TEXT_HEIGHT_DVA, text)
     text_stim.draw()
     win.callOnFlip(send_trigger, **trigger_kwargs)
     win.flip()
     if do_hard_break:
         # only pressing escape works (see KEYLIST_DICT in define_settings.py)
-        event.waitKeys(keyList=KEYLIST_DICT["quit"])
+        keyboard.waitKeys(keyList=KEYLIST_DICT["quit"])
 
         # then, a participant can start as they want
         text_stim.text = "Press any key to continue."
         text_stim.draw()
         win.flip()
 
-    event.waitKeys()
+    keyboard.waitKeys()
 
     return block_counter + 1
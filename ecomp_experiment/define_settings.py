@@ -37,6 +37,7 @@ DIGIT_FRAMES = int(np.round(digit_ms / (1000 / EXPECTED_FPS)))
 FADE_FRAMES = int(np.round(fade_ms / (1000 / EXPECTED_FPS)))
 
 MAXWAIT_RESPONSE_S = 3
+MAXWAIT_RESPONSE_FRAMES = int(np.round(MAXWAIT_RESPONSE_S * EXPECTED_FPS))
 TRAINING_FEEDBACK_FRAMES = EXPECTED_FPS * 2
 
 feedback_ms = 350
@@ -50,6 +51,21 @@ DELAY_FEEDBACK_FRAMES = int(np.round(delay_feedback_ms / (1000 / EXPECTED_FPS)))
 
 # Eye-tracker settings
 CALIBRATION_TYPE = "HV5"
+
+# Gaze-contingent inter-trial-interval: extend the ITI until gaze is stable
+# on the fixation stimulus for FIXATION_STABLE_MS (at most by MAX_ITI_EXTENSION_MS).
+# The eye-tracker is polled once per frame, with a time budget of
+# GAZE_POLL_BUDGET_FRAC times the frame duration. After GAZE_POLL_MAX_OVERRUNS
+# consecutive polls over budget, polling is turned off and ITIs are not extended.
+# Without an eye-tracker (TK_DUMMY_MODE, or training runs), ITIs are not extended.
+GAZE_CONTINGENT_ITI = False
+FIXATION_RADIUS_DVA = 1.5
+FIXATION_STABLE_MS = 200
+MAX_ITI_EXTENSION_MS = 2000
+GAZE_POLL_BUDGET_FRAC = 0.1
+GAZE_POLL_MAX_OVERRUNS = 3
+FIXATION_STABLE_FRAMES = int(np.ceil(FIXATION_STABLE_MS / (1000 / EXPECTED_FPS)))
+MAX_ITI_EXTENSION_FRAMES = int(np.ceil(MAX_ITI_EXTENSION_MS / (1000 / EXPECTED_FPS)))
 tk_auto_determine = True  # set to False if on Win, and no EyeLink wanted.
 TK_DUMMY_MODE = True
 if tk_auto_determine and os.name == "nt":
@@ -73,5 +89,51 @@ HARD_BREAK_TRAINING = 2
 
 SAME_TRIALS_OVER_CONDITIONS = True
 
+# Adaptive difficulty: instead of generating all trials before the session, generate
+# each trial during the preceding ITI, with an expected value difference that follows
+# a staircase to keep accuracy near TARGET_ACCURACY (see define_trials.TrialStaircase).
+# Trials then differ between single and dual stream, even if
+# SAME_TRIALS_OVER_CONDITIONS is True.
+ADAPTIVE_DIFFICULTY = False
+TARGET_ACCURACY = 0.75
+STAIRCASE_START_EV_DIFF = 2.0
+STAIRCASE_STEP_EV_DIFF = 0.1
+
+# When to flush the behavioral logfile to disk: "trial", "block", or "break"
+# (see utils.TrialLogger). Set LOG_FSYNC to True to also force an fsync.
+LOG_FLUSH_POLICY = "trial"
+LOG_FSYNC = False
+
+# Whether to write a typed, columnar .npz sidecar next to the behavioral logfile
+LOG_SIDECAR = False
+
+# Whether to profile the time spent per frame in each phase of the experiment,
+# saved as a *_frameprofile.tsv file next to the behavioral logfile
+PROFILE_FRAMES = False
+
+# Whether to draw the digits and the choice prompt from a single texture of
+# pre-rendered glyphs (see glyph_atlas.py) instead of with text stimuli, and the
+# font files to render the glyphs with (searched in the system font directories).
+# This needs a window with legacy OpenGL (pyglet < 2.0).
+USE_GLYPH_ATLAS = False
+GLYPH_ATLAS_FONT_FILES = dict(
+    regular="LiberationMono-Regular.ttf", bold="LiberationMono-Bold.ttf"
+)
+
+# Whether to pre-render the parts of the fixation stimulus into a single image
+# stimulus at startup (see define_stimuli.get_composite_fixation_stim), which is
+# drawn with one textured quad per frame instead of four shapes
+COMPOSITE_FIXATION_STIM = False
+
+# Where to publish a record of each trial while the experiment is running
+# (see telemetry.py): None to not publish, "host:port" for a TCP socket
+# (e.g., "127.0.0.1:8765"), or the path of a Unix socket
+TELEMETRY_ADDRESS = None
+
+# Where key presses come from (see define_input.py): "keyboard" for participants,
+# "psychtoolbox" for participants with hardware-timestamped key presses,
+# "scripted" for simulated responses
+INPUT_BACKEND = "keyboard"
+
 # acceptable keys to respond for actions "left", "right", and "quit"
 KEYLIST_DICT = dict(left=["left", "s"], right=["right", "d"], quit=["escape"])
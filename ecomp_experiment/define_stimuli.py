@@ -1,11 +1,19 @@
-"""Define stimuli for experiment."""
+"""Define stimuli for experiment.
+
+The experiment gets its stimuli from a stimulus factory chosen for the window (see
+:func:`get_stim_factory`), so that windows that do not draw with psychopy, e.g.,
+define_window.VirtualWindow, can provide their own stimuli.
+"""
 
 import numpy as np
-from psychopy import tools, visual
+
+from ecomp_experiment.define_settings import GLYPH_ATLAS_FONT_FILES
 
 
 def get_central_text_stim(win, height, text="", color=(1, 1, 1)):
     """Get a central text stimulus to use e.g., for the block break."""
+    from psychopy import visual
+
     text_stim = visual.TextStim(
         win=win,
         height=height,
@@ -21,7 +29,51 @@ def get_central_text_stim(win, height, text="", color=(1, 1, 1)):
     return text_stim
 
 
-def get_choice_stims(win, stream, state, height=1):
+def get_glyph_atlas(win, digit_height, choice_height, font_files=None):
+    """Render the glyphs of the digit and choice stimuli into a single texture.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window
+        The psychopy window on which to draw the glyphs.
+    digit_height : int | float
+        The height of the digits in degrees visual angle.
+    choice_height : int | float
+        The height of the choice stimuli in degrees visual angle.
+    font_files : dict | None
+        The font files with keys "regular" and "bold". If None (default),
+        GLYPH_ATLAS_FONT_FILES from define_settings.py.
+
+    Returns
+    -------
+    atlas : glyph_atlas.GlyphAtlas | None
+        The glyphs, with keys ``("digit", text)`` and ``("choice", text)``. None
+        for windows without legacy OpenGL, on which the digit and choice stimuli
+        are then made as usual.
+
+    """
+    if not getattr(win, "USE_LEGACY_GL", True):
+        print("Glyph atlas needs legacy OpenGL, using text stimuli instead.")
+        return None
+
+    from psychopy import tools
+
+    from ecomp_experiment.glyph_atlas import GlyphAtlas, load_font
+
+    font_files = GLYPH_ATLAS_FONT_FILES if font_files is None else font_files
+    digit_size = tools.monitorunittools.deg2pix(digit_height, win.monitor)
+    choice_size = tools.monitorunittools.deg2pix(choice_height, win.monitor)
+    digit_font = load_font(font_files["regular"], digit_size)
+    choice_font = load_font(font_files["regular"], choice_size)
+    arrow_font = load_font(font_files["bold"], choice_size)
+
+    glyphs = {("digit", str(digit)): (str(digit), digit_font) for digit in range(1, 10)}
+    glyphs.update({("choice", text): (text, choice_font) for text in ["5", "|"]})
+    glyphs.update({("choice", text): (text, arrow_font) for text in ["↑", "↓"]})
+    return GlyphAtlas(win, glyphs)
+
+
+def get_choice_stims(win, stream, state, height=1, atlas=None):
     """Get the stimuli used for inquiring participant choice.
 
     Parameters
@@ -35,6 +87,9 @@ def get_choice_stims(win, stream, state, height=1):
         which side (left/right) which answer option is displayed.
     height : int | float
         The height of the stimuli in degrees visual angle.
+    atlas : glyph_atlas.GlyphAtlas | None
+        If not None, draw the stimuli from this atlas (see get_glyph_atlas), in
+        which case `height` is that of the atlas.
 
     Returns
     -------
@@ -42,6 +97,8 @@ def get_choice_stims(win, stream, state, height=1):
         Stimuli to be displayed during choice phase of a trial.
 
     """
+    from psychopy import tools, visual
+
     # Common arguments to all choice stimuli
     kwargs = dict(
         win=win,
@@ -68,6 +125,11 @@ def get_choice_stims(win, stream, state, height=1):
         right_text = "↑"
         center_text = "|"
 
+    if atlas is not None:
+        return _get_atlas_choice_stims(
+            atlas, (left_text, center_text, right_text), (left_color, right_color)
+        )
+
     # Design one for center, one for left, and one for right
     center = visual.TextStim(
         **kwargs,
@@ -106,7 +168,33 @@ def get_choice_stims(win, stream, state, height=1):
     return choice_stims
 
 
-def get_digit_stims(win, height):
+def _get_atlas_choice_stims(atlas, texts, colors):
+    """Get the choice stimuli from a glyph atlas, laid out as the text stimuli."""
+    from ecomp_experiment.glyph_atlas import GlyphStim
+
+    left_text, center_text, right_text = texts
+    left_color, right_color = colors
+    center = GlyphStim(atlas, ("choice", center_text), color=(0, 0, 0))
+    center_width_pix, _ = atlas.get_size(("choice", center_text))
+    dist = (center_width_pix / 2) * 0.75
+    left = GlyphStim(
+        atlas,
+        ("choice", left_text),
+        pos=(-dist, 0),
+        color=left_color,
+        anchorHoriz="right",
+    )
+    right = GlyphStim(
+        atlas,
+        ("choice", right_text),
+        pos=(dist, 0),
+        color=right_color,
+        anchorHoriz="left",
+    )
+    return [left, center, right]
+
+
+def get_digit_stims(win, height, atlas=None):
     """Pre-generate all digit stimuli.
 
     Parameters
@@ -115,6 +203,9 @@ def get_digit_stims(win, height):
         The psychopy window on which to draw the stimuli.
     height : int | float
         height of the stimuli in degrees visual angle.
+    atlas : glyph_atlas.GlyphAtlas | None
+        If not None, draw the digits from this atlas (see get_glyph_atlas), in
+        which case `height` is that of the atlas.
 
     Returns
     -------
@@ -128,6 +219,15 @@ def get_digit_stims(win, height):
     digit_stims = dict()
     for digit in digits:
         color = (1, -1, -1) if digit < 0 else (-1, -1, 1)
+        if atlas is not None:
+            from ecomp_experiment.glyph_atlas import GlyphStim
+
+            key = ("digit", f"{np.abs(digit)}")
+            digit_stims[digit] = GlyphStim(atlas, key, color=color)
+            continue
+
+        from psychopy import visual
+
         stim = visual.TextStim(
             win,
             height=height,
@@ -170,6 +270,8 @@ def get_fixation_stim(win, back_color=(-1, -1, -1), stim_color=(0, 0, 0)):
        https://www.doi.org/10.1016/j.visres.2012.10.012
 
     """
+    from psychopy import visual
+
     # diameter outer circle = 0.6 degrees
     # diameter circle = 0.2 degrees
     outer = visual.Circle(
@@ -209,3 +311,107 @@ def get_fixation_stim(win, back_color=(-1, -1, -1), stim_color=(0, 0, 0)):
     )
 
     return (outer, inner, horz, vert)
+
+
+def get_composite_fixation_stim(win, back_color=(-1, -1, -1), stim_color=(0, 0, 0)):
+    """Pre-render the fixation stimulus into a single image stimulus.
+
+    The parts from get_fixation_stim are drawn once to the back buffer, and the
+    square around them is captured, so that the fixation stimulus is then drawn
+    with one textured quad per frame instead of four shapes. The capture is drawn
+    without interpolation at the same pixels, so it looks the same as the parts.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window
+        The psychopy window on which to draw the fixation stimulus. Its back
+        buffer is cleared.
+    back_color : tuple
+        Color of the background (-1=black, 0=gray, 1=white). Should be the color
+        of the window, which is captured around the stimulus.
+    stim_color : tuple
+        Color of the stimulus (-1=black, 0=gray, 1=white).
+
+    Returns
+    -------
+    fixation_stim : psychopy.visual.BufferImageStim
+        The fixation stimulus.
+
+    """
+    from psychopy import tools, visual
+
+    outer, inner, horz, vert = get_fixation_stim(win, back_color, stim_color)
+
+    # capture whole pixels around the center (with a margin for the outline of the
+    # outer circle), so that the image is drawn at the same pixels
+    half_width_pix = np.ceil(tools.monitorunittools.deg2pix(0.6 / 2, win.monitor)) + 2
+    fixation_stim = visual.BufferImageStim(
+        win,
+        stim=[outer, horz, vert, inner],
+        rect=_get_capture_rect(win.size, int(half_width_pix)),
+        interpolate=False,
+    )
+    return fixation_stim
+
+
+def _get_capture_rect(win_size, half_width_pix):
+    """Get the rect of whole pixels around the center of a window, in norm units.
+
+    On a window with an odd number of pixels, the center lies in the middle of
+    a pixel, so an odd number of pixels is captured along that dimension: the
+    center of the capture is then that of the window, and an image of the capture
+    drawn at the center of the window covers the captured pixels exactly. The
+    edges are a quarter pixel into the first and last pixel of the capture, so
+    that rounding them to pixels as in ``psychopy.visual.Window._getFrame`` gives
+    the intended pixels.
+
+    Parameters
+    ----------
+    win_size : array-like of int, shape(2,)
+        The width and height of the window in pixels.
+    half_width_pix : int
+        The number of pixels to capture on either side of the center.
+
+    Returns
+    -------
+    rect : list of float
+        The ``[left, top, right, bottom]`` edges in norm units.
+    """
+    win_size = np.asarray(win_size)
+    low = win_size // 2 - half_width_pix
+    high = (win_size + 1) // 2 + half_width_pix
+    left, bottom = 2 * (low + 0.25) / win_size - 1
+    right, top = 2 * (high + 0.25) / win_size - 1
+    return [left, top, right, bottom]
+
+
+class StimFactory:
+    """Make the stimuli of the experiment with psychopy.
+
+    The methods are the functions of the same name in this module.
+    """
+
+    get_central_text_stim = staticmethod(get_central_text_stim)
+    get_glyph_atlas = staticmethod(get_glyph_atlas)
+    get_choice_stims = staticmethod(get_choice_stims)
+    get_digit_stims = staticmethod(get_digit_stims)
+    get_fixation_stim = staticmethod(get_fixation_stim)
+    get_composite_fixation_stim = staticmethod(get_composite_fixation_stim)
+
+
+def get_stim_factory(win):
+    """Get the object that makes the stimuli for a window.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window | define_window.VirtualWindow
+        The window. If it has a ``stim_factory`` (e.g., a VirtualWindow), that
+        is returned.
+
+    Returns
+    -------
+    stim_factory : StimFactory | define_window.VirtualStimFactory
+        An object with the stimulus functions of this module as methods, e.g.,
+        ``stim_factory.get_digit_stims(win, height)``.
+    """
+    return getattr(win, "stim_factory", StimFactory())
@@ -1,4 +1,6 @@
 """Define trials for the experiment."""
+import functools
+
 import numpy as np
 
 
@@ -80,6 +82,37 @@ def gen_trials(n_trials, nsamples, prop_regen=0, seed=None):
     return trials
 
 
+def calc_trial_ev_diffs(trials):
+    """Calculate the expected value difference of each trial in both streams.
+
+    The expected value difference determines the difficulty of a trial: the
+    larger it is, the easier the trial. Trials with an expected value difference
+    of zero are ambiguous, see :func:`evaluate_trial_correct`.
+
+    Parameters
+    ----------
+    trials : np.ndarray, shape(n_trials, nsamples)
+        The trials to calculate expected value differences for.
+
+    Returns
+    -------
+    ev_diffs_single : np.ndarray, shape(n_trials,)
+        The absolute difference between the mean digit and the midpoint (5).
+    ev_diffs_dual : np.ndarray, shape(n_trials,)
+        The absolute difference between the mean red and the mean blue digit.
+    """
+    midpoint = 5
+    trials = np.atleast_2d(trials)
+    digits = np.abs(trials)
+    red = trials < 0
+
+    ev_diffs_single = np.abs(midpoint - digits.mean(axis=1))
+    mean_red = (digits * red).sum(axis=1) / red.sum(axis=1)
+    mean_blue = (digits * ~red).sum(axis=1) / (~red).sum(axis=1)
+    ev_diffs_dual = np.abs(mean_red - mean_blue)
+    return ev_diffs_single, ev_diffs_dual
+
+
 def calc_trial_difficulty_diffs(trials):
     """Calculate difficulty diffference of each trial between single and dual stream.
 
@@ -93,19 +126,221 @@ def calc_trial_difficulty_diffs(trials):
     difficulties_diffs : np.ndarray, shape(n_trials,)
         The difficulty differences of the trials.
     """
+    # Calc difficulty of single/dual task by means of "expected value difference"
+    ev_diffs_single, ev_diffs_dual = calc_trial_ev_diffs(trials)
+    difficulties_diffs = np.abs(ev_diffs_single - ev_diffs_dual)
+    return difficulties_diffs
+
+
+@functools.lru_cache(maxsize=None)
+def _count_digit_sums(ndigits):
+    """Count the sequences of digits between 1 and 9 with each sum.
+
+    Returns a read-only array of shape ``(ndigits + 1, 9 * ndigits + 1)``, in which
+    entry ``[k, total]`` is the number of sequences of `k` digits that sum to `total`.
+    """
+    counts = np.zeros((ndigits + 1, 9 * ndigits + 1), dtype=np.int64)
+    counts[0, 0] = 1
+    for k in range(1, ndigits + 1):
+        for digit in range(1, 10):
+            counts[k, digit:] += counts[k - 1, : counts.shape[1] - digit]
+    counts.flags.writeable = False
+    return counts
+
+
+def _sample_digits_with_sum(rng, ndigits, total):
+    """Sample `ndigits` digits between 1 and 9 that sum to `total`.
+
+    All sequences of digits with this sum are equally likely, as for digits drawn
+    uniformly and independently (as in :func:`gen_trial`) and conditioned on their
+    sum. Each digit is drawn with a probability proportional to the number of ways
+    in which the remaining digits can reach `total`.
+    """
+    assert ndigits <= total <= 9 * ndigits, "`total` is out of range."
+    counts = _count_digit_sums(ndigits)
+    candidates = np.arange(1, 10)
+    digits = np.zeros(ndigits, dtype=int)
+    for idigit in range(ndigits):
+        rest = total - candidates
+        nrest = ndigits - idigit - 1
+        weights = np.where(rest >= 0, counts[nrest, np.clip(rest, 0, None)], 0)
+        cumulative = np.cumsum(weights)
+        choice = np.searchsorted(cumulative, rng.random() * cumulative[-1], "right")
+        digits[idigit] = candidates[choice]
+        total -= digits[idigit]
+    return digits
+
+
+def get_ev_diff_range(nsamples, stream):
+    """Get the expected value differences that trials can have.
+
+    Parameters
+    ----------
+    nsamples : int
+        The number of digits shown per trial.
+    stream : {"single", "dual"}
+        The stream for which to calculate the expected value difference.
+
+    Returns
+    -------
+    step : float
+        The resolution of expected value differences, which is also the
+        smallest non-ambiguous expected value difference.
+    max_ev_diff : float
+        The largest expected value difference.
+    """
+    if stream == "single":
+        return 1 / nsamples, 4.0
+    assert stream == "dual"
+    return 2 / nsamples, 8.0
+
+
+def gen_trial_with_ev_diff(rng, nsamples, ev_diff, stream):
+    """Generate a trial with a given expected value difference.
+
+    Instead of generating trials until one matches, the sums of the digits
+    that produce `ev_diff` are chosen first, and digits are then sampled to
+    match these sums. This takes the same (short) time for any `ev_diff`.
+    Sums and digits are as likely as for trials from :func:`gen_trial` that
+    have this expected value difference.
+
+    Parameters
+    ----------
+    rng : np.random.Generator
+        The random number generator object based on which to
+        generate the trial.
+    nsamples : int
+        The number of digits shown per trial.
+    ev_diff : float
+        The expected value difference in `stream`, see
+        :func:`calc_trial_ev_diffs`. It is rounded to the nearest value
+        that a trial can have, see :func:`get_ev_diff_range`.
+    stream : {"single", "dual"}
+        The stream for which to match the expected value difference.
+
+    Returns
+    -------
+    color_samples : np.ndarray, shape(nsamples,)
+        Samples for this trial, see :func:`gen_trial`.
+    """
     midpoint = 5
-    difficulties_diffs = np.nan * np.zeros(trials.shape[0])
-    for itrial, trial in enumerate(trials):
+    half = int(nsamples / 2)
+    step, max_ev_diff = get_ev_diff_range(nsamples, stream)
+    nsteps = int(np.round(np.clip(ev_diff, 0, max_ev_diff) / step))
+    sign = rng.choice([-1, 1])
 
-        digits = np.abs(trial)
-        colors = np.sign(trial)
+    if stream == "single":
+        total = midpoint * nsamples + sign * nsteps
+        samples = _sample_digits_with_sum(rng, nsamples, total)
+        colors = rng.choice([-1, 1] * half, nsamples, replace=False)
+        return samples * colors
+
+    # nsteps is the difference between the sums of the red and the blue digits,
+    # choose the smaller sum as likely as it is for digits drawn as in gen_trial
+    assert stream == "dual"
+    counts = _count_digit_sums(half)[half]
+    totals = np.arange(half, 9 * half - nsteps + 1)
+    cumulative = np.cumsum(counts[totals] * counts[totals + nsteps])
+    total_red = totals[
+        np.searchsorted(cumulative, rng.random() * cumulative[-1], "right")
+    ]
+    total_blue = total_red + nsteps
+    if sign < 0:
+        total_red, total_blue = total_blue, total_red
+    color_samples = np.concatenate(
+        [
+            -_sample_digits_with_sum(rng, half, total_red),
+            _sample_digits_with_sum(rng, half, total_blue),
+        ]
+    )
+    return rng.permutation(color_samples)
+
+
+class TrialStaircase:
+    """Generate trials whose difficulty adapts to the accuracy of a participant.
+
+    The expected value difference of the next trial (see
+    :func:`calc_trial_ev_diffs`) follows a weighted up/down staircase: after
+    a correct choice it decreases by `step` (more difficult), after a wrong
+    choice it increases by ``step * target_accuracy / (1 - target_accuracy)``
+    (easier), which converges to `target_accuracy`.
 
-        # Calc difficulty of single/dual task by means of "expected value difference"
-        ev_diff_single = np.abs(midpoint - digits.mean())
-        ev_diff_dual = np.abs(digits[colors < 0].mean() - digits[colors > 0].mean())
-        difficulties_diffs[itrial] = np.abs(ev_diff_single - ev_diff_dual)
+    Parameters
+    ----------
+    nsamples : int
+        The number of digits shown per trial.
+    stream : {"single", "dual"}
+        The stream of the session.
+    target_accuracy : float
+        The accuracy to converge to, between 0.5 and 1.
+    start_ev_diff : float
+        The expected value difference of the first trial.
+    step : float
+        The decrease of the expected value difference after a correct choice.
+    seed : int | None
+        The seed for the random number generator.
 
-    return difficulties_diffs
+    Attributes
+    ----------
+    ev_diff : float
+        The expected value difference of the next trial.
+    ev_diffs : list of float
+        The expected value differences of all generated trials.
+    """
+
+    def __init__(
+        self, nsamples, stream, target_accuracy, start_ev_diff, step, seed=None
+    ):
+        """Initialize the staircase."""
+        assert 0.5 < target_accuracy < 1, "`target_accuracy` must be in (0.5, 1)."
+        self.nsamples = nsamples
+        self.stream = stream
+        self.step_down = step
+        self.step_up = step * target_accuracy / (1 - target_accuracy)
+        self.min_ev_diff, self.max_ev_diff = get_ev_diff_range(nsamples, stream)
+        self.ev_diff = float(np.clip(start_ev_diff, self.min_ev_diff, self.max_ev_diff))
+        self.ev_diffs = []
+        self.rng = np.random.default_rng(seed)
+        self._trial = None
+
+    def prepare(self):
+        """Generate the next trial in advance, e.g., during the ITI."""
+        self._trial = gen_trial_with_ev_diff(
+            self.rng, self.nsamples, self.ev_diff, self.stream
+        )
+
+    def next_trial(self):
+        """Get the next trial, generating it if it was not prepared.
+
+        Returns
+        -------
+        trial : np.ndarray, shape(nsamples,)
+            The samples of the next trial.
+        """
+        if self._trial is None:
+            self.prepare()
+        trial, self._trial = self._trial, None
+        self.ev_diffs.append(self.ev_diff)
+        return trial
+
+    def update(self, correct, ambiguous=False):
+        """Adapt the expected value difference to a choice.
+
+        Parameters
+        ----------
+        correct : bool | "n/a"
+            Whether the choice was correct, see :func:`evaluate_trial_correct`.
+            Timeouts ("n/a") and ambiguous trials do not change the staircase.
+        ambiguous : bool
+            Whether the trial was ambiguous. Defaults to False.
+        """
+        if correct == "n/a" or ambiguous:
+            return
+        if correct:
+            self.ev_diff -= self.step_down
+        else:
+            self.ev_diff += self.step_up
+        self.ev_diff = float(np.clip(self.ev_diff, self.min_ev_diff, self.max_ev_diff))
 
 
 def evaluate_trial_correct(trial, choice, stream):
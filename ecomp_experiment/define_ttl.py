@@ -10,8 +10,6 @@ However all TTL trigger codes for the "dual" task will be incremented by a const
 
 from time import perf_counter
 
-import serial
-
 DUAL_STREAM_CONST = 100
 
 
@@ -94,6 +92,8 @@ def get_ttl_dict():
 class FakeSerial:
     """Convenience class to run the code without true serial connection."""
 
+    out_waiting = 0
+
     def write(self, byte):
         """Take a byte and do nothing."""
         return byte
@@ -116,6 +116,8 @@ class MySerial:
         waitsecs : float
             Time in seconds to wait until resetting the serial port to zero.
         """
+        import serial
+
         if isinstance(ser, (serial.Serial, FakeSerial)):
             self.ser = ser
         else:
@@ -130,6 +132,11 @@ class MySerial:
         self.ser.write(self.reset_val)
         perf_sleep(self.waitsecs)
 
+    @property
+    def out_waiting(self):
+        """Get the number of bytes in the output buffer, not yet sent."""
+        return self.ser.out_waiting
+
 
 def perf_sleep(waitsecs):
     """Block execution of further code for `waitsecs` seconds."""
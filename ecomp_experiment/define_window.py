@@ -0,0 +1,256 @@
+"""Define a virtual window to run the experiment without a display.
+
+The :class:`VirtualWindow` implements the parts of ``psychopy.visual.Window``
+that are used in the experiment. Flips do not wait for a screen refresh, but
+advance a simulated clock by one frame, so that a session runs faster than real
+time, with the frame counts and the timing of triggers (relative to flips) intact.
+
+The code of the experiment does not check whether a window is virtual. Instead,
+a :class:`VirtualWindow` provides hooks for what differs from a psychopy window:
+its ``stim_factory`` makes :class:`VirtualStim` objects in place of the stimuli of
+define_stimuli.py (see define_stimuli.get_stim_factory), its ``getClock`` method
+makes clocks that run on the simulated time (see :func:`make_clock`), and its
+``wait`` method advances the simulated time (see :func:`wait`).
+"""
+
+from ecomp_experiment.define_settings import EXPECTED_FPS
+
+
+class VirtualWindow:
+    """Mimic a psychopy window, with a simulated clock.
+
+    Parameters
+    ----------
+    fps : int
+        The simulated refreshrate. Defaults to EXPECTED_FPS in define_settings.py.
+    size : tuple of int
+        The simulated window size in pixels. Defaults to ``(1920, 1080)``.
+    monitor : psychopy.monitors.Monitor | None
+        The monitor to use for unit conversions. Defaults to None.
+
+    Attributes
+    ----------
+    flips : list of dict
+        A record of each flip, with the keys "time" (in seconds since the window
+        was created), "n_draws" (the number of stimuli drawn in the frame, including
+        autoDraw stimuli), and "callbacks" (a list of ``(name, kwargs)`` tuples of
+        the functions called on the flip, e.g., ``send_trigger``).
+    nDroppedFrames : int
+        The number of dropped frames, which is always zero, because a simulated
+        frame cannot be late.
+    stim_factory : VirtualStimFactory
+        Makes the stimuli for this window, see define_stimuli.get_stim_factory.
+    """
+
+    def __init__(self, fps=EXPECTED_FPS, size=(1920, 1080), monitor=None):
+        """Initialize the window without flips."""
+        self.fps = fps
+        self.size = size
+        self.monitor = monitor
+        self.units = "deg"
+        self.mouseVisible = True
+        self.closed = False
+        self.flips = []
+        self.n_draws = 0
+        self.nDroppedFrames = 0
+        self.recordFrameIntervals = False
+        self.stim_factory = VirtualStimFactory()
+        self._n_frames = 0
+        self._extra_s = 0
+        self._to_call = []
+        self._to_draw = []
+
+    def getTime(self):
+        """Get the simulated time in seconds since the window was created."""
+        return self._n_frames / self.fps + self._extra_s
+
+    def wait(self, secs):
+        """Advance the simulated clock without flipping, like ``core.wait``."""
+        self._extra_s += secs
+
+    def getClock(self):
+        """Get a clock that runs on the simulated time, see :class:`VirtualClock`."""
+        return VirtualClock(self)
+
+    def callOnFlip(self, function, *args, **kwargs):
+        """Call a function right after the next flip."""
+        self._to_call.append((function, args, kwargs))
+
+    def flip(self, clearBuffer=True):
+        """Advance the simulated clock by one frame.
+
+        Returns
+        -------
+        flip_time : float
+            The simulated time of the flip.
+        """
+        for stim in self._to_draw:
+            stim.draw()
+
+        self._n_frames += 1
+        flip_time = self.getTime()
+
+        callbacks = []
+        for function, args, kwargs in self._to_call:
+            function(*args, **kwargs)
+            callbacks.append((getattr(function, "__name__", str(function)), kwargs))
+        self._to_call = []
+
+        self.flips.append(
+            dict(time=flip_time, n_draws=self.n_draws, callbacks=callbacks)
+        )
+        self.n_draws = 0
+        return flip_time
+
+    def getActualFrameRate(self, *args, **kwargs):
+        """Return the simulated refreshrate."""
+        return float(self.fps)
+
+    def close(self):
+        """Close the window."""
+        self.closed = True
+
+
+class VirtualStim:
+    """Mimic a psychopy stimulus for a :class:`VirtualWindow`.
+
+    Parameters
+    ----------
+    win : VirtualWindow
+        The window on which to "draw" the stimulus.
+    **kwargs : dict
+        Attributes of the stimulus, e.g., ``text``, ``color``, or ``pos``.
+    """
+
+    def __init__(self, win, **kwargs):
+        """Initialize the stimulus with its attributes."""
+        self.win = win
+        self.opacity = 1.0
+        self.autoDraw = False
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def draw(self, win=None):
+        """Count a draw on the window."""
+        win = self.win if win is None else win
+        win.n_draws += 1
+
+    def setOpacity(self, opacity):
+        """Set the opacity."""
+        self.opacity = opacity
+
+    def setAutoDraw(self, value):
+        """Draw the stimulus on each flip of the window, or stop doing so."""
+        if value and not self.autoDraw:
+            self.win._to_draw.append(self)
+        elif not value and self.autoDraw:
+            self.win._to_draw.remove(self)
+        self.autoDraw = value
+
+
+class VirtualStimFactory:
+    """Make :class:`VirtualStim` objects in place of the stimuli of define_stimuli.py.
+
+    The methods take the same arguments as the functions of the same name in
+    define_stimuli.py, and return virtual stimuli with the same structure.
+    """
+
+    def get_central_text_stim(self, win, height, text="", color=(1, 1, 1)):
+        """Get a virtual central text stimulus."""
+        return VirtualStim(win, height=height, text=text, color=color)
+
+    def get_glyph_atlas(self, win, digit_height, choice_height, font_files=None):
+        """Return None, virtual stimuli are not drawn from a glyph atlas."""
+        return None
+
+    def get_choice_stims(self, win, stream, state, height=1, atlas=None):
+        """Get the three virtual choice stimuli."""
+        return [VirtualStim(win, height=height) for i in range(3)]
+
+    def get_digit_stims(self, win, height, atlas=None):
+        """Get the virtual digit stimuli, with keys -9 to -1 and 1 to 9."""
+        digits = [-9, -8, -7, -6, -5, -4, -3, -2, -1, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+        return {
+            digit: VirtualStim(
+                win,
+                height=height,
+                color=(1, -1, -1) if digit < 0 else (-1, -1, 1),
+                text=f"{abs(digit)}",
+            )
+            for digit in digits
+        }
+
+    def get_fixation_stim(self, win, back_color=(-1, -1, -1), stim_color=(0, 0, 0)):
+        """Get the four virtual parts of the fixation stimulus."""
+        return tuple(VirtualStim(win) for i in range(4))
+
+    def get_composite_fixation_stim(
+        self, win, back_color=(-1, -1, -1), stim_color=(0, 0, 0)
+    ):
+        """Get a virtual fixation stimulus drawn as one image."""
+        return VirtualStim(win)
+
+
+class VirtualClock:
+    """Mimic ``psychopy.core.Clock``, using the clock of a :class:`VirtualWindow`.
+
+    Parameters
+    ----------
+    win : VirtualWindow
+        The window with the simulated clock.
+    """
+
+    def __init__(self, win):
+        """Start the clock."""
+        self.win = win
+        self.reset()
+
+    def reset(self):
+        """Reset the clock to zero."""
+        self._start = self.win.getTime()
+
+    def getTime(self):
+        """Get the time in seconds since the last reset."""
+        return self.win.getTime() - self._start
+
+
+def make_clock(win):
+    """Get a clock that runs on the time of a window.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window | VirtualWindow
+        The window. If it has a ``getClock`` method (e.g., a
+        :class:`VirtualWindow`), the clock is made with it.
+
+    Returns
+    -------
+    clock : psychopy.core.Clock | VirtualClock
+        The clock.
+    """
+    if hasattr(win, "getClock"):
+        return win.getClock()
+
+    from psychopy import core
+
+    return core.Clock()
+
+
+def wait(win, secs):
+    """Wait for a time on the time of a window.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window | VirtualWindow
+        The window. If it has a ``wait`` method (e.g., a :class:`VirtualWindow`),
+        that is used, otherwise ``psychopy.core.wait``.
+    secs : float
+        The time to wait in seconds.
+    """
+    if hasattr(win, "wait"):
+        win.wait(secs)
+        return
+
+    from psychopy import core
+
+    core.wait(secs)
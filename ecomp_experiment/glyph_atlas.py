@@ -0,0 +1,302 @@
+"""Draw digits and symbols from a single texture of pre-rendered glyphs.
+
+Each psychopy.visual.TextStim lays out its own text and keeps its own textures.
+Instead, all glyphs that are shown during trials (the digits, and the symbols of
+the choice prompt) can be rendered once with Pillow into a single image, the
+atlas, which is uploaded as one texture. Each glyph is then drawn as a textured
+quad, with its color and opacity applied at the time of drawing, so that drawing
+a glyph costs the same in every frame. See USE_GLYPH_ATLAS in define_settings.py.
+
+Glyphs are drawn with the fixed-function OpenGL pipeline, as psychopy stimuli are
+drawn in windows with legacy OpenGL (pyglet < 2.0).
+"""
+
+import numpy as np
+
+
+def load_font(fname, size):
+    """Load a TrueType font.
+
+    Parameters
+    ----------
+    fname : str | pathlib.Path
+        The font file. If it is not a path to a file, it is searched in the font
+        directories of the system, e.g., "LiberationMono-Regular.ttf".
+    size : float
+        The font size (the height of the em square) in pixels.
+
+    Returns
+    -------
+    font : PIL.ImageFont.FreeTypeFont
+        The font.
+    """
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(str(fname), size=int(round(size)))
+    except OSError as error:
+        raise OSError(
+            f"Font file not found: {fname}. Install it, or set "
+            "GLYPH_ATLAS_FONT_FILES in define_settings.py."
+        ) from error
+
+
+def render_glyph_atlas(glyphs, max_width=1024, padding=2):
+    """Render glyphs into a single image.
+
+    Each glyph gets a cell that contains its layout box (its advance width, and
+    the line height of its font, as the text box of a psychopy.visual.TextStim
+    with a single character) and all of its pixels. Cells are placed in rows.
+
+    Parameters
+    ----------
+    glyphs : dict
+        Maps the key of each glyph to a tuple ``(text, font)``, with the text to
+        render (usually one character), and a font (see :func:`load_font`).
+    max_width : int
+        The maximum width of the image in pixels. Defaults to 1024.
+    padding : int
+        The number of empty pixels around each cell. Defaults to 2.
+
+    Returns
+    -------
+    image : np.ndarray of np.uint8, shape(height, width)
+        The coverage of each pixel by the glyphs, from 0 to 255.
+    cells : dict
+        Maps the key of each glyph to a dict with the keys "box" (the cell in
+        the image, as ``(x0, y0, x1, y1)`` in pixels, with y pointing down),
+        "size" (the width and height of the layout box), and "offset" (the
+        position of the center of the cell relative to the center of the layout
+        box, with y pointing up).
+    """
+    from PIL import Image, ImageDraw
+
+    cells = dict()
+    for key, (text, font) in glyphs.items():
+        ascent, descent = font.getmetrics()
+        layout = (0, 0, int(np.ceil(font.getlength(text))), ascent + descent)
+        ink = font.getbbox(text)
+        extent = (
+            min(layout[0], ink[0]),
+            min(layout[1], ink[1]),
+            max(layout[2], ink[2]),
+            max(layout[3], ink[3]),
+        )
+        cells[key] = dict(
+            extent=extent,
+            size=(layout[2], layout[3]),
+            offset=(
+                (extent[0] + extent[2] - layout[2]) / 2,
+                -(extent[1] + extent[3] - layout[3]) / 2,
+            ),
+        )
+
+    # place the cells in rows, starting a new row when a row is full
+    x, y, row_height = padding, padding, 0
+    for cell in cells.values():
+        width = cell["extent"][2] - cell["extent"][0]
+        height = cell["extent"][3] - cell["extent"][1]
+        if x + width + padding > max_width and x > padding:
+            x, y, row_height = padding, y + row_height + padding, 0
+        cell["box"] = (x, y, x + width, y + height)
+        x += width + padding
+        row_height = max(row_height, height)
+
+    width = max([cell["box"][2] for cell in cells.values()], default=0) + padding
+    image = Image.new("L", (width, y + row_height + padding), 0)
+    draw = ImageDraw.Draw(image)
+    for key, (text, font) in glyphs.items():
+        cell = cells[key]
+        origin = (
+            cell["box"][0] - cell["extent"][0],
+            cell["box"][1] - cell["extent"][1],
+        )
+        draw.text(origin, text, fill=255, font=font)
+        del cell["extent"]
+
+    return np.asarray(image), cells
+
+
+class GlyphAtlas:
+    """Glyphs in a single texture, drawn as textured quads on a window.
+
+    The texture is uploaded on the first draw.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window
+        The window to draw on.
+    glyphs : dict
+        Maps the key of each glyph to a tuple ``(text, font)``, see
+        :func:`render_glyph_atlas`.
+    max_width : int
+        The maximum width of the texture in pixels. Defaults to 1024.
+    """
+
+    def __init__(self, win, glyphs, max_width=1024):
+        """Render the glyphs."""
+        self.win = win
+        self.image, self.cells = render_glyph_atlas(glyphs, max_width=max_width)
+        self.n_uploads = 0
+        self._texture_id = None
+
+        # the corners of the quad of each glyph, relative to the center of its
+        # layout box, and their texture coordinates
+        height, width = self.image.shape
+        self._quads = dict()
+        for key, cell in self.cells.items():
+            x0, y0, x1, y1 = cell["box"]
+            dx, dy = cell["offset"]
+            half_width, half_height = (x1 - x0) / 2, (y1 - y0) / 2
+            vertices = np.array(
+                [
+                    [dx - half_width, dy - half_height],
+                    [dx + half_width, dy - half_height],
+                    [dx + half_width, dy + half_height],
+                    [dx - half_width, dy + half_height],
+                ]
+            )
+            # the first row of the image is at texture coordinate 0
+            tex_coords = np.array([[x0, y1], [x1, y1], [x1, y0], [x0, y0]]) / [
+                width,
+                height,
+            ]
+            self._quads[key] = (vertices, tex_coords)
+
+    def get_size(self, key):
+        """Get the width and height of the layout box of a glyph in pixels."""
+        return self.cells[key]["size"]
+
+    def get_quad(self, key, pos):
+        """Get the quad to draw a glyph.
+
+        Parameters
+        ----------
+        key : object
+            The key of the glyph.
+        pos : tuple of float
+            The position of the center of the layout box of the glyph, in pixels
+            relative to the center of the window.
+
+        Returns
+        -------
+        vertices : np.ndarray, shape(4, 2)
+            The corners of the quad in pixels, counterclockwise from the bottom left.
+        tex_coords : np.ndarray, shape(4, 2)
+            The texture coordinates of the corners.
+        """
+        vertices, tex_coords = self._quads[key]
+        return vertices + pos, tex_coords
+
+    def _upload(self):
+        """Upload the image as a texture, white with the coverage as alpha."""
+        import ctypes
+
+        import pyglet.gl as GL
+
+        height, width = self.image.shape
+        rgba = np.full((height, width, 4), 255, dtype=np.uint8)
+        rgba[..., 3] = self.image
+
+        texture_id = GL.GLuint()
+        GL.glGenTextures(1, ctypes.byref(texture_id))
+        GL.glBindTexture(GL.GL_TEXTURE_2D, texture_id)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_EDGE)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_CLAMP_TO_EDGE)
+        GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+        GL.glTexImage2D(
+            GL.GL_TEXTURE_2D,
+            0,
+            GL.GL_RGBA,
+            width,
+            height,
+            0,
+            GL.GL_RGBA,
+            GL.GL_UNSIGNED_BYTE,
+            rgba.ctypes.data_as(ctypes.POINTER(GL.GLubyte)),
+        )
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        self._texture_id = texture_id
+        self.n_uploads += 1
+
+    def draw(self, key, pos, color, opacity=1.0, win=None):
+        """Draw a glyph.
+
+        Parameters
+        ----------
+        key : object
+            The key of the glyph.
+        pos : tuple of float
+            The position of the center of the layout box of the glyph, in pixels
+            relative to the center of the window.
+        color : tuple of float
+            The RGB color, from -1 to 1 as for psychopy stimuli.
+        opacity : float
+            The opacity, from 0 to 1. Defaults to 1.
+        win : psychopy.visual.Window | None
+            The window to draw on. If None (default), the window of the atlas.
+        """
+        import pyglet.gl as GL
+
+        win = self.win if win is None else win
+        if self._texture_id is None:
+            self._upload()
+        vertices, tex_coords = self.get_quad(key, pos)
+        red, green, blue = (np.asarray(color, dtype=float) + 1) / 2
+
+        GL.glPushMatrix()
+        win.setScale("pix")
+        GL.glEnable(GL.GL_TEXTURE_2D)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self._texture_id)
+        GL.glTexEnvi(GL.GL_TEXTURE_ENV, GL.GL_TEXTURE_ENV_MODE, GL.GL_MODULATE)
+        GL.glColor4f(red, green, blue, opacity)
+        GL.glBegin(GL.GL_QUADS)
+        for (u, v), (x, y) in zip(tex_coords, vertices):
+            GL.glTexCoord2f(u, v)
+            GL.glVertex2f(x, y)
+        GL.glEnd()
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        GL.glDisable(GL.GL_TEXTURE_2D)
+        GL.glPopMatrix()
+
+
+class GlyphStim:
+    """A glyph of a :class:`GlyphAtlas`, drawn like a psychopy stimulus.
+
+    Parameters
+    ----------
+    atlas : GlyphAtlas
+        The atlas that contains the glyph.
+    key : object
+        The key of the glyph in the atlas.
+    pos : tuple of float
+        The position in pixels relative to the center of the window.
+        Defaults to (0, 0).
+    color : tuple of float
+        The RGB color, from -1 to 1. Defaults to white.
+    anchorHoriz : {"center", "left", "right"}
+        Which part of the layout box of the glyph is at `pos`, as for
+        psychopy.visual.TextStim. Defaults to "center".
+    """
+
+    def __init__(self, atlas, key, pos=(0, 0), color=(1, 1, 1), anchorHoriz="center"):
+        """Place the glyph."""
+        self.atlas = atlas
+        self.win = atlas.win
+        self.key = key
+        self.pos = pos
+        self.color = color
+        self.opacity = 1.0
+        width, _ = atlas.get_size(key)
+        shift = dict(center=0, left=width / 2, right=-width / 2)[anchorHoriz]
+        self._center = (pos[0] + shift, pos[1])
+
+    def draw(self, win=None):
+        """Draw the glyph."""
+        self.atlas.draw(self.key, self._center, self.color, self.opacity, win=win)
+
+    def setOpacity(self, opacity):
+        """Set the opacity."""
+        self.opacity = opacity
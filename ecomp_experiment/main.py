@@ -2,342 +2,613 @@
 
 # %%
 import datetime
+from pathlib import Path
 
 import numpy as np
-from psychopy import core, event, monitors, visual
 
 from ecomp_experiment.define_eyetracking import (
+    DummyEyeLink,
+    FixationChecker,
+    close_eyetracker,
     setup_eyetracker,
     start_eye_recording,
     stop_eye_recording,
 )
+from ecomp_experiment.define_input import get_input
 from ecomp_experiment.define_routines import (
     display_block_break,
     display_instructions,
     display_iti,
+    display_response_window,
     display_survey_gui,
     display_trial,
+    update_info,
 )
 from ecomp_experiment.define_settings import (
+    ADAPTIVE_DIFFICULTY,
     BLOCKSIZE,
     BLOCKSIZE_TRAINING,
     CALIBRATION_TYPE,
     CHOICE_STIM_HEIGHT_DVA,
+    COMPOSITE_FIXATION_STIM,
     DELAY_FEEDBACK_FRAMES,
     DIGIT_FRAMES,
     DIGIT_HEIGHT_DVA,
     EXPECTED_FPS,
     FADE_FRAMES,
     FEEDBACK_FRAMES,
+    FIXATION_RADIUS_DVA,
+    FIXATION_STABLE_FRAMES,
     FIXSTIM_OFF_FRAMES,
     FULLSCR,
+    GAZE_CONTINGENT_ITI,
+    GAZE_POLL_BUDGET_FRAC,
+    GAZE_POLL_MAX_OVERRUNS,
     HARD_BREAK,
     HARD_BREAK_TRAINING,
+    INPUT_BACKEND,
     KEYLIST_DICT,
+    LOG_FLUSH_POLICY,
+    LOG_FSYNC,
+    LOG_SIDECAR,
+    MAX_ITI_EXTENSION_FRAMES,
     MAX_ITI_MS,
-    MAXWAIT_RESPONSE_S,
+    MAXWAIT_RESPONSE_FRAMES,
     MIN_ITI_MS,
     MONITOR_NAME,
     NSAMPLES,
     NTRIALS,
     NTRIALS_TRAINING,
+    PROFILE_FRAMES,
     SAME_TRIALS_OVER_CONDITIONS,
     SER_ADDRESS,
     SER_WAITSECS,
     SHOW_FEEDBACK,
+    STAIRCASE_START_EV_DIFF,
+    STAIRCASE_STEP_EV_DIFF,
+    TARGET_ACCURACY,
+    TELEMETRY_ADDRESS,
     TEXT_HEIGHT_DVA,
     TIMEOUT_FRAMES,
     TK_DUMMY_MODE,
     TRAINING_FEEDBACK_FRAMES,
+    USE_GLYPH_ATLAS,
 )
-from ecomp_experiment.define_stimuli import (
-    get_central_text_stim,
-    get_choice_stims,
-    get_digit_stims,
-    get_fixation_stim,
+from ecomp_experiment.define_stimuli import get_central_text_stim, get_stim_factory
+from ecomp_experiment.define_trials import (
+    TrialStaircase,
+    evaluate_trial_correct,
+    gen_trials,
 )
-from ecomp_experiment.define_trials import evaluate_trial_correct, gen_trials
 from ecomp_experiment.define_ttl import FakeSerial, MySerial, get_ttl_dict, send_trigger
-from ecomp_experiment.utils import check_framerate, map_key_to_choice, save_dict
-
-# Prepare logging
-run_type, streamdir, stream, substr = display_survey_gui()
-
-# *if just bonus*, display and quit.
-if run_type == "bonus":
-    core.quit()
-
-# *if just training*, adjust trials.
-if run_type == "training":
-    ntrials = NTRIALS_TRAINING
-    blocksize = BLOCKSIZE_TRAINING
-    hard_break = HARD_BREAK_TRAINING
-else:
-    ntrials = NTRIALS
-    blocksize = BLOCKSIZE
-    hard_break = HARD_BREAK
-
-# Prepare monitor
-my_monitor = monitors.Monitor(name=MONITOR_NAME)
-
-# prepare the window
-width, height = my_monitor.getSizePix()
-
-win = visual.Window(
-    color=(-1, -1, -1),
-    fullscr=FULLSCR,
-    monitor=my_monitor,
-    units="deg",
-    winType="pyglet",
-    size=(width, height),
+from ecomp_experiment.define_window import make_clock, wait
+from ecomp_experiment.profiling import FrameProfiler
+from ecomp_experiment.telemetry import TelemetryPublisher
+from ecomp_experiment.utils import (
+    AccuracyTracker,
+    TrialLogger,
+    check_framerate,
+    map_key_to_choice,
 )
-win.mouseVisible = False
-
-fps = check_framerate(win, EXPECTED_FPS)
 
-# *if just instructions*, display and quit.
-if run_type == "instructions":
-    display_instructions(win, stream)
-    win.close()
-    core.quit()
 
-# Prepare logfile
-if streamdir is not None:
-    logfile = streamdir / f"sub-{substr}_stream-{stream}_beh.tsv"
-
-# Prepare eyetracking
-# (only track eyes in "experiment" mode and if TK_DUMMY_MODE is False)
-month_day_hour_minute = datetime.datetime.today().strftime("%m%d%H%M")
-edf_fname = f"{month_day_hour_minute}.edf"
-tk_dummy_mode = TK_DUMMY_MODE if run_type == "experiment" else True
-tk = setup_eyetracker(tk_dummy_mode, my_monitor, edf_fname, CALIBRATION_TYPE)
-
-# prepare the trials
-trlgen_seed = None
-if (substr != "test") and (substr is not None) and SAME_TRIALS_OVER_CONDITIONS:
-    # subjs get the same trials for single and dual
-    trlgen_seed = int(substr)
-trials = gen_trials(ntrials, NSAMPLES, seed=trlgen_seed)
-
-# get stimuli
-digit_stims = get_digit_stims(win, height=DIGIT_HEIGHT_DVA)
-
-outer, inner, horz, vert = get_fixation_stim(win)
-fixation_stim_parts = [outer, horz, vert, inner]
-
-# Start eye-tracking
-error = start_eye_recording(tk)
-assert error == 0, "Problem during eye-tracker setup."
-
-# Setup serial port
-ttl_dict = get_ttl_dict()
-
-if SER_ADDRESS is None:
-    ser_port = MySerial(FakeSerial(), waitsecs=SER_WAITSECS)
-    print("No serial port specified. We will not send TTL triggers to EEG.")
-else:
-    ser_port = MySerial(SER_ADDRESS, waitsecs=SER_WAITSECS)
-
-trigger_kwargs = dict(ser=ser_port, tk=tk, byte=bytes([0]))
-send_trigger(**trigger_kwargs)
-
-# Start experiment
-# ----------------
-key_list = [key for action_list in KEYLIST_DICT.values() for key in action_list]
-start_stim = get_central_text_stim(
+def run_session(
     win,
-    height=TEXT_HEIGHT_DVA,
-    text="-> Please wait for the experimenter. <-",
-)
-start_stim.draw()
-win.flip()
-event.waitKeys(keyList=KEYLIST_DICT["quit"])
+    fps,
+    keyboard,
+    tk,
+    ser_port,
+    run_type,
+    streamdir,
+    stream,
+    substr,
+    fixation_checker=None,
+    ntrials=None,
+    telemetry=None,
+):
+    """Run the trials of a session, from the start screen to the end screen.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window | define_window.VirtualWindow
+        The window on which to draw the stimuli.
+    fps : int
+        Refreshrate of the screen.
+    keyboard : object
+        The input from which to collect key presses, see define_input.get_input.
+    tk : DummyEyeLink | EyeLinkCBind
+        The eye-tracker, see define_eyetracking.setup_eyetracker.
+    ser_port : define_ttl.MySerial
+        The serial port to send TTL triggers to.
+    run_type : {"experiment", "training"}
+        The type of run, see define_routines.display_survey_gui.
+    streamdir : pathlib.Path
+        The directory to which to save the data.
+    stream : {"single", "dual"}
+        The stream to run.
+    substr : str
+        The subject identifier string, either of format f"{int}:02", or "test".
+    fixation_checker : define_eyetracking.FixationChecker | None
+        If not None, use a gaze-contingent inter-trial-interval, see
+        define_routines.display_iti. Defaults to None.
+    ntrials : int | None
+        The number of trials. If None (default), use NTRIALS or NTRIALS_TRAINING
+        from define_settings.py, depending on `run_type`.
+    telemetry : telemetry.TelemetryPublisher | None
+        If not None, publish a record of each trial, with the number of frames
+        dropped during the trial and the number of trigger bytes not yet sent by
+        the serial port. Defaults to None.
+
+    Returns
+    -------
+    logfile : pathlib.Path
+        The behavioral logfile of the session.
+    """
+    from psychopy import core
+
+    # *if just training*, adjust trials.
+    if run_type == "training":
+        ntrials = NTRIALS_TRAINING if ntrials is None else ntrials
+        blocksize = BLOCKSIZE_TRAINING
+        hard_break = HARD_BREAK_TRAINING
+    else:
+        ntrials = NTRIALS if ntrials is None else ntrials
+        blocksize = BLOCKSIZE
+        hard_break = HARD_BREAK
 
-start_stim.text = "Press any key to start."
-start_stim.draw()
-win.flip()
-event.waitKeys()
+    # Prepare logfile
+    logfile = streamdir / f"sub-{substr}_stream-{stream}_beh.tsv"
+    logger = TrialLogger(
+        logfile, flush_policy=LOG_FLUSH_POLICY, fsync=LOG_FSYNC, sidecar=LOG_SIDECAR
+    )
 
-# Show fixstim
-for stim in fixation_stim_parts:
-    stim.setAutoDraw(True)
-win.flip()
+    # prepare the trials, and record how they are generated to validate the session
+    update_info(
+        streamdir.parent / f"sub-{substr}_stream-{stream}_info.json",
+        same_trials_over_conditions=SAME_TRIALS_OVER_CONDITIONS,
+        adaptive_difficulty=ADAPTIVE_DIFFICULTY,
+    )
+    trlgen_seed = None
+    if (substr != "test") and (substr is not None) and SAME_TRIALS_OVER_CONDITIONS:
+        # subjs get the same trials for single and dual
+        trlgen_seed = int(substr)
+    staircase = None
+    if ADAPTIVE_DIFFICULTY:
+        # trials are generated during the ITI before each trial
+        staircase = TrialStaircase(
+            NSAMPLES,
+            stream,
+            TARGET_ACCURACY,
+            STAIRCASE_START_EV_DIFF,
+            STAIRCASE_STEP_EV_DIFF,
+            seed=trlgen_seed,
+        )
+    else:
+        trials = gen_trials(ntrials, NSAMPLES, seed=trlgen_seed)
 
-trigger_kwargs["byte"] = ttl_dict[f"{stream}_begin_experiment"]
-send_trigger(**trigger_kwargs)
-core.wait(1)
+    # get stimuli, optionally with the digits and choice stimuli drawn from one texture
+    stimuli = get_stim_factory(win)
+    atlas = None
+    if USE_GLYPH_ATLAS:
+        atlas = stimuli.get_glyph_atlas(win, DIGIT_HEIGHT_DVA, CHOICE_STIM_HEIGHT_DVA)
+    digit_stims = stimuli.get_digit_stims(win, height=DIGIT_HEIGHT_DVA, atlas=atlas)
 
-rt_clock = core.Clock()
-iti_rng = np.random.default_rng()
-state_rng = np.random.default_rng()
-block_counter = 1  # start with first block
-for itrial, trial in enumerate(trials):
+    if COMPOSITE_FIXATION_STIM:
+        fixation_stim_parts = [stimuli.get_composite_fixation_stim(win)]
+    else:
+        outer, inner, horz, vert = stimuli.get_fixation_stim(win)
+        fixation_stim_parts = [outer, horz, vert, inner]
+
+    # Prepare profiling of the time spent per frame (does nothing if not enabled)
+    profiler = FrameProfiler(fps, enabled=PROFILE_FRAMES)
+    profiler.attach(win)
+    profiler.attach_stims(list(digit_stims.values()) + fixation_stim_parts)
+
+    # Count dropped frames for the telemetry (frames that take > 1.5 refreshes)
+    if telemetry is None:
+        telemetry = TelemetryPublisher(None)
+    if telemetry.enabled:
+        win.refreshThreshold = 1.5 / fps
+        win.recordFrameIntervals = True
+    n_dropped_frames = win.nDroppedFrames
+
+    # Start eye-tracking
+    error = start_eye_recording(tk)
+    assert error == 0, "Problem during eye-tracker setup."
+
+    # Prepare triggers
+    ttl_dict = get_ttl_dict()
+    trigger_kwargs = dict(ser=ser_port, tk=tk, byte=bytes([0]))
+    send_trigger(**trigger_kwargs)
+
+    # Start experiment
+    # ----------------
+    key_list = [key for action_list in KEYLIST_DICT.values() for key in action_list]
+    start_stim = stimuli.get_central_text_stim(
+        win,
+        height=TEXT_HEIGHT_DVA,
+        text="-> Please wait for the experimenter. <-",
+    )
+    start_stim.draw()
+    win.flip()
+    keyboard.waitKeys(keyList=KEYLIST_DICT["quit"])
 
-    # get state for this trial
-    state = state_rng.choice([0, 1])
+    start_stim.text = "Press any key to start."
+    start_stim.draw()
+    win.flip()
+    keyboard.waitKeys()
 
     # Show fixstim
     for stim in fixation_stim_parts:
         stim.setAutoDraw(True)
+    win.flip()
 
-    # jittered inter-trial-interval
-    trigger_kwargs["byte"] = ttl_dict[f"{stream}_new_trl"]
-    iti_ms = display_iti(win, MIN_ITI_MS, MAX_ITI_MS, fps, iti_rng, trigger_kwargs)
+    trigger_kwargs["byte"] = ttl_dict[f"{stream}_begin_experiment"]
+    send_trigger(**trigger_kwargs)
+    wait(win, 1)
+
+    rt_clock = make_clock(win)
+    acc_tracker = AccuracyTracker(blocksize)
+    iti_rng = np.random.default_rng()
+    state_rng = np.random.default_rng()
+    block_counter = 1  # start with first block
+    # in idle frames of the inter-trial-interval, do the pending flush of the logfile
+    # (see LOG_FLUSH_POLICY), and prepare the next trial of the staircase
+    iti_idle_tasks = [logger.flush_pending]
+    if staircase is not None:
+        iti_idle_tasks.append(staircase.prepare)
+    profiler.pause()
+    for itrial in range(ntrials):
+
+        # get state for this trial
+        state = state_rng.choice([0, 1])
+
+        # Show fixstim
+        for stim in fixation_stim_parts:
+            stim.setAutoDraw(True)
+
+        # jittered inter-trial-interval
+        profiler.phase = "iti"
+        trigger_kwargs["byte"] = ttl_dict[f"{stream}_new_trl"]
+        iti_ms = display_iti(
+            win,
+            MIN_ITI_MS,
+            MAX_ITI_MS,
+            fps,
+            iti_rng,
+            trigger_kwargs,
+            fixation_checker=fixation_checker,
+            max_extra_frames=MAX_ITI_EXTENSION_FRAMES,
+            idle_tasks=iti_idle_tasks,
+        )
+        trial = trials[itrial] if staircase is None else staircase.next_trial()
 
-    # 500ms before first sample onset, remove fixstim
-    for stim in fixation_stim_parts:
-        stim.setAutoDraw(False)
-
-    trigger_kwargs["byte"] = ttl_dict[f"{stream}_fixstim_offset"]
-    win.callOnFlip(send_trigger, **trigger_kwargs)
-    for frame in range(FIXSTIM_OFF_FRAMES):
-        win.flip()
-
-    # show samples
-    trigger_kwargs_list = [
-        dict(ser=ser_port, tk=tk, byte=ttl_dict[f"{stream}_digit_{int(digit)}"])
-        for digit in trial
-    ]
-    display_trial(
-        win,
-        trial,
-        digit_frames=DIGIT_FRAMES,
-        fade_frames=FADE_FRAMES,
-        digit_stims=digit_stims,
-        trigger_kwargs_list=trigger_kwargs_list,
-    )
+        # 500ms before first sample onset, remove fixstim
+        for stim in fixation_stim_parts:
+            stim.setAutoDraw(False)
 
-    # get choice from participant
-    choice_stims = get_choice_stims(
-        win, stream=stream, state=state, height=CHOICE_STIM_HEIGHT_DVA
-    )
-    for stim in choice_stims:
-        stim.draw()
+        profiler.phase = "fixstim_offset"
+        trigger_kwargs["byte"] = ttl_dict[f"{stream}_fixstim_offset"]
+        win.callOnFlip(send_trigger, **trigger_kwargs)
+        for frame in range(FIXSTIM_OFF_FRAMES):
+            win.flip()
 
-    trigger_kwargs["byte"] = ttl_dict[f"{stream}_response_prompt"]
-    win.callOnFlip(send_trigger, **trigger_kwargs)
-    rt_clock.reset()
-    win.flip()
-    key_rt = event.waitKeys(
-        maxWait=MAXWAIT_RESPONSE_S,
-        keyList=key_list,
-        timeStamped=rt_clock,
-    )
+        # show samples
+        profiler.phase = "trial"
+        trigger_kwargs_list = [
+            dict(ser=ser_port, tk=tk, byte=ttl_dict[f"{stream}_digit_{int(digit)}"])
+            for digit in trial
+        ]
+        display_trial(
+            win,
+            trial,
+            digit_frames=DIGIT_FRAMES,
+            fade_frames=FADE_FRAMES,
+            digit_stims=digit_stims,
+            trigger_kwargs_list=trigger_kwargs_list,
+        )
 
-    if key_rt is None:
-        trigger_kwargs["byte"] = ttl_dict[f"{stream}_response_timeout"]
-        send_trigger(**trigger_kwargs)
-        key = "n/a"
-        choice = "n/a"
-        rt = "n/a"
-        valid = False
-    else:
-        assert len(key_rt) == 1
-        key = key_rt[0][0]
-        if key in KEYLIST_DICT["quit"]:
-            print(f"\n\nYou pressed the '{key}' key, quitting now ...")
-            win.close()
-            core.quit()
-        choice = map_key_to_choice(key, state, stream)
-        trigger_kwargs["byte"] = ttl_dict[f"{stream}_response_{choice}"]
-        send_trigger(**trigger_kwargs)
-        rt = key_rt[0][1]
-        valid = True
-
-    # evaluate correctness of choice
-    correct, ambiguous = evaluate_trial_correct(trial, choice, stream)
-
-    # delay feedback
-    for frame in range(DELAY_FEEDBACK_FRAMES):
-        win.flip()
-
-    # show feedback
-    show_feedback = (run_type == "training") or SHOW_FEEDBACK
-    if choice == "n/a":
-        # timeout feedback is always shown
-        trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_timeout"]
-        win.callOnFlip(send_trigger, **trigger_kwargs)
-        warn_stim = get_central_text_stim(
-            win, height=TEXT_HEIGHT_DVA, text="Too slow!", color=(1, -1, -1)
+        # get choice from participant
+        choice_stims = stimuli.get_choice_stims(
+            win,
+            stream=stream,
+            state=state,
+            height=CHOICE_STIM_HEIGHT_DVA,
+            atlas=atlas,
         )
-        for frame in range(TIMEOUT_FRAMES):
-            warn_stim.draw()
-            win.flip()
-    elif show_feedback:
-        # training feedback is always shown
-        # to show all other feedback, set SHOW_FEEDBACK=True
-        correct_str = "correct" if correct else "wrong"
-        trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_{correct_str}"]
-        win.callOnFlip(send_trigger, **trigger_kwargs)
-        feedback_stim = get_central_text_stim(win, height=TEXT_HEIGHT_DVA)
-        if run_type == "training":
-            feedback_stim.text = f"Your choice ({choice}) was {correct_str}."
-            feedback_frames = TRAINING_FEEDBACK_FRAMES
-        else:
-            feedback_stim.text = f"{correct_str}"
-            feedback_stim.color = (-1, 1, -1) if correct else (1, 0, -1)
-            feedback_frames = FEEDBACK_FRAMES
+        profiler.attach_stims(choice_stims)
+        profiler.phase = "response"
 
-        for frame in range(feedback_frames):
-            feedback_stim.draw()
+        # keep flipping while waiting for a response, response times are relative to
+        # the flip of the response prompt
+        trigger_kwargs["byte"] = ttl_dict[f"{stream}_response_prompt"]
+        key_rt, _ = display_response_window(
+            win,
+            choice_stims,
+            keyboard,
+            key_list,
+            MAXWAIT_RESPONSE_FRAMES,
+            rt_clock,
+            trigger_kwargs,
+            fps=fps,
+        )
+
+        if key_rt is None:
+            trigger_kwargs["byte"] = ttl_dict[f"{stream}_response_timeout"]
+            send_trigger(**trigger_kwargs)
+            key = "n/a"
+            choice = "n/a"
+            rt = "n/a"
+            valid = False
+        else:
+            assert len(key_rt) == 1
+            key = key_rt[0][0]
+            if key in KEYLIST_DICT["quit"]:
+                print(f"\n\nYou pressed the '{key}' key, quitting now ...")
+                logger.close()
+                win.close()
+                core.quit()
+            choice = map_key_to_choice(key, state, stream)
+            trigger_kwargs["byte"] = ttl_dict[f"{stream}_response_{choice}"]
+            send_trigger(**trigger_kwargs)
+            rt = key_rt[0][1]
+            valid = True
+
+        # evaluate correctness of choice
+        correct, ambiguous = evaluate_trial_correct(trial, choice, stream)
+        acc_tracker.update(correct)
+        if staircase is not None:
+            staircase.update(correct, ambiguous)
+
+        # delay feedback
+        profiler.phase = "feedback_delay"
+        for frame in range(DELAY_FEEDBACK_FRAMES):
             win.flip()
 
-    # Map pressed key to "direction" left/right
-    key2direction_map = {i: key for key, val in KEYLIST_DICT.items() for i in val}
-    direction = key2direction_map.get(key, "n/a")
-
-    # Save trial data
-    savedict = dict(
-        trial=itrial,
-        direction=direction,
-        choice=choice,
-        ambiguous=ambiguous,
-        rt=rt,
-        validity=valid,
-        iti=iti_ms,
-        correct=correct,
-        stream=stream,
-        state=state,
-    )
-    samples = dict([(f"sample{i+1}", int(sample)) for i, sample in enumerate(trial)])
-    savedict.update(samples)
-    save_dict(logfile, savedict)
-
-    # Every nth trial, do a block break and display feedback
-    if (1 + itrial) % blocksize == 0:
-        trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_break_begin"]
-        block_counter = display_block_break(
-            win,
-            logfile,
-            itrial,
-            ntrials,
-            blocksize,
-            block_counter,
-            hard_break=hard_break,
-            trigger_kwargs=trigger_kwargs,
+        # show feedback
+        show_feedback = (run_type == "training") or SHOW_FEEDBACK
+        profiler.phase = "feedback"
+        if choice == "n/a":
+            # timeout feedback is always shown
+            trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_timeout"]
+            win.callOnFlip(send_trigger, **trigger_kwargs)
+            warn_stim = stimuli.get_central_text_stim(
+                win, height=TEXT_HEIGHT_DVA, text="Too slow!", color=(1, -1, -1)
+            )
+            profiler.attach_stims([warn_stim])
+            for frame in range(TIMEOUT_FRAMES):
+                warn_stim.draw()
+                win.flip()
+        elif show_feedback:
+            # training feedback is always shown
+            # to show all other feedback, set SHOW_FEEDBACK=True
+            correct_str = "correct" if correct else "wrong"
+            trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_{correct_str}"]
+            win.callOnFlip(send_trigger, **trigger_kwargs)
+            feedback_stim = stimuli.get_central_text_stim(win, height=TEXT_HEIGHT_DVA)
+            profiler.attach_stims([feedback_stim])
+            if run_type == "training":
+                feedback_stim.text = f"Your choice ({choice}) was {correct_str}."
+                feedback_frames = TRAINING_FEEDBACK_FRAMES
+            else:
+                feedback_stim.text = f"{correct_str}"
+                feedback_stim.color = (-1, 1, -1) if correct else (1, 0, -1)
+                feedback_frames = FEEDBACK_FRAMES
+
+            for frame in range(feedback_frames):
+                feedback_stim.draw()
+                win.flip()
+
+        # Map pressed key to "direction" left/right
+        key2direction_map = {i: key for key, val in KEYLIST_DICT.items() for i in val}
+        direction = key2direction_map.get(key, "n/a")
+
+        # Save trial data
+        savedict = dict(
+            trial=itrial,
+            direction=direction,
+            choice=choice,
+            ambiguous=ambiguous,
+            rt=rt,
+            validity=valid,
+            iti=iti_ms,
+            correct=correct,
+            stream=stream,
+            state=state,
+        )
+        samples = dict(
+            [(f"sample{i+1}", int(sample)) for i, sample in enumerate(trial)]
         )
-        trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_break_end"]
-        send_trigger(**trigger_kwargs)
+        savedict.update(samples)
+        logger.write(savedict)
+
+        # Publish the trial to monitoring clients, without waiting for them
+        telemetry.publish(
+            dict(
+                trial=itrial,
+                stream=stream,
+                choice=choice,
+                correct=correct,
+                rt=rt,
+                iti=iti_ms,
+                dropped_frames=win.nDroppedFrames - n_dropped_frames,
+                trigger_queue=ser_port.out_waiting,
+            )
+        )
+        n_dropped_frames = win.nDroppedFrames
+
+        # Every nth trial, do a block break and display feedback
+        if (1 + itrial) % blocksize == 0:
+            logger.end_block(hard_break=block_counter % hard_break == 0)
+            profiler.phase = "block_break"
+            trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_break_begin"]
+            block_counter = display_block_break(
+                win,
+                acc_tracker,
+                itrial,
+                ntrials,
+                blocksize,
+                block_counter,
+                hard_break=hard_break,
+                trigger_kwargs=trigger_kwargs,
+                keyboard=keyboard,
+            )
+            trigger_kwargs["byte"] = ttl_dict[f"{stream}_feedback_break_end"]
+            send_trigger(**trigger_kwargs)
+            profiler.pause()
+
+    # Finish experiment
+    logger.close()
+    if profiler.enabled:
+        profiler.save(streamdir / f"sub-{substr}_stream-{stream}_frameprofile.tsv")
+        print(f"Frame budget use ({1000 / fps:.2f} ms per frame):")
+        print(profiler.summary())
+    end_stim = stimuli.get_central_text_stim(
+        win,
+        height=TEXT_HEIGHT_DVA,
+        text="Done so far. Thanks for doing this task!",
+    )
+    end_stim.draw()
+    win.flip()
+    wait(win, 2)
+    trigger_kwargs["byte"] = ttl_dict[f"{stream}_end_experiment"]
+    send_trigger(**trigger_kwargs)
 
+    return logfile
 
-# Finish experiment
-end_stim = get_central_text_stim(
-    win,
-    height=TEXT_HEIGHT_DVA,
-    text="Done so far. Thanks for doing this task!",
-)
-end_stim.draw()
-win.flip()
-core.wait(2)
-trigger_kwargs["byte"] = ttl_dict[f"{stream}_end_experiment"]
-send_trigger(**trigger_kwargs)
 
+if __name__ == "__main__":
+    from psychopy import core, monitors, tools, visual
+
+    # Prepare logging
+    run_type, streamdir, stream, substr = display_survey_gui()
+
+    # *if just bonus*, display and quit.
+    if run_type == "bonus":
+        core.quit()
+
+    # Prepare monitor
+    my_monitor = monitors.Monitor(name=MONITOR_NAME)
+
+    # prepare the window
+    width, height = my_monitor.getSizePix()
+
+    win = visual.Window(
+        color=(-1, -1, -1),
+        fullscr=FULLSCR,
+        monitor=my_monitor,
+        units="deg",
+        winType="pyglet",
+        size=(width, height),
+    )
+    win.mouseVisible = False
+
+    # key presses come from the keyboard, or from a scripted responder
+    keyboard = get_input(INPUT_BACKEND, win)
+
+    # verified refresh rates are cached per monitor, to speed up later launches
+    framerate_cache = (
+        Path(__file__).resolve().parent.parent
+        / "experiment_data"
+        / ".cache"
+        / "refresh_rates.json"
+    )
+    fps = check_framerate(
+        win, EXPECTED_FPS, monitor_name=MONITOR_NAME, cache_fname=framerate_cache
+    )
 
-# Stop eye-tracking and get the data
-edf_fname_local = str(streamdir / f"sub-{substr}_stream-{stream}_eyetrack.edf")
-stop_eye_recording(tk, edf_fname, edf_fname_local)
+    # *if just instructions*, display and quit.
+    if run_type == "instructions":
+        display_instructions(win, stream, keyboard=keyboard)
+        win.close()
+        core.quit()
+
+    # Prepare eyetracking
+    # (only track eyes in "experiment" mode and if TK_DUMMY_MODE is False)
+    month_day_hour_minute = datetime.datetime.today().strftime("%m%d%H%M")
+    edf_fname = f"{month_day_hour_minute}.edf"
+    tk_dummy_mode = TK_DUMMY_MODE if run_type == "experiment" else True
+    tk = setup_eyetracker(tk_dummy_mode, my_monitor, edf_fname, CALIBRATION_TYPE)
+
+    # Prepare gaze-contingent inter-trial-interval (only with a real eye-tracker)
+    fixation_checker = None
+    if GAZE_CONTINGENT_ITI and isinstance(tk, DummyEyeLink):
+        print("No eye-tracker connected. The inter-trial-interval is not extended.")
+    elif GAZE_CONTINGENT_ITI:
+        fixation_checker = FixationChecker(
+            tk,
+            screen_size=(width, height),
+            radius_pix=tools.monitorunittools.deg2pix(FIXATION_RADIUS_DVA, my_monitor),
+            stable_frames=FIXATION_STABLE_FRAMES,
+            budget_s=GAZE_POLL_BUDGET_FRAC / fps,
+            max_overruns=GAZE_POLL_MAX_OVERRUNS,
+        )
+
+    # Setup serial port
+    if SER_ADDRESS is None:
+        ser_port = MySerial(FakeSerial(), waitsecs=SER_WAITSECS)
+        print("No serial port specified. We will not send TTL triggers to EEG.")
+    else:
+        ser_port = MySerial(SER_ADDRESS, waitsecs=SER_WAITSECS)
 
-# Close and exit
-ser_port.ser.close()
-win.close()
-core.quit()
+    # Publish trials to monitoring clients (does nothing if no address is set)
+    telemetry = TelemetryPublisher(TELEMETRY_ADDRESS)
+    if telemetry.enabled:
+        print(f"Publishing trials on: {TELEMETRY_ADDRESS}")
+
+    # Run the experiment
+    run_session(
+        win,
+        fps,
+        keyboard,
+        tk,
+        ser_port,
+        run_type,
+        streamdir,
+        stream,
+        substr,
+        fixation_checker=fixation_checker,
+        telemetry=telemetry,
+    )
+    telemetry.close()
+
+    if fixation_checker is not None:
+        n_polls = len(fixation_checker.poll_durations)
+        max_poll_ms = max(fixation_checker.poll_durations, default=0) * 1000
+        print(
+            f"Eye-tracker polls: {n_polls}, longest: {max_poll_ms:.3f} ms, "
+            f"over budget: {fixation_checker.n_overruns}"
+            + ("" if fixation_checker.enabled else " (polling was turned off)")
+        )
+
+    # Stop eye-tracking and get the data in the background, showing the end screen
+    end_stim = get_central_text_stim(
+        win,
+        height=TEXT_HEIGHT_DVA,
+        text="Done so far. Thanks for doing this task!",
+    )
+    edf_fname_local = str(streamdir / f"sub-{substr}_stream-{stream}_eyetrack.edf")
+    transfer = stop_eye_recording(tk, edf_fname, edf_fname_local, background=True)
+    if transfer is not None:
+        while transfer.is_alive():
+            print(
+                f"Receiving eye-tracking data: {transfer.bytes_received / 1e6:.1f} MB"
+            )
+            end_stim.draw()
+            win.flip()
+            core.wait(1)
+        transfer.join()
+        close_eyetracker(tk)
+        if transfer.ok:
+            print(f"Eye-tracking data saved (size checked): {edf_fname_local}")
+        else:
+            print(
+                f"Transfer of eye-tracking data failed after {transfer.n_attempts} "
+                f"attempts ({transfer.error}). The file {edf_fname} is still on the "
+                "EyeLink host PC."
+            )
+
+    # Close and exit
+    ser_port.ser.close()
+    win.close()
+    core.quit()
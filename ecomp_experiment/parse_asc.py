@@ -0,0 +1,282 @@
+"""Parse EyeLink ASC files into memory-mapped sample arrays and an event table.
+
+The ``*_eyetrack.edf`` files that are saved at the end of a session
+(see define_eyetracking.stop_eye_recording) can be converted to ASC format with the
+``edf2asc`` tool of the EyeLink Developers Kit. ASC files of a full session are very
+large, so they are parsed line by line in chunks, keeping memory use constant.
+
+The output directory contains:
+
+- ``times.dat``: the sample timestamps as float64
+- ``samples.dat``: the sample data as float32, shape (n_samples, n_columns),
+  with missing data (".") as NaN
+- ``events.tsv``: messages and events with the columns "time", "kind", and "text"
+- ``progress.json``: the number of parsed samples and events, the position in
+  the ASC file up to which it was parsed, and a checksum of the parsed part
+
+Parsing can be restarted: it continues from the position stored in ``progress.json``,
+unless the parsed part of the ASC file has changed since, e.g., because the file was
+replaced by another one of the same name. Then parsing starts from the beginning.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# event lines where the first number after the keyword (and eye) is a timestamp
+TIMED_EVENTS = [
+    "MSG",
+    "SFIX",
+    "EFIX",
+    "SSACC",
+    "ESACC",
+    "SBLINK",
+    "EBLINK",
+    "START",
+    "END",
+    "INPUT",
+    "BUTTON",
+]
+
+
+def _parse_value(token):
+    """Parse a token of a sample line to float, return None if it is a flag."""
+    if token == ".":
+        return np.nan
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _parse_event(line):
+    """Parse a non-sample line into a row of the event table."""
+    kind, _, text = line.replace("\t", " ").partition(" ")
+    text = text.strip()
+    if kind not in TIMED_EVENTS:
+        return ("n/a", kind, text)
+
+    # some events have the eye before the time, e.g., "EFIX R 1234 1300 ..."
+    eye = ""
+    if text[:1] in ["L", "R"] and text[1:2] in [" ", ""]:
+        eye, text = text[:1], text[1:].lstrip()
+
+    time, _, text = text.partition(" ")
+    if _parse_value(time) is None:
+        return ("n/a", kind, f"{eye} {time} {text}".strip())
+    return (time, kind, f"{eye} {text}".strip())
+
+
+def _hash_parsed(asc_fname, offset, blocksize=65536):
+    """Get a checksum of the first `offset` bytes of an ASC file.
+
+    Only the first and the last `blocksize` bytes of the parsed part are hashed,
+    so that checking a large file before resuming stays fast.
+    """
+    sha256 = hashlib.sha256(str(offset).encode())
+    with open(asc_fname, "rb") as fin:
+        sha256.update(fin.read(min(blocksize, offset)))
+        fin.seek(max(0, offset - blocksize))
+        sha256.update(fin.read(min(blocksize, offset)))
+    return sha256.hexdigest()
+
+
+def _write_progress(out_dir, progress):
+    """Write the progress file atomically."""
+    fname = Path(out_dir) / "progress.json"
+    fname_tmp = Path(out_dir) / "progress.json.tmp"
+    with open(fname_tmp, "w") as fout:
+        json.dump(progress, fout, indent=4)
+    os.replace(fname_tmp, fname)
+
+
+def parse_asc(asc_fname, out_dir, chunksize=100_000, resume=True, complete=True):
+    """Parse an EyeLink ASC file in chunks.
+
+    Parameters
+    ----------
+    asc_fname : pathlib.Path
+        The ASC file to parse.
+    out_dir : pathlib.Path
+        The directory to write the sample arrays and event table to.
+        Will be created if it does not exist.
+    chunksize : int
+        The number of lines to parse before writing the results to disk.
+        Defaults to 100000.
+    resume : bool
+        Whether to continue a previous parsing of `asc_fname` into `out_dir`.
+        If False, if there is no previous progress, or if the previously parsed
+        part of `asc_fname` has changed, start from the beginning.
+        Defaults to True.
+    complete : bool
+        Whether `asc_fname` is complete. If True, a last line without a trailing
+        newline is parsed. If False, e.g., if the file is still being written,
+        such a line is left for a later call. Defaults to True.
+
+    Returns
+    -------
+    progress : dict
+        Contains the keys "asc_fname", "asc_offset", "asc_prefix_sha256",
+        "n_samples", "n_columns", and "events_size".
+
+    See Also
+    --------
+    read_asc_samples
+    read_asc_events
+    """
+    out_dir = Path(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    fnames = dict(
+        times=out_dir / "times.dat",
+        samples=out_dir / "samples.dat",
+        events=out_dir / "events.tsv",
+    )
+
+    progress = dict(
+        asc_fname=Path(asc_fname).name,
+        asc_offset=0,
+        asc_prefix_sha256=_hash_parsed(asc_fname, 0),
+        n_samples=0,
+        n_columns=None,
+        events_size=0,
+    )
+    progress_fname = out_dir / "progress.json"
+    if resume and progress_fname.exists():
+        with open(progress_fname, "r") as fin:
+            previous = json.load(fin)
+        if previous["asc_fname"] == progress["asc_fname"] and previous.get(
+            "asc_prefix_sha256"
+        ) == _hash_parsed(asc_fname, previous["asc_offset"]):
+            progress = previous
+
+    # discard anything that was written after the last progress update
+    n_columns = progress["n_columns"]
+    sizes = dict(
+        times=progress["n_samples"] * 8,
+        samples=progress["n_samples"] * (n_columns or 0) * 4,
+        events=progress["events_size"],
+    )
+    for key, fname in fnames.items():
+        with open(fname, "ab") as fout:
+            fout.truncate(sizes[key])
+    if progress["events_size"] == 0:
+        with open(fnames["events"], "w", newline="") as fout:
+            fout.write("time\tkind\ttext\n")
+        progress["events_size"] = fnames["events"].stat().st_size
+
+    times, samples, events = [], [], []
+
+    def write_chunk():
+        """Append the parsed chunk to the output files and update progress."""
+        if len(times) > 0:
+            with open(fnames["times"], "ab") as fout:
+                np.asarray(times, dtype=np.float64).tofile(fout)
+            with open(fnames["samples"], "ab") as fout:
+                np.asarray(samples, dtype=np.float32).tofile(fout)
+        with open(fnames["events"], "a", newline="") as fout:
+            fout.writelines(f"{time}\t{kind}\t{text}\n" for time, kind, text in events)
+
+        progress["n_samples"] += len(times)
+        progress["n_columns"] = n_columns
+        progress["events_size"] = fnames["events"].stat().st_size
+        progress["asc_offset"] = offset
+        progress["asc_prefix_sha256"] = _hash_parsed(asc_fname, offset)
+        _write_progress(out_dir, progress)
+        times.clear()
+        samples.clear()
+        events.clear()
+
+    offset = progress["asc_offset"]
+    with open(asc_fname, "rb") as fin:
+        fin.seek(offset)
+        for iline, raw_line in enumerate(fin):
+            if not raw_line.endswith(b"\n") and not complete:
+                # incomplete last line, e.g., if the file is still being written
+                break
+            offset += len(raw_line)
+            line = raw_line.decode("utf-8", errors="replace").strip()
+
+            if len(line) == 0 or line.startswith("**") or line.startswith(";"):
+                pass
+            elif line[0].isdigit():
+                values = [_parse_value(token) for token in line.split()]
+                values = [value for value in values if value is not None]
+                if n_columns is None:
+                    n_columns = len(values) - 1
+                row = values[1 : n_columns + 1]
+                row += [np.nan] * (n_columns - len(row))
+                times.append(values[0])
+                samples.append(row)
+            else:
+                events.append(_parse_event(line))
+
+            if (iline + 1) % chunksize == 0:
+                write_chunk()
+
+    write_chunk()
+    return progress
+
+
+def read_asc_samples(out_dir):
+    """Read the samples parsed with :func:`parse_asc` as memory-mapped arrays.
+
+    Parameters
+    ----------
+    out_dir : pathlib.Path
+        The output directory of :func:`parse_asc`.
+
+    Returns
+    -------
+    times : np.memmap, shape(n_samples,)
+        The timestamps of the samples.
+    samples : np.memmap, shape(n_samples, n_columns)
+        The sample data. The columns are as in the ASC file, e.g., x, y, and
+        pupil of the left and right eye.
+    """
+    out_dir = Path(out_dir)
+    with open(out_dir / "progress.json", "r") as fin:
+        progress = json.load(fin)
+    n_samples, n_columns = progress["n_samples"], progress["n_columns"] or 0
+    if n_samples == 0:
+        return np.zeros(0), np.zeros((0, n_columns), dtype=np.float32)
+
+    times = np.memmap(
+        out_dir / "times.dat", dtype=np.float64, mode="r", shape=(n_samples,)
+    )
+    samples = np.memmap(
+        out_dir / "samples.dat",
+        dtype=np.float32,
+        mode="r",
+        shape=(n_samples, n_columns),
+    )
+    return times, samples
+
+
+def read_asc_events(out_dir):
+    """Read the event table parsed with :func:`parse_asc`.
+
+    Parameters
+    ----------
+    out_dir : pathlib.Path
+        The output directory of :func:`parse_asc`.
+
+    Returns
+    -------
+    events : pandas.DataFrame
+        The messages and events with the columns "time", "kind", and "text".
+        "time" is missing for lines that are not timed events, e.g., "SAMPLES".
+    """
+    import pandas as pd
+
+    events = pd.read_csv(
+        Path(out_dir) / "events.tsv",
+        sep="\t",
+        dtype=dict(time="float64", kind=str, text=str),
+        na_values=["n/a"],
+        keep_default_na=False,
+        quoting=3,  # csv.QUOTE_NONE
+    )
+    return events
@@ -0,0 +1,221 @@
+"""Profile how much of the frame budget is used in each phase of the experiment.
+
+The profiler is attached to a window and to stimuli by wrapping their ``flip``,
+``callOnFlip``, and ``draw`` methods. For each frame, it records the time spent in
+
+- "logic": Python code between two flips, excluding draw calls
+- "draw": draw calls of the attached stimuli (including autoDraw stimuli)
+- "callback": functions scheduled with ``win.callOnFlip``, e.g., sending triggers
+- "flip": waiting in ``win.flip`` for the screen refresh
+
+The frame budget use is the time spent in logic, draw, and callback relative
+to the duration of a frame (``1000/EXPECTED_FPS`` ms).
+"""
+
+import csv
+from time import perf_counter
+
+import numpy as np
+
+# the per-frame components recorded by FrameProfiler
+FRAME_COMPONENTS = ["logic", "draw", "callback", "flip"]
+
+
+class FrameProfiler:
+    """Record per-frame timings of the presentation routines.
+
+    Parameters
+    ----------
+    fps : int
+        Refreshrate of the screen.
+    enabled : bool
+        Whether to profile. If False, attaching the profiler does nothing, so that
+        it can be used unconditionally. Defaults to True.
+
+    Attributes
+    ----------
+    phase : str
+        The label of the current phase of the experiment, e.g., "iti" or "trial".
+        Every recorded frame is labeled with the phase at the time of its flip.
+    """
+
+    def __init__(self, fps, enabled=True):
+        """Initialize the profiler."""
+        self.frame_s = 1 / fps
+        self.enabled = enabled
+        self.phase = "n/a"
+        self._frames = []
+        self._last_flip_end = None
+        self._in_flip = False
+        self._draw_s = 0
+        self._draw_in_flip_s = 0
+        self._callback_s = 0
+
+    def attach(self, win):
+        """Wrap the flip and callOnFlip methods of a window."""
+        if not self.enabled:
+            return
+        flip = win.flip
+        call_on_flip = win.callOnFlip
+
+        def timed_flip(*args, **kwargs):
+            start = perf_counter()
+            self._in_flip = True
+            try:
+                flip_time = flip(*args, **kwargs)
+            finally:
+                self._in_flip = False
+            self._record(start, perf_counter())
+            return flip_time
+
+        def timed_call_on_flip(function, *args, **kwargs):
+            call_on_flip(self._timed_callback, function, *args, **kwargs)
+
+        win.flip = timed_flip
+        win.callOnFlip = timed_call_on_flip
+
+    def attach_stims(self, stims):
+        """Wrap the draw methods of stimuli.
+
+        Parameters
+        ----------
+        stims : iterable of psychopy stimuli
+            The stimuli whose draw calls to time.
+        """
+        if not self.enabled:
+            return
+        for stim in stims:
+            stim.draw = self._timed_draw(stim.draw)
+
+    def pause(self):
+        """Do not measure logic time until the next flip.
+
+        Call this after code that is not paced by frames, such as waiting
+        for key presses.
+        """
+        self._last_flip_end = None
+
+    def _timed_draw(self, draw):
+        """Return a wrapped draw function."""
+
+        def timed_draw(*args, **kwargs):
+            start = perf_counter()
+            draw(*args, **kwargs)
+            duration = perf_counter() - start
+            if self._in_flip:
+                self._draw_in_flip_s += duration
+            else:
+                self._draw_s += duration
+
+        return timed_draw
+
+    def _timed_callback(self, function, *args, **kwargs):
+        """Call a function and record its duration."""
+        start = perf_counter()
+        function(*args, **kwargs)
+        self._callback_s += perf_counter() - start
+
+    def _record(self, flip_start, flip_end):
+        """Record the timings of a frame and reset the accumulators."""
+        logic_s = np.nan
+        if self._last_flip_end is not None:
+            logic_s = flip_start - self._last_flip_end - self._draw_s
+        flip_s = flip_end - flip_start - self._draw_in_flip_s - self._callback_s
+        draw_s = self._draw_s + self._draw_in_flip_s
+        self._frames.append((self.phase, logic_s, draw_s, self._callback_s, flip_s))
+
+        self._last_flip_end = flip_end
+        self._draw_s = 0
+        self._draw_in_flip_s = 0
+        self._callback_s = 0
+
+    def get_frames(self):
+        """Get the recorded frames.
+
+        Returns
+        -------
+        frames : dict of np.ndarray
+            Contains the key "phase", the keys in `FRAME_COMPONENTS` (times in
+            seconds), and "budget_use" (fraction of the frame duration spent
+            in logic, draw, and callback). Logic time is NaN for the first frame
+            and after :meth:`pause`, and then not included in "budget_use".
+        """
+        phases = [frame[0] for frame in self._frames]
+        timings = np.array([frame[1:] for frame in self._frames], dtype=float)
+        timings = timings.reshape(-1, len(FRAME_COMPONENTS))
+
+        frames = dict(phase=np.array(phases, dtype=str))
+        for icomponent, component in enumerate(FRAME_COMPONENTS):
+            frames[component] = timings[:, icomponent]
+        frames["budget_use"] = np.nansum(timings[:, :3], axis=1) / self.frame_s
+        return frames
+
+    def get_histograms(self, bins=None):
+        """Get histograms of frame budget use per phase.
+
+        Parameters
+        ----------
+        bins : np.ndarray | None
+            The bin edges. Values beyond the last edge are counted in the last bin.
+            If None, use bins of 5% from 0 to 150% frame budget use.
+
+        Returns
+        -------
+        histograms : dict
+            Maps phases to the counts of frames in each bin.
+        bins : np.ndarray
+            The bin edges.
+        """
+        bins = np.linspace(0, 1.5, 31) if bins is None else bins
+        frames = self.get_frames()
+        budget_use = np.clip(frames["budget_use"], bins[0], bins[-1])
+        histograms = dict()
+        for phase in dict.fromkeys(frames["phase"]):
+            counts, _ = np.histogram(budget_use[frames["phase"] == phase], bins)
+            histograms[phase] = counts
+        return histograms, bins
+
+    def summary(self):
+        """Summarize frame budget use per phase.
+
+        Returns
+        -------
+        summary : str
+            For each phase, the number of frames, the median, 99th percentile,
+            and maximum budget use, the number of frames over budget, and the
+            component with the largest share of the time over all frames
+            (excluding the time waiting for flips).
+        """
+        frames = self.get_frames()
+        lines = ["phase\tframes\tmedian\tp99\tmax\tover\tlargest"]
+        for phase in dict.fromkeys(frames["phase"]):
+            mask = frames["phase"] == phase
+            use = frames["budget_use"][mask]
+            totals = [np.nansum(frames[comp][mask]) for comp in FRAME_COMPONENTS[:3]]
+            largest = FRAME_COMPONENTS[int(np.argmax(totals))]
+            lines.append(
+                f"{phase}\t{mask.sum()}\t{np.median(use):.0%}\t"
+                f"{np.percentile(use, 99):.0%}\t{use.max():.0%}\t"
+                f"{(use > 1).sum()}\t{largest}"
+            )
+        return "\n".join(lines)
+
+    def save(self, fname):
+        """Write the recorded frames to a TSV file.
+
+        Parameters
+        ----------
+        fname : pathlib.Path
+            The file to write to. Times are written in milliseconds.
+        """
+        frames = self.get_frames()
+        with open(fname, "w", newline="") as fout:
+            writer = csv.writer(fout, delimiter="\t")
+            header = ["phase"] + [f"{comp}_ms" for comp in FRAME_COMPONENTS]
+            writer.writerow(header + ["budget_use"])
+            for iframe, phase in enumerate(frames["phase"]):
+                row = [phase]
+                for comp in FRAME_COMPONENTS:
+                    value = frames[comp][iframe] * 1000
+                    row.append("n/a" if np.isnan(value) else f"{value:.4f}")
+                writer.writerow(row + [f"{frames['budget_use'][iframe]:.4f}"])
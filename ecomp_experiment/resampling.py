@@ -0,0 +1,340 @@
+"""Compare measures between the single and the dual stream by resampling.
+
+Each participant contributes one value per measure and stream (e.g., their
+accuracy), and the single and dual stream values are compared within
+participants. The mean difference (dual minus single) over participants gets
+a bootstrap confidence interval (resampling participants), and a p-value from
+a permutation test (flipping the sign of the difference of random participants).
+
+Resamples are drawn in blocks, as matrix products over participants, and the
+blocks are spread over processes with independent random streams
+(``np.random.SeedSequence.spawn``), so that the results do not depend on the
+number of processes. Each block is reduced before it is returned: to the
+resampled mean differences for the bootstrap, and to exceedance counts for the
+permutation test.
+
+To compare the accuracy, response times, and weighting kernels between streams
+with 10000 resamples, run from the root of the repository::
+
+    python -m ecomp_experiment.resampling --n-resamples 10000 --n-jobs 4
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# the measures that can be compared, see get_paired_measures
+MEASURES = ["accuracy", "rt", "position", "value"]
+
+
+def get_paired_measures(df, measure):
+    """Get the values of a measure for each participant and stream.
+
+    Participants without values for both streams are dropped.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The cohort table, see cohort.load_cohort.
+    measure : {"accuracy", "rt", "position", "value"}
+        The measure: the proportion of correct choices (timeouts count as wrong,
+        as for the bonus), the median response time in seconds, or the weights of
+        the "position" or "value" weighting kernel (see weighting.fit_kernels).
+
+    Returns
+    -------
+    subjects : np.ndarray of str, shape(n_subjects,)
+        The participants.
+    names : list of str
+        The names of the values of the measure (one for "accuracy" and "rt",
+        one per regressor for kernels).
+    single, dual : np.ndarray, shape(n_subjects, n_values)
+        The values of each participant in each stream.
+    """
+    import pandas as pd
+
+    if measure == "accuracy":
+        correct = df["correct"].fillna(False).astype(float)
+        values = correct.groupby([df["subject"], df["stream"]]).mean()
+        values = values.to_frame(measure)
+    elif measure == "rt":
+        values = df["rt"].groupby([df["subject"], df["stream"]]).median()
+        values = values.to_frame(measure)
+    elif measure in ["position", "value"]:
+        from ecomp_experiment.weighting import fit_kernels
+
+        kernels = fit_kernels(df, kind=measure)
+        kernels = kernels[kernels["regressor"] != "intercept"]
+        regressors = list(dict.fromkeys(kernels["regressor"]))
+        values = kernels.pivot_table(
+            index=["subject", "stream"], columns="regressor", values="weight"
+        )[regressors]
+    else:
+        raise ValueError(f"Unknown measure: {measure}")
+
+    values = values.unstack("stream").dropna()
+    names = list(dict.fromkeys(values.columns.get_level_values(0)))
+    single = values.xs("single", axis=1, level="stream")[names].to_numpy(float)
+    dual = values.xs("dual", axis=1, level="stream")[names].to_numpy(float)
+    subjects = pd.Index(values.index).to_numpy(str)
+    return subjects, [str(name) for name in names], single, dual
+
+
+def _bootstrap_block(diffs, n_resamples, seed_seq):
+    """Get the mean differences of bootstrap resamples of participants."""
+    rng = np.random.default_rng(seed_seq)
+    n_subjects = diffs.shape[0]
+    counts = rng.multinomial(
+        n_subjects, np.full(n_subjects, 1 / n_subjects), n_resamples
+    )
+    return (counts @ diffs) / n_subjects
+
+
+def _permutation_block(diffs, n_resamples, seed_seq):
+    """Count the sign-flipped mean differences at least as large as observed."""
+    rng = np.random.default_rng(seed_seq)
+    n_subjects = diffs.shape[0]
+    observed = np.abs(diffs.mean(axis=0))
+    signs = rng.choice(np.array([-1.0, 1.0]), size=(n_resamples, n_subjects))
+    permuted = np.abs((signs @ diffs) / n_subjects)
+    return (permuted >= observed - 1e-12).sum(axis=0)
+
+
+def run_blocks(
+    block_func,
+    diffs,
+    n_resamples,
+    block_size=1000,
+    n_jobs=1,
+    seed=None,
+    reduce_func=None,
+):
+    """Run resampling blocks, optionally in parallel.
+
+    Parameters
+    ----------
+    block_func : callable
+        Called as ``block_func(diffs, n, seed_seq)`` for each block of `n`
+        resamples, with an independent ``np.random.SeedSequence``.
+    diffs : np.ndarray, shape(n_subjects, n_values)
+        The differences between streams of each participant.
+    n_resamples : int
+        The total number of resamples.
+    block_size : int
+        The number of resamples per block. Defaults to 1000.
+    n_jobs : int
+        The number of processes. Defaults to 1.
+    seed : int | np.random.SeedSequence | None
+        The seed from which the streams of the blocks are spawned.
+    reduce_func : callable | None
+        If not None, the results of the blocks are combined as they arrive,
+        with ``reduce_func(result, block_result)``, so that they are not all
+        kept in memory. Defaults to None, which returns the list of results.
+
+    Returns
+    -------
+    results : list | object
+        The result of each block, in order, or the combined result.
+    """
+    sizes = [block_size] * (n_resamples // block_size)
+    if n_resamples % block_size > 0:
+        sizes.append(n_resamples % block_size)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seed_seqs = seed.spawn(len(sizes))
+
+    executor = None
+    if n_jobs > 1 and len(sizes) > 1:
+        executor = ProcessPoolExecutor(max_workers=n_jobs)
+        block_results = executor.map(block_func, [diffs] * len(sizes), sizes, seed_seqs)
+    else:
+        block_results = map(block_func, [diffs] * len(sizes), sizes, seed_seqs)
+
+    try:
+        if reduce_func is None:
+            return list(block_results)
+        result = next(block_results)
+        for block_result in block_results:
+            result = reduce_func(result, block_result)
+        return result
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def bootstrap_ci(
+    diffs, n_resamples=10000, ci=0.95, block_size=1000, n_jobs=1, seed=None
+):
+    """Get percentile bootstrap confidence intervals of mean differences.
+
+    Parameters
+    ----------
+    diffs : np.ndarray, shape(n_subjects, n_values)
+        The differences between streams of each participant.
+    n_resamples : int
+        The number of bootstrap resamples. Defaults to 10000.
+    ci : float
+        The coverage of the confidence interval. Defaults to 0.95.
+    block_size, n_jobs, seed
+        See :func:`run_blocks`.
+
+    Returns
+    -------
+    ci_low, ci_high : np.ndarray, shape(n_values,)
+        The bounds of the confidence intervals.
+    """
+    blocks = run_blocks(_bootstrap_block, diffs, n_resamples, block_size, n_jobs, seed)
+    means = np.concatenate(blocks)
+    alpha = (1 - ci) / 2
+    ci_low, ci_high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return ci_low, ci_high
+
+
+def permutation_test(diffs, n_resamples=10000, block_size=1000, n_jobs=1, seed=None):
+    """Test whether mean differences are zero, by randomly flipping signs.
+
+    Parameters
+    ----------
+    diffs : np.ndarray, shape(n_subjects, n_values)
+        The differences between streams of each participant.
+    n_resamples : int
+        The number of permutations. Defaults to 10000.
+    block_size, n_jobs, seed
+        See :func:`run_blocks`.
+
+    Returns
+    -------
+    p_values : np.ndarray, shape(n_values,)
+        The two-sided p-values, ``(n_exceeding + 1) / (n_resamples + 1)``.
+    """
+    n_exceeding = run_blocks(
+        _permutation_block,
+        diffs,
+        n_resamples,
+        block_size,
+        n_jobs,
+        seed,
+        reduce_func=np.add,
+    )
+    return (n_exceeding + 1) / (n_resamples + 1)
+
+
+def compare_streams(
+    df,
+    measures=MEASURES,
+    n_resamples=10000,
+    ci=0.95,
+    block_size=1000,
+    n_jobs=1,
+    seed=None,
+):
+    """Compare measures between the single and the dual stream.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The cohort table, see cohort.load_cohort.
+    measures : list of str
+        The measures to compare, see :func:`get_paired_measures`. Defaults to
+        all of MEASURES.
+    n_resamples : int
+        The number of bootstrap resamples, and of permutations. Defaults to 10000.
+    ci : float
+        The coverage of the confidence intervals. Defaults to 0.95.
+    block_size, n_jobs, seed
+        See :func:`run_blocks`.
+
+    Returns
+    -------
+    stats : pandas.DataFrame
+        One row per value of each measure, with columns "measure", "name",
+        "n_subjects", "mean_single", "mean_dual", "diff" (dual minus single),
+        "ci_low", "ci_high", and "p_value".
+    """
+    import pandas as pd
+
+    # one pair of streams per measure in MEASURES, so that the results of a
+    # measure do not depend on which other measures are compared
+    seed_seqs = np.random.SeedSequence(seed).spawn(2 * len(MEASURES))
+    stats = []
+    for measure in measures:
+        if measure not in MEASURES:
+            raise ValueError(f"Unknown measure: {measure}")
+        imeasure = MEASURES.index(measure)
+        subjects, names, single, dual = get_paired_measures(df, measure)
+        diffs = dual - single
+        kwargs = dict(block_size=block_size, n_jobs=n_jobs)
+        ci_low, ci_high = bootstrap_ci(
+            diffs, n_resamples, ci, seed=seed_seqs[2 * imeasure], **kwargs
+        )
+        p_values = permutation_test(
+            diffs, n_resamples, seed=seed_seqs[2 * imeasure + 1], **kwargs
+        )
+        stats.append(
+            pd.DataFrame(
+                dict(
+                    measure=measure,
+                    name=names,
+                    n_subjects=len(subjects),
+                    mean_single=single.mean(axis=0),
+                    mean_dual=dual.mean(axis=0),
+                    diff=diffs.mean(axis=0),
+                    ci_low=ci_low,
+                    ci_high=ci_high,
+                    p_value=p_values,
+                )
+            )
+        )
+    return pd.concat(stats, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+    from time import perf_counter
+
+    from ecomp_experiment.cohort import get_data_dir, load_cohort
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="The experiment_data directory. Defaults to the one in this repository.",
+    )
+    parser.add_argument(
+        "--measures",
+        nargs="+",
+        choices=MEASURES,
+        default=MEASURES,
+        help="The measures to compare.",
+    )
+    parser.add_argument(
+        "--n-resamples", type=int, default=10000, help="Number of resamples."
+    )
+    parser.add_argument("--n-jobs", type=int, default=1, help="Number of processes.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="TSV file to write the statistics to.",
+    )
+    args = parser.parse_args()
+
+    data_dir = get_data_dir() if args.data_dir is None else args.data_dir
+    df = load_cohort(data_dir, n_jobs=args.n_jobs)
+    start = perf_counter()
+    stats = compare_streams(
+        df,
+        measures=args.measures,
+        n_resamples=args.n_resamples,
+        n_jobs=args.n_jobs,
+        seed=args.seed,
+    )
+    print(stats.to_string(index=False))
+    print(f"\nResampling took {perf_counter() - start:.1f} s")
+    if args.output is not None:
+        stats.to_csv(args.output, sep="\t", index=False)
+        print(f"Written to: {args.output}")
@@ -0,0 +1,274 @@
+"""Run many simulated sessions of the experiment in parallel, without a display.
+
+Each session runs the trial loop of main.py (see main.run_session) with
+a :class:`define_window.VirtualWindow`, a :class:`define_input.ScriptedResponder`,
+a :class:`define_ttl.FakeSerial` port, and a :class:`define_eyetracking.DummyEyeLink`.
+If GAZE_CONTINGENT_ITI is True in define_settings.py, the DummyEyeLink returns the
+gaze of a :class:`define_eyetracking.SimulatedGaze`.
+The data are written to a scratch experiment_data directory, separate from the
+experiment_data directory of this repository.
+
+To run the single and dual stream sessions of 100 simulated subjects on 8
+processes, run from the root of the repository::
+
+    python -m ecomp_experiment.session_farm --n-subjects 100 --n-jobs 8
+
+"""
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter
+
+import ecomp_experiment
+from ecomp_experiment.define_settings import (
+    EXPECTED_FPS,
+    FIXATION_RADIUS_DVA,
+    FIXATION_STABLE_FRAMES,
+    GAZE_CONTINGENT_ITI,
+    GAZE_POLL_BUDGET_FRAC,
+    GAZE_POLL_MAX_OVERRUNS,
+)
+
+# the pixels per degree visual angle of the simulated screen, about those of
+# a 1920 x 1080 pixel, 53 cm wide screen at 60 cm distance
+SIMULATED_PIX_PER_DVA = 38
+
+
+def run_virtual_session(data_dir, substr, stream, seed=None, ntrials=None):
+    """Run a simulated session.
+
+    Parameters
+    ----------
+    data_dir : pathlib.Path
+        The experiment_data directory to write to.
+    substr : str
+        The subject identifier string, of format f"{int}:02".
+    stream : {"single", "dual"}
+        The stream to run.
+    seed : int | None
+        The seed for the scripted responder. Defaults to None.
+    ntrials : int | None
+        The number of trials. If None (default), use NTRIALS from
+        define_settings.py.
+
+    Returns
+    -------
+    result : dict
+        Contains the keys "subject", "stream", "n_trials" (the number of trials
+        in the logfile), "n_flips", "simulated_s" (the duration of the session in
+        simulated time), "duration_s" (the duration in wall-clock time), and
+        "error" (None, or the traceback if the session failed).
+    """
+    from ecomp_experiment.define_eyetracking import (
+        DummyEyeLink,
+        FixationChecker,
+        SimulatedGaze,
+    )
+    from ecomp_experiment.define_input import ScriptedResponder
+    from ecomp_experiment.define_ttl import FakeSerial, MySerial
+    from ecomp_experiment.define_window import VirtualWindow
+    from ecomp_experiment.main import run_session
+
+    result = dict(
+        subject=substr,
+        stream=stream,
+        n_trials=0,
+        n_flips=0,
+        simulated_s=0.0,
+        duration_s=0.0,
+        error=None,
+    )
+    start = perf_counter()
+    win = VirtualWindow(fps=EXPECTED_FPS)
+    tk = DummyEyeLink()
+    fixation_checker = None
+    if GAZE_CONTINGENT_ITI:
+        tk.sample_source = SimulatedGaze(win.size, clock=win.getTime, seed=seed)
+        fixation_checker = FixationChecker(
+            tk,
+            screen_size=win.size,
+            radius_pix=FIXATION_RADIUS_DVA * SIMULATED_PIX_PER_DVA,
+            stable_frames=FIXATION_STABLE_FRAMES,
+            budget_s=GAZE_POLL_BUDGET_FRAC / EXPECTED_FPS,
+            max_overruns=GAZE_POLL_MAX_OVERRUNS,
+        )
+    try:
+        subjdir = Path(data_dir) / f"sub-{substr}"
+        streamdir = subjdir / stream
+        os.makedirs(streamdir, exist_ok=False)
+        info = dict(
+            ID=int(substr),
+            experiment_version=ecomp_experiment.__version__,
+            recording_datetime=datetime.datetime.today().isoformat(),
+            stream=stream,
+        )
+        with open(subjdir / f"sub-{substr}_stream-{stream}_info.json", "w") as fout:
+            json.dump(info, fout, indent=4, sort_keys=True)
+
+        logfile = run_session(
+            win,
+            EXPECTED_FPS,
+            ScriptedResponder(win=win, seed=seed),
+            tk,
+            MySerial(FakeSerial(), waitsecs=0),
+            "experiment",
+            streamdir,
+            stream,
+            substr,
+            ntrials=ntrials,
+            fixation_checker=fixation_checker,
+        )
+        with open(logfile, "r") as fin:
+            result["n_trials"] = sum(1 for line in fin) - 1
+    except Exception:
+        result["error"] = traceback.format_exc()
+
+    result["n_flips"] = len(win.flips)
+    result["simulated_s"] = win.getTime()
+    result["duration_s"] = perf_counter() - start
+    return result
+
+
+def run_farm(n_subjects, n_jobs=1, data_dir=None, ntrials=None, seed=None):
+    """Run the single and dual stream sessions of simulated subjects in parallel.
+
+    Parameters
+    ----------
+    n_subjects : int
+        The number of simulated subjects. Subjects are numbered from 1.
+    n_jobs : int
+        The number of processes to use. Defaults to 1.
+    data_dir : pathlib.Path | None
+        The experiment_data directory to write to. It must not contain data of
+        the simulated subjects yet. If None (default), a new temporary
+        directory is used.
+    ntrials : int | None
+        The number of trials per session. If None (default), use NTRIALS from
+        define_settings.py.
+    seed : int | None
+        The seed from which the seeds for the scripted responders of each
+        session are derived. Defaults to None.
+
+    Returns
+    -------
+    results : list of dict
+        The result of each session, see :func:`run_virtual_session`, ordered by
+        subject and stream.
+    data_dir : pathlib.Path
+        The experiment_data directory that was written to.
+    """
+    import numpy as np
+
+    if data_dir is None:
+        data_dir = Path(tempfile.mkdtemp(prefix="ecomp_farm_")) / "experiment_data"
+    os.makedirs(data_dir, exist_ok=True)
+
+    sessions = [
+        (f"{isub:02}", stream)
+        for isub in range(1, n_subjects + 1)
+        for stream in ["single", "dual"]
+    ]
+    seeds = np.random.SeedSequence(seed).generate_state(len(sessions))
+    args = [
+        (data_dir, substr, stream, int(session_seed), ntrials)
+        for (substr, stream), session_seed in zip(sessions, seeds)
+    ]
+
+    if n_jobs > 1:
+        results = []
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [executor.submit(run_virtual_session, *arg) for arg in args]
+            for future in as_completed(futures):
+                results.append(future.result())
+    else:
+        results = [run_virtual_session(*arg) for arg in args]
+
+    results.sort(key=lambda result: (result["subject"], result["stream"] != "single"))
+    return results, Path(data_dir)
+
+
+def summarize_farm(results, wall_s):
+    """Summarize the throughput and failures of simulated sessions.
+
+    Parameters
+    ----------
+    results : list of dict
+        The results of :func:`run_farm`.
+    wall_s : float
+        The wall-clock time it took to run all sessions.
+
+    Returns
+    -------
+    summary : str
+        A report with the number of sessions, trials, and failures, the
+        throughput, and the tracebacks of failed sessions.
+    """
+    failed = [result for result in results if result["error"] is not None]
+    n_trials = sum(result["n_trials"] for result in results)
+    simulated_s = sum(result["simulated_s"] for result in results)
+    lines = [
+        f"Sessions: {len(results)} ({len(failed)} failed)",
+        f"Trials: {n_trials}",
+        f"Wall-clock time: {wall_s:.1f} s",
+        f"Throughput: {len(results) / wall_s:.2f} sessions/s, "
+        f"{n_trials / wall_s:.0f} trials/s",
+        f"Simulated time: {simulated_s / 3600:.1f} h "
+        f"({simulated_s / wall_s:.0f}x real time)",
+    ]
+    for result in failed:
+        lines.append(f"\nsub-{result['subject']} {result['stream']} failed:")
+        lines.append(result["error"].rstrip())
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--n-subjects", type=int, default=10, help="Number of simulated subjects."
+    )
+    parser.add_argument("--n-jobs", type=int, default=1, help="Number of processes.")
+    parser.add_argument(
+        "--ntrials",
+        type=int,
+        default=None,
+        help="Number of trials per session. Defaults to NTRIALS in define_settings.",
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="The experiment_data directory to write to. Defaults to a temporary "
+        "directory, which is removed afterwards unless --keep is passed.",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the temporary directory."
+    )
+    args = parser.parse_args()
+
+    start = perf_counter()
+    results, data_dir = run_farm(
+        args.n_subjects,
+        n_jobs=args.n_jobs,
+        data_dir=args.data_dir,
+        ntrials=args.ntrials,
+        seed=args.seed,
+    )
+    print(summarize_farm(results, perf_counter() - start))
+
+    if args.data_dir is None and not args.keep:
+        shutil.rmtree(data_dir.parent)
+    else:
+        print(f"\nData written to: {data_dir}")
+
+    n_failed = sum(result["error"] is not None for result in results)
+    sys.exit(1 if n_failed > 0 else 0)
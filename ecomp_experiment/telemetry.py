@@ -0,0 +1,303 @@
+"""Publish per-trial records of a running session over a local socket.
+
+The experiment publishes one record per trial (see main.run_session) to all
+connected clients, as JSON lines. The socket is served by an asyncio event loop in
+a background thread. Publishing only hands the record to that thread, so a slow or
+absent client never delays the frame loop: records are dropped for clients that do
+not keep up.
+
+Set TELEMETRY_ADDRESS in define_settings.py to enable publishing, either to a
+``"host:port"`` string for a TCP socket, or to a file path for a Unix socket (not
+available on Windows).
+To show rolling statistics while the experiment is running, run from the root of
+the repository::
+
+    python -m ecomp_experiment.telemetry 127.0.0.1:8765
+
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+from collections import deque
+
+import numpy as np
+
+
+def parse_address(address):
+    """Parse a telemetry address.
+
+    Parameters
+    ----------
+    address : str
+        Either ``"host:port"`` for a TCP socket, or a file path for a Unix socket.
+
+    Returns
+    -------
+    host_or_path : str
+        The host, or the path of the Unix socket.
+    port : int | None
+        The port, or None for a Unix socket.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address and "\\" not in address:
+        return host, int(port)
+    return address, None
+
+
+def _check_unix_socket(path):
+    """Raise an error if Unix sockets are not available on this platform."""
+    if not hasattr(socket, "AF_UNIX"):
+        raise ValueError(
+            f"Unix sockets are not available on this platform, got: {path}. "
+            "Use a TCP address such as '127.0.0.1:8765' instead."
+        )
+
+
+def _to_builtin(obj):
+    """Convert numpy scalars for JSON."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class TelemetryPublisher:
+    """Serve records to clients on a local socket, without blocking the caller.
+
+    Parameters
+    ----------
+    address : str | None
+        The address to serve on, see :func:`parse_address`. If None, publishing
+        does nothing, so that the publisher can be used unconditionally. Unix
+        socket addresses raise a ValueError on platforms without Unix sockets.
+    history : int
+        The number of most recent records to send to newly connected clients.
+        Defaults to 100.
+    max_queue : int
+        The number of records to buffer per client. Further records are dropped
+        for that client until it catches up. Defaults to 1000.
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether records are published, i.e., whether `address` is not None.
+    n_published : int
+        The number of published records.
+    n_dropped : int
+        The number of records that were dropped for slow clients.
+    """
+
+    def __init__(self, address=None, history=100, max_queue=1000):
+        """Start serving in a background thread."""
+        self.address = address
+        self.enabled = address is not None
+        self.max_queue = max_queue
+        self.n_published = 0
+        self.n_dropped = 0
+        self._history = deque(maxlen=history)
+        self._queues = set()
+        self._tasks = set()
+        self._loop = None
+        self._server = None
+        if not self.enabled:
+            return
+        host_or_path, port = parse_address(address)
+        if port is None:
+            _check_unix_socket(host_or_path)
+
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        errors = []
+        self._thread = threading.Thread(
+            target=self._run, args=(started, errors), name="telemetry", daemon=True
+        )
+        self._thread.start()
+        started.wait()
+        if len(errors) > 0:
+            self._loop = None
+            raise errors[0]
+
+    def _run(self, started, errors):
+        """Run the event loop of the server."""
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(self._start_server())
+        except OSError as error:
+            errors.append(error)
+            self._loop.close()
+            started.set()
+            return
+        started.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _start_server(self):
+        """Start a TCP or Unix socket server."""
+        host_or_path, port = parse_address(self.address)
+        if port is None:
+            return await asyncio.start_unix_server(
+                self._handle_client, path=host_or_path
+            )
+        return await asyncio.start_server(self._handle_client, host_or_path, port)
+
+    async def _handle_client(self, reader, writer):
+        """Send the history, then each published record, to a client."""
+        queue = asyncio.Queue(maxsize=self.max_queue)
+        for line in self._history:
+            queue.put_nowait(line)
+        task = asyncio.current_task()
+        self._queues.add(queue)
+        self._tasks.add(task)
+        try:
+            while True:
+                line = await queue.get()
+                if line is None:
+                    break
+                writer.write(line)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # the client did not receive the queued records in time
+            writer.transport.abort()
+        finally:
+            self._queues.discard(queue)
+            self._tasks.discard(task)
+            writer.close()
+
+    def _broadcast(self, line):
+        """Queue a record for all clients (runs in the event loop)."""
+        self._history.append(line)
+        for queue in self._queues:
+            try:
+                queue.put_nowait(line)
+            except asyncio.QueueFull:
+                self.n_dropped += 1
+
+    def publish(self, record):
+        """Publish a record to all clients, without waiting for them.
+
+        Parameters
+        ----------
+        record : dict
+            The record to publish. Must be serializable to JSON (numpy scalars
+            are converted).
+        """
+        if self._loop is None:
+            return
+        line = (json.dumps(record, default=_to_builtin) + "\n").encode()
+        self._loop.call_soon_threadsafe(self._broadcast, line)
+        self.n_published += 1
+
+    async def _shutdown(self, timeout):
+        """Stop accepting clients, and send them what is queued."""
+        self._server.close()
+        for queue in self._queues:
+            if not queue.full():
+                queue.put_nowait(None)
+        if len(self._tasks) > 0:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        # let the transports of the clients close
+        await asyncio.sleep(0)
+        self._loop.stop()
+
+    def close(self, timeout=1):
+        """Stop serving.
+
+        Parameters
+        ----------
+        timeout : float
+            How long to wait in seconds for clients to receive queued records.
+            Defaults to 1.
+        """
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(timeout), self._loop)
+        self._thread.join()
+        self._loop = None
+
+        host_or_path, port = parse_address(self.address)
+        if port is None and os.path.exists(host_or_path):
+            os.remove(host_or_path)
+
+
+class RollingStats:
+    """Summarize the most recent trial records.
+
+    Parameters
+    ----------
+    window : int
+        The number of most recent trials to summarize. Defaults to 20.
+    """
+
+    def __init__(self, window=20):
+        """Start without records."""
+        self.records = deque(maxlen=window)
+        self.n_trials = 0
+        self.n_dropped_frames = 0
+        self.max_trigger_queue = 0
+
+    def update(self, record):
+        """Add a trial record."""
+        self.records.append(record)
+        self.n_trials += 1
+        self.n_dropped_frames += record["dropped_frames"]
+        self.max_trigger_queue = max(self.max_trigger_queue, record["trigger_queue"])
+
+    def format(self):
+        """Format the statistics as a line of text."""
+        correct = [rec["correct"] is True for rec in self.records]
+        rts = [rec["rt"] for rec in self.records if rec["rt"] != "n/a"]
+        n_timeouts = len(self.records) - len(rts)
+        median_rt = f"{np.median(rts) * 1000:.0f} ms" if len(rts) > 0 else "n/a"
+        return (
+            f"trial {self.records[-1]['trial'] + 1}: "
+            f"accuracy {np.mean(correct) * 100:.0f}%, "
+            f"median RT {median_rt}, timeouts {n_timeouts} "
+            f"(last {len(self.records)} trials) | "
+            f"dropped frames {self.n_dropped_frames}, "
+            f"max trigger queue {self.max_trigger_queue}"
+        )
+
+
+async def monitor(address, window=20):
+    """Print rolling statistics of the records published on `address`."""
+    host_or_path, port = parse_address(address)
+    if port is None:
+        _check_unix_socket(host_or_path)
+        reader, writer = await asyncio.open_unix_connection(host_or_path)
+    else:
+        reader, writer = await asyncio.open_connection(host_or_path, port)
+
+    stats = RollingStats(window)
+    async for line in reader:
+        stats.update(json.loads(line))
+        print(stats.format(), flush=True)
+    writer.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ecomp_experiment.define_settings import TELEMETRY_ADDRESS
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "address",
+        nargs="?",
+        default=TELEMETRY_ADDRESS,
+        help="The address of the socket. Defaults to TELEMETRY_ADDRESS.",
+    )
+    parser.add_argument(
+        "--window", type=int, default=20, help="Number of trials to summarize."
+    )
+    args = parser.parse_args()
+    if args.address is None:
+        parser.error("No address given, and TELEMETRY_ADDRESS is None.")
+
+    asyncio.run(monitor(args.address, args.window))
@@ -0,0 +1,39 @@
+"""Shared fixtures for the tests."""
+
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+test_data = Path(__file__).parent.resolve() / "data"
+
+
+@pytest.fixture
+def make_data_dir(tmp_path):
+    """Get a function that makes an experiment_data directory in `tmp_path`.
+
+    The function takes a list of subject IDs and adds a session of each stream
+    for each of them, with the behavioral data of the test data directory. It
+    can be called several times to add subjects, and returns the directory.
+    """
+
+    def _make_data_dir(substrs):
+        data_dir = tmp_path / "experiment_data"
+        for substr in substrs:
+            subjdir = data_dir / f"sub-{substr}"
+            for stream in ["single", "dual"]:
+                streamdir = subjdir / stream
+                os.makedirs(streamdir, exist_ok=True)
+                shutil.copyfile(
+                    test_data / f"samples-10_stream-{stream}_beh.tsv",
+                    streamdir / f"sub-{substr}_stream-{stream}_beh.tsv",
+                )
+                info = dict(ID=substr, Age=25, Sex="Female", Handedness="Right")
+                info_fname = subjdir / f"sub-{substr}_stream-{stream}_info.json"
+                with open(info_fname, "w") as f:
+                    json.dump(info, f)
+        return data_dir
+
+    return _make_data_dir
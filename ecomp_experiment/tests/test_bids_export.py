@@ -0,0 +1,236 @@
+"""Test exporting the data of all sessions to a BIDS dataset."""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ecomp_experiment.bids_export
+from ecomp_experiment.bids_export import export_bids, make_physioevents
+from ecomp_experiment.define_ttl import get_ttl_dict
+
+test_data = Path(__file__).parent.resolve() / "data"
+
+ASC_HEADER = """** CONVERTED FROM 10191200.edf using edfapi 4.2.1 Apr 17 2020
+**
+
+MSG\t1000 DISPLAY_COORDS = 0 0 2559 1439
+START\t1001 \tRIGHT\tSAMPLES\tEVENTS
+SAMPLES\tGAZE\tRIGHT\tRATE\t500.00\tTRACKING\tCR\tFILTER\t2
+"""
+
+# trigger codes sent every 10 samples, starting with the reset to 0
+TRIGGERS = [0, 80, 1, 2, 11, 29, 3, 32, 4, 90]
+
+
+def make_asc(n_samples, start=1002):
+    """Make an ASC file with monocular samples, triggers, and fixations."""
+    lines = [ASC_HEADER]
+    for i in range(n_samples):
+        time = start + 2 * i
+        lines.append(f"{time}\t 10{i % 10}.5\t 200.0\t 1000.0\t.....\n")
+        if i % 10 == 0:
+            lines.append(f"MSG\t{time} {TRIGGERS[i // 10 % len(TRIGGERS)]}\n")
+        if i % 25 == 24:
+            lines.append(
+                f"EFIX R   {time - 20}\t{time}\t22\t  100.0\t  200.0\t   1000\n"
+            )
+    lines.append(f"END\t{start + 2 * n_samples} \tSAMPLES\tEVENTS\n")
+    return "".join(lines)
+
+
+def add_eyetrack(data_dir):
+    """Add an ASC file to the single stream session of subject 01."""
+    asc_fname = data_dir / "sub-01" / "single" / "sub-01_stream-single_eyetrack.asc"
+    asc_fname.write_text(make_asc(100))
+    return data_dir
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_export_bids(tmp_path, make_data_dir, n_jobs):
+    """Test exporting behavior, triggers, and eye-tracking data."""
+    data_dir = add_eyetrack(make_data_dir(["01", "02"]))
+    bids_root = tmp_path / "bids"
+    results = export_bids(data_dir, bids_root, n_jobs=n_jobs)
+    assert [result["session"] for result in results] == [
+        "sub-01_task-single",
+        "sub-01_task-dual",
+        "sub-02_task-single",
+        "sub-02_task-dual",
+    ]
+    assert all(result["error"] is None for result in results)
+    assert results[0]["exported"] == ["beh", "eyetrack"]
+    assert results[1]["exported"] == ["beh"]
+
+    description = json.loads((bids_root / "dataset_description.json").read_text())
+    assert description["BIDSVersion"] == "1.10.0"
+    participants = pd.read_csv(bids_root / "participants.tsv", sep="\t")
+    assert participants["participant_id"].tolist() == ["sub-01", "sub-02"]
+    assert participants["age"].tolist() == [25, 25]
+
+    # behavioral logfiles are exported as they are
+    beh_dir = bids_root / "sub-01" / "beh"
+    beh_fname = data_dir / "sub-01" / "dual" / "sub-01_stream-dual_beh.tsv"
+    exported = beh_dir / "sub-01_task-dual_beh.tsv"
+    assert exported.read_bytes() == beh_fname.read_bytes()
+    beh_json = json.loads((beh_dir / "sub-01_task-dual_beh.json").read_text())
+    assert list(beh_json) == pd.read_csv(exported, sep="\t").columns.tolist()
+    assert beh_json["rt"]["Units"] == "s"
+
+    # triggers, with onsets relative to the first sample
+    events = pd.read_csv(
+        beh_dir / "sub-01_task-single_events.tsv", sep="\t", keep_default_na=False
+    )
+    np.testing.assert_allclose(events["onset"], np.arange(0, 0.2, 0.02))
+    assert events["value"].tolist() == TRIGGERS
+    names = {ord(byte): name for name, byte in get_ttl_dict().items()}
+    assert events["trial_type"].tolist() == ["n/a"] + [names[i] for i in TRIGGERS[1:]]
+    assert events["trial_type"][1] == "single_begin_experiment"
+    events_json = json.loads((beh_dir / "sub-01_task-single_events.json").read_text())
+    assert events_json["value"]["Levels"]["80"] == "single_begin_experiment"
+
+    # samples and events of the eye-tracker, without a header
+    prefix = "sub-01_task-single_recording-eye1"
+    physio_json = json.loads((beh_dir / f"{prefix}_physio.json").read_text())
+    assert physio_json["RecordedEye"] == "right"
+    assert physio_json["SamplingFrequency"] == 500
+    physio = pd.read_csv(
+        beh_dir / f"{prefix}_physio.tsv.gz",
+        sep="\t",
+        header=None,
+        names=physio_json["Columns"],
+    )
+    assert physio.shape == (100, 4)
+    np.testing.assert_array_equal(physio["timestamp"], np.arange(1002, 1202, 2))
+    np.testing.assert_allclose(physio["x_coordinate"][:3], [100.5, 101.5, 102.5])
+    with gzip.open(beh_dir / f"{prefix}_physioevents.tsv.gz", "rt") as fin:
+        physioevents = pd.read_csv(fin, sep="\t", header=None)
+    assert physioevents.shape == (4 + 10 + 1, 5)
+    assert not (beh_dir / "sub-01_task-dual_events.tsv").exists()
+
+
+def test_make_physioevents():
+    """Test the onsets and durations of eye-tracker events."""
+    asc_events = pd.DataFrame(
+        dict(
+            time=[1000.0, 1010, 1030, np.nan],
+            kind=["MSG", "EFIX", "ESACC", "SAMPLES"],
+            text=[
+                "DISPLAY_COORDS = 0 0 2559 1439",
+                "R 1029 20 1.0",
+                "L 1040 11 2.0",
+                "GAZE",
+            ],
+        )
+    )
+    physioevents = make_physioevents(asc_events, start_time=1000)
+    assert physioevents["trial_type"].tolist() == ["message", "fixation", "saccade"]
+    np.testing.assert_allclose(physioevents["onset"], [0, 0.01, 0.03])
+    np.testing.assert_allclose(physioevents["duration"], [0, 0.02, 0.011])
+    assert physioevents["eye"].tolist() == ["n/a", "R", "L"]
+    assert physioevents["message"][0] == "DISPLAY_COORDS = 0 0 2559 1439"
+
+
+def test_export_bids_incremental(tmp_path, make_data_dir, monkeypatch):
+    """Test that re-runs only export sessions with changed or missing files."""
+    data_dir = add_eyetrack(make_data_dir(["01", "02"]))
+    bids_root = tmp_path / "bids"
+    export_bids(data_dir, bids_root)
+    manifest = json.loads((bids_root / ".export_manifest.json").read_text())
+    assert list(manifest["sessions"]["sub-01_task-single"]) == ["beh", "eyetrack"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("should not export")
+
+    monkeypatch.setattr(ecomp_experiment.bids_export, "export_beh", fail)
+    monkeypatch.setattr(ecomp_experiment.bids_export, "export_eyetrack", fail)
+    monkeypatch.setattr(ecomp_experiment.bids_export, "get_sha256", fail)
+    results = export_bids(data_dir, bids_root)
+    assert all(result["exported"] == [] for result in results)
+    assert all(result["error"] is None for result in results)
+    monkeypatch.undo()
+
+    # changed files, missing outputs, and new files are exported again
+    beh_fname = data_dir / "sub-02" / "dual" / "sub-02_stream-dual_beh.tsv"
+    with open(beh_fname, "a") as fout:
+        fout.write(beh_fname.read_text().splitlines()[-1] + "\n")
+    os.remove(bids_root / "sub-01" / "beh" / "sub-01_task-single_events.tsv")
+    shutil.copyfile(
+        data_dir / "sub-01" / "single" / "sub-01_stream-single_eyetrack.asc",
+        data_dir / "sub-02" / "single" / "sub-02_stream-single_eyetrack.asc",
+    )
+
+    # a file with a new modification time, but the same content, is not exported
+    os.utime(beh_fname.parent.parent / "single" / "sub-02_stream-single_beh.tsv")
+
+    results = export_bids(data_dir, bids_root)
+    exported = {result["session"]: result["exported"] for result in results}
+    assert exported == {
+        "sub-01_task-single": ["eyetrack"],
+        "sub-01_task-dual": [],
+        "sub-02_task-single": ["eyetrack"],
+        "sub-02_task-dual": ["beh"],
+    }
+    beh = pd.read_csv(
+        bids_root / "sub-02" / "beh" / "sub-02_task-dual_beh.tsv", sep="\t"
+    )
+    assert beh.shape[0] == 11
+
+    # failed sessions are reported, and exported again on the next run
+    monkeypatch.setattr(ecomp_experiment.bids_export, "export_beh", fail)
+    with open(beh_fname, "a") as fout:
+        fout.write(beh_fname.read_text().splitlines()[-1] + "\n")
+    results = export_bids(data_dir, bids_root)
+    assert "should not export" in results[3]["error"]
+    monkeypatch.undo()
+    results = export_bids(data_dir, bids_root)
+    assert results[3]["exported"] == ["beh"]
+
+
+def test_export_bids_edf(tmp_path, make_data_dir, monkeypatch):
+    """Test converting EDF files with edf2asc, if it is installed."""
+    data_dir = add_eyetrack(make_data_dir(["01"]))
+    session_dir = data_dir / "sub-01" / "dual"
+    edf_fname = session_dir / "sub-01_stream-dual_eyetrack.edf"
+    edf_fname.write_bytes(b"not really an EDF file")
+    bids_root = tmp_path / "bids"
+
+    monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+    results = export_bids(data_dir, bids_root)
+    assert results[1]["exported"] == ["beh"]
+    assert results[1]["warnings"] == [
+        "sub-01_stream-dual_eyetrack.edf not exported: edf2asc is not installed"
+    ]
+    assert "eyetrack" not in results[1]["parts"]
+
+    # a fake edf2asc that writes an ASC file next to the EDF file
+    os.makedirs(tmp_path / "bin")
+    edf2asc = tmp_path / "bin" / "edf2asc"
+    edf2asc.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "from pathlib import Path\n"
+        "edf_fname = Path(sys.argv[-1])\n"
+        f"edf_fname.with_suffix('.asc').write_text({make_asc(20)!r})\n"
+    )
+    edf2asc.chmod(0o755)
+    results = export_bids(data_dir, bids_root)
+    assert results[1]["exported"] == ["eyetrack"]
+    assert results[1]["warnings"] == []
+    assert results[1]["parts"]["eyetrack"]["input"]["fname"] == str(edf_fname)
+    physio = pd.read_csv(
+        bids_root / "sub-01" / "beh" / "sub-01_task-dual_recording-eye1_physio.tsv.gz",
+        sep="\t",
+        header=None,
+    )
+    assert physio.shape == (20, 4)
+
+    # the ASC file is not an input, because it is converted from the EDF file
+    results = export_bids(data_dir, bids_root)
+    assert results[1]["exported"] == []
@@ -0,0 +1,117 @@
+"""Test aggregating behavioral data over participants."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import ecomp_experiment.cohort
+from ecomp_experiment.cohort import (
+    BEH_DTYPES,
+    calc_bonuses,
+    find_sessions,
+    load_cohort,
+)
+from ecomp_experiment.utils import calc_bonus
+
+test_data = Path(__file__).parent.resolve() / "data"
+
+
+def test_find_sessions(make_data_dir):
+    """Test finding sessions in the experiment_data directory."""
+    data_dir = make_data_dir(["02", "01", "test"])
+    sessions = find_sessions(data_dir)
+    assert [beh_fname.name for beh_fname, _ in sessions] == [
+        "sub-01_stream-single_beh.tsv",
+        "sub-01_stream-dual_beh.tsv",
+        "sub-02_stream-single_beh.tsv",
+        "sub-02_stream-dual_beh.tsv",
+    ]
+    assert all(info_fname.exists() for _, info_fname in sessions)
+    assert len(find_sessions(data_dir, include_test=True)) == 6
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_load_cohort(make_data_dir, monkeypatch, n_jobs):
+    """Test loading all sessions, and caching them."""
+    data_dir = make_data_dir(["01", "02", "03"])
+    df = load_cohort(data_dir, n_jobs=n_jobs)
+    assert df.shape[0] == 60
+    assert df["subject"].unique().tolist() == ["01", "02", "03"]
+    assert (df["age"] == 25).all()
+    for column, dtype in BEH_DTYPES.items():
+        if dtype is not str:
+            assert df[column].dtype == dtype, column
+    assert df["correct"].isna().sum() == 3
+    assert (data_dir / ".cache" / "index.json").exists()
+
+    # Nothing is parsed if nothing changed
+    read_session = ecomp_experiment.cohort.read_session
+
+    def read_session_fail(*args):
+        raise AssertionError("should not parse")
+
+    monkeypatch.setattr(ecomp_experiment.cohort, "read_session", read_session_fail)
+    df_cached = load_cohort(data_dir)
+    assert df_cached.equals(df)
+
+    # Only changed or new sessions are parsed
+    parsed = []
+
+    def read_session_count(*args):
+        parsed.append(args[0].name)
+        return read_session(*args)
+
+    monkeypatch.setattr(ecomp_experiment.cohort, "read_session", read_session_count)
+    beh_fname = data_dir / "sub-02" / "dual" / "sub-02_stream-dual_beh.tsv"
+    lines = beh_fname.read_text().splitlines(keepends=True)
+    beh_fname.write_text("".join(lines[:-1]))
+    make_data_dir(["04"])
+    df = load_cohort(data_dir)
+    assert sorted(parsed) == [
+        "sub-02_stream-dual_beh.tsv",
+        "sub-04_stream-dual_beh.tsv",
+        "sub-04_stream-single_beh.tsv",
+    ]
+    assert df.shape[0] == 79
+    np.testing.assert_array_equal(df["subject"].unique(), ["01", "02", "03", "04"])
+
+
+def test_load_cohort_empty(tmpdir):
+    """Test loading from a directory without data."""
+    df = load_cohort(tmpdir, cache_dir=Path(tmpdir) / "cache")
+    assert df.shape[0] == 0
+    assert "sample1" in df.columns
+
+
+def test_calc_bonuses(tmpdir, make_data_dir):
+    """Test calculating bonus money for all participants at once."""
+    data_dir = make_data_dir(["01", "02", "03"])
+    os.remove(data_dir / "sub-03" / "dual" / "sub-03_stream-dual_beh.tsv")
+    payouts = calc_bonuses(load_cohort(data_dir))
+    assert payouts["subject"].tolist() == ["01", "02"]
+
+    bonus_euro = calc_bonus(
+        test_data / "samples-10_stream-single_beh.tsv",
+        test_data / "samples-10_stream-dual_beh.tsv",
+    )
+    assert (payouts["bonus_euro"] == bonus_euro).all()
+    assert (payouts["accuracy"] == 60).all()
+
+    # Same via the command line
+    output = Path(tmpdir) / "payouts.tsv"
+    cmd = [sys.executable, "-m", "ecomp_experiment.cohort", "--data-dir"]
+    cmd += [str(data_dir), "--n-jobs", "2", "bonus", "--output", str(output)]
+    subprocess.run(cmd, check=True, cwd=Path(__file__).parents[2])
+    lines = output.read_text().splitlines()
+    assert lines[0].split("\t") == [
+        "subject",
+        "acc_single",
+        "acc_dual",
+        "accuracy",
+        "bonus_euro",
+    ]
+    assert len(lines) == 3
@@ -1,10 +1,23 @@
 """Test those parts of eye-tracking scripts that we easily can in CI."""
 
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
 from ecomp_experiment.define_eyetracking import (
+    MISSING_DATA,
     DummyEyeLink,
+    EDFTransfer,
+    FixationChecker,
+    SimulatedGaze,
+    close_eyetracker,
+    get_gaze,
     setup_eyetracker,
     start_eye_recording,
     stop_eye_recording,
+    verify_sha256,
 )
 
 
@@ -20,4 +33,179 @@ def test_dummy_eyelink():
     error = start_eye_recording(tk)
     assert error == 0
 
-    stop_eye_recording(tk, 1, 2)
+    assert stop_eye_recording(tk, 1, 2) is None
+    assert stop_eye_recording(tk, 1, 2, background=True) is None
+    close_eyetracker(tk)
+
+
+class FakeClock:
+    """A clock that advances by a fixed step each time it is read."""
+
+    def __init__(self, step):
+        """Start at zero."""
+        self.t = 0
+        self.step = step
+
+    def __call__(self):
+        """Advance and return the time."""
+        self.t += self.step
+        return self.t
+
+
+def test_simulated_gaze():
+    """Test the simulated sample source of the dummy."""
+    screen_size = (1000, 500)
+    tk = DummyEyeLink()
+    assert tk.getNewestSample() is None
+    assert get_gaze(tk.getNewestSample()) is None
+
+    # always fixating
+    gaze = SimulatedGaze(
+        screen_size, sd_pix=1, lapse_rate=0, clock=FakeClock(0.001), seed=1
+    )
+    tk = DummyEyeLink(sample_source=gaze)
+    xy = np.array([get_gaze(tk.getNewestSample()) for _ in range(1000)])
+    np.testing.assert_allclose(xy.mean(axis=0), (500, 250), atol=0.5)
+
+    # frequent lapses
+    clock = FakeClock(0.001)
+    gaze = SimulatedGaze(screen_size, lapse_rate=10, lapse_s=0.1, clock=clock, seed=1)
+    tk = DummyEyeLink(sample_source=gaze)
+    xy = np.array([get_gaze(tk.getNewestSample()) for _ in range(1000)])
+    away = (xy == (250, 125)).all(axis=1)
+    assert 0.1 < away.mean() < 0.9
+
+    # missing data
+    tk = DummyEyeLink(sample_source=lambda: (MISSING_DATA, MISSING_DATA))
+    assert get_gaze(tk.getNewestSample()) is None
+
+
+def test_fixation_checker():
+    """Test checking for stable fixation."""
+    screen_size = (1000, 500)
+    gaze = [(500, 250)] * 3 + [(100, 100)] + [(510, 260)] * 3
+    tk = DummyEyeLink(sample_source=iter(gaze).__next__)
+    checker = FixationChecker(
+        tk,
+        screen_size,
+        radius_pix=20,
+        stable_frames=2,
+        budget_s=0.001,
+        clock=FakeClock(0.0005),
+    )
+    stable = [checker.update() for _ in range(len(gaze))]
+    assert stable == [False, True, True, False, False, True, True]
+    assert len(checker.poll_durations) == len(gaze)
+    assert checker.n_overruns == 0
+    assert checker.enabled
+
+    checker.reset()
+    assert checker.n_stable == 0
+
+
+class FakePollClock:
+    """A clock for which each poll of the eye-tracker takes the next duration."""
+
+    def __init__(self, durations):
+        """Take the durations of the polls in seconds."""
+        self.durations = iter(durations)
+        self.t = 0
+        self.polling = False
+
+    def __call__(self):
+        """Return the time, alternating between the start and end of a poll."""
+        if self.polling:
+            self.t += next(self.durations)
+        self.polling = not self.polling
+        return self.t
+
+
+def test_fixation_checker_budget():
+    """Test that polling is turned off after consecutive polls over budget."""
+    screen_size = (1000, 500)
+    polls = []
+    tk = DummyEyeLink(sample_source=lambda: polls.append(1) or (0, 0))
+    checker = FixationChecker(
+        tk,
+        screen_size,
+        radius_pix=20,
+        stable_frames=2,
+        budget_s=0.001,
+        max_overruns=3,
+        clock=FakePollClock([0.002] * 3),
+    )
+    # gaze is never on the center, but without polling, fixation counts as stable
+    stable = [checker.update() for _ in range(5)]
+    assert stable == [False, False, True, True, True]
+    assert not checker.enabled
+    assert len(polls) == 3
+    assert checker.n_overruns == 3
+    assert len(checker.poll_durations) == 3
+
+    # polls within budget reset the count of consecutive overruns
+    checker = FixationChecker(
+        tk,
+        screen_size,
+        radius_pix=20,
+        stable_frames=2,
+        budget_s=0.001,
+        max_overruns=3,
+        clock=FakePollClock([0.002, 0.002, 0.0005] * 3),
+    )
+    stable = [checker.update() for _ in range(9)]
+    assert not any(stable)
+    assert checker.enabled
+    assert checker.n_overruns == 6
+
+
+class FakeEyeLinkTransfer:
+    """Mimic receiveDataFile of an EyeLink, failing for the first attempts."""
+
+    def __init__(self, data, n_failures):
+        """Take the file content, and how many attempts should fail."""
+        self.data = data
+        self.n_failures = n_failures
+        self.n_calls = 0
+
+    def receiveDataFile(self, src, dest):
+        """Write the data to dest, but only half of it for failing attempts."""
+        self.n_calls += 1
+        data = self.data
+        if self.n_calls <= self.n_failures:
+            data = data[: len(data) // 2]
+        with open(dest, "wb") as fout:
+            fout.write(data)
+        return len(self.data)
+
+
+@pytest.mark.parametrize("n_failures", [0, 2, 4])
+def test_edf_transfer(tmpdir, n_failures):
+    """Test transferring an EDF file in the background with retries."""
+    data = bytes(range(256)) * 1000
+    tk = FakeEyeLinkTransfer(data, n_failures)
+    edf_fname_local = Path(tmpdir) / "sub-01_stream-single_eyetrack.edf"
+    transfer = EDFTransfer(tk, "10191200.edf", edf_fname_local, n_retries=3)
+    transfer.start()
+    transfer.join(timeout=10)
+    assert not transfer.is_alive()
+
+    if n_failures <= 3:
+        assert transfer.ok
+        assert transfer.n_attempts == n_failures + 1
+        assert edf_fname_local.read_bytes() == data
+        assert transfer.checksum == hashlib.sha256(data).hexdigest()
+        checksum_file = edf_fname_local.with_name(edf_fname_local.name + ".sha256")
+        assert checksum_file.read_text().split() == [
+            transfer.checksum,
+            edf_fname_local.name,
+        ]
+        assert transfer.bytes_received == len(data)
+        assert verify_sha256(edf_fname_local)
+        with open(edf_fname_local, "ab") as fout:
+            fout.write(b"\0")
+        assert not verify_sha256(edf_fname_local)
+    else:
+        assert not transfer.ok
+        assert transfer.n_attempts == 4
+        assert not edf_fname_local.exists()
+        assert "Received" in transfer.error
@@ -0,0 +1,176 @@
+"""Test the sources of key presses."""
+
+import numpy as np
+import pytest
+
+from ecomp_experiment.benchmark_keyboard import summarize_latencies
+from ecomp_experiment.define_eyetracking import DummyEyeLink
+from ecomp_experiment.define_input import (
+    PsychtoolboxKeyboard,
+    ScriptedResponder,
+    get_input,
+)
+from ecomp_experiment.define_routines import display_block_break, display_instructions
+from ecomp_experiment.define_settings import KEYLIST_DICT
+from ecomp_experiment.define_ttl import FakeSerial
+from ecomp_experiment.define_window import VirtualClock, VirtualWindow
+from ecomp_experiment.utils import AccuracyTracker
+
+
+def test_scripted_responder():
+    """Test simulating response times, timeouts, and choices."""
+    win = VirtualWindow()
+    clock = VirtualClock(win)
+    responder = ScriptedResponder(win=win, timeout_rate=0.1, seed=1)
+    key_list = KEYLIST_DICT["left"] + KEYLIST_DICT["right"] + KEYLIST_DICT["quit"]
+
+    rts = []
+    keys = []
+    for _ in range(1000):
+        clock.reset()
+        key_rt = responder.waitKeys(maxWait=3, keyList=key_list, timeStamped=clock)
+        if key_rt is None:
+            assert clock.getTime() == pytest.approx(3)
+            continue
+        key, rt = key_rt[0]
+        assert rt == pytest.approx(clock.getTime())
+        rts.append(rt)
+        keys.append(key)
+
+    assert responder.n_presses + responder.n_timeouts == 1000
+    assert 0.05 < responder.n_timeouts / 1000 < 0.15
+    assert np.median(rts) == pytest.approx(0.6, rel=0.1)
+    assert max(rts) <= 3
+    assert set(keys) == {KEYLIST_DICT["left"][0], KEYLIST_DICT["right"][0]}
+
+    # polling: the response is scheduled when events are cleared
+    responder = ScriptedResponder(win=win, rt_median_s=0.5, rt_sigma=0.01, seed=1)
+    assert responder.getKeys() == []
+    responder.clearEvents()
+    clock.reset()
+    while len(responder.getKeys()) == 0:
+        win.flip()
+    assert 0.49 < clock.getTime() < 0.52
+    assert responder.getKeys() == []
+
+    # responses after the response window are timeouts
+    responder.clearEvents(maxWait=0.3)
+    assert responder.n_timeouts == 1
+    for _ in range(100):
+        win.flip()
+        assert responder.getKeys() == []
+    responder.clearEvents(maxWait=1)
+    assert responder.n_timeouts == 1
+
+    # the policy decides between left and right, no timeouts without maxWait
+    responder = ScriptedResponder(policy="right", timeout_rate=1)
+    assert responder.waitKeys(keyList=["d", "s"]) == ["d"]
+    assert responder.waitKeys(timeStamped=True)[0][0] == KEYLIST_DICT["right"][0]
+    assert responder.waitKeys(keyList=KEYLIST_DICT["quit"]) == KEYLIST_DICT["quit"]
+
+    with pytest.raises(ValueError, match="Unknown policy"):
+        ScriptedResponder(policy="correct")
+    with pytest.raises(ValueError, match="Unknown input backend"):
+        get_input("mouse")
+
+
+def test_scripted_routines():
+    """Test running routines that wait for key presses without a participant."""
+    win = VirtualWindow()
+    responder = get_input("scripted", win=win, seed=1)
+    display_instructions(win, "single", keyboard=responder)
+    assert responder.n_presses >= 5
+
+    acc_tracker = AccuracyTracker(blocksize=10)
+    trigger_kwargs = dict(ser=FakeSerial(), tk=DummyEyeLink(), byte=bytes([1]))
+    kwargs = dict(itrial=9, ntrials=20, blocksize=10, trigger_kwargs=trigger_kwargs)
+    n_presses = responder.n_presses
+    block_counter = display_block_break(
+        win, acc_tracker, block_counter=2, hard_break=2, keyboard=responder, **kwargs
+    )
+    assert block_counter == 3
+    assert responder.n_presses == n_presses + 2
+    assert win.flips[-1]["n_draws"] == 1
+
+
+def test_summarize_latencies():
+    """Test summarizing the latency of event timestamps."""
+    ptb_rts = np.array([0.5, 0.6, 0.7])
+    event_rts = ptb_rts + np.array([0.004, 0.006, 0.008])
+    summary = summarize_latencies(event_rts, ptb_rts)
+    assert summary["n_presses"] == 3
+    assert summary["mean_ms"] == pytest.approx(6)
+    assert summary["sd_ms"] == pytest.approx(2)
+    assert summary["min_ms"] == pytest.approx(4)
+    assert summary["max_ms"] == pytest.approx(8)
+
+
+class FakeKeyPress:
+    """Mimic a key press of psychopy.hardware.keyboard."""
+
+    def __init__(self, name, tDown):
+        """Set the key name and the time relative to the default clock."""
+        self.name = name
+        self.tDown = tDown
+
+
+class FakePtbKeyboard:
+    """Mimic psychopy.hardware.keyboard.Keyboard with queued key presses."""
+
+    def __init__(self, presses):
+        """Take a list of key presses to return."""
+        self.presses = presses
+        self.n_clears = 0
+
+    def clearEvents(self):
+        """Count clearing the queue."""
+        self.n_clears += 1
+
+    def waitKeys(self, maxWait, keyList, waitRelease):
+        """Return the next key press, or an empty list."""
+        return self.presses.pop(0)
+
+    def getKeys(self, keyList, waitRelease):
+        """Return the next key presses."""
+        return self.presses.pop(0)
+
+
+class FakeResetClock:
+    """Mimic a psychopy clock that was last reset at a fixed absolute time."""
+
+    def __init__(self, reset_time):
+        """Take the absolute time of the last reset (as GetSecs)."""
+        self.reset_time = reset_time
+
+    def getLastResetTime(self):
+        """Return the time of the last reset."""
+        return self.reset_time
+
+
+def test_psychtoolbox_keyboard(monkeypatch):
+    """Test response times relative to the clock reset on the prompt flip."""
+    from psychopy import logging
+
+    # as in psychopy, tDown is relative to the default clock, reset at 4000 s,
+    # and the prompt clock was reset 100 s later
+    monkeypatch.setattr(logging, "defaultClock", FakeResetClock(4000.0))
+    prompt_clock = FakeResetClock(4100.0)
+    keyboard = PsychtoolboxKeyboard.__new__(PsychtoolboxKeyboard)
+    press = FakeKeyPress("s", 100.4321)
+    keyboard.kb = FakePtbKeyboard([[press], [press], [press], []])
+    key_rt = keyboard.waitKeys(maxWait=3, timeStamped=prompt_clock)
+    assert key_rt[0][0] == "s"
+    assert key_rt[0][1] == pytest.approx(0.4321)
+    assert keyboard.waitKeys(timeStamped=True) == [("s", pytest.approx(4100.4321))]
+    assert keyboard.waitKeys() == ["s"]
+    assert keyboard.waitKeys(maxWait=3) is None
+    assert keyboard.kb.n_clears == 4
+
+    # polling without blocking
+    keyboard.kb.presses = [[], [press, FakeKeyPress("d", 100.5)]]
+    assert keyboard.getKeys(timeStamped=prompt_clock) == []
+    key_rts = keyboard.getKeys(timeStamped=prompt_clock)
+    assert [key for key, _ in key_rts] == ["s", "d"]
+    np.testing.assert_allclose([rt for _, rt in key_rts], [0.4321, 0.5])
+    keyboard.clearEvents()
+    assert keyboard.kb.n_clears == 5
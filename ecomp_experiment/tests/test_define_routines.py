@@ -0,0 +1,120 @@
+"""Test the routines for the experiment flow that do not need a display."""
+
+import numpy as np
+import pytest
+
+from ecomp_experiment.define_eyetracking import DummyEyeLink, FixationChecker
+from ecomp_experiment.define_input import ScriptedResponder
+from ecomp_experiment.define_routines import display_iti, display_response_window
+from ecomp_experiment.define_settings import KEYLIST_DICT
+from ecomp_experiment.define_stimuli import get_stim_factory
+from ecomp_experiment.define_ttl import FakeSerial
+from ecomp_experiment.define_window import VirtualClock, VirtualWindow
+
+
+class FlipCountingWindow:
+    """Count the flips of a window."""
+
+    def __init__(self):
+        """Start without flips."""
+        self.n_flips = 0
+
+    def callOnFlip(self, func, **kwargs):
+        """Call the function right away."""
+        func(**kwargs)
+
+    def flip(self):
+        """Count a flip."""
+        self.n_flips += 1
+
+
+@pytest.mark.parametrize("fixating", [True, False])
+def test_display_iti(fixating):
+    """Test displaying the inter-trial-interval, optionally gaze-contingent."""
+    fps = 100
+    tk = DummyEyeLink()
+    trigger_kwargs = dict(ser=FakeSerial(), tk=tk, byte=bytes([1]))
+
+    win = FlipCountingWindow()
+    iti_ms = display_iti(win, 500, 500, fps, np.random.default_rng(1), trigger_kwargs)
+    assert win.n_flips == 50
+    assert iti_ms == 500
+
+    # idle tasks are run one per frame, after the flip
+    flips_at_task = []
+    win = FlipCountingWindow()
+    display_iti(
+        win,
+        500,
+        500,
+        fps,
+        np.random.default_rng(1),
+        trigger_kwargs,
+        idle_tasks=[lambda: flips_at_task.append(win.n_flips)] * 2,
+    )
+    assert win.n_flips == 50
+    assert flips_at_task == [1, 2]
+
+    # participant fixates only after 70 frames, or not at all
+    screen_size = (1000, 500)
+    gaze = [(0, 0)] * 70 + [(500, 250)] * 100 if fixating else [(0, 0)] * 100
+    tk.sample_source = iter(gaze).__next__
+    checker = FixationChecker(tk, screen_size, 10, stable_frames=5, budget_s=0.001)
+    win = FlipCountingWindow()
+    iti_ms = display_iti(
+        win,
+        500,
+        500,
+        fps,
+        np.random.default_rng(1),
+        trigger_kwargs,
+        fixation_checker=checker,
+        max_extra_frames=40,
+    )
+    expected_frames = 75 if fixating else 90
+    assert win.n_flips == expected_frames
+    assert iti_ms == expected_frames * 10
+    assert len(checker.poll_durations) == expected_frames
+
+
+@pytest.mark.parametrize("timeout_rate", [0, 1])
+def test_display_response_window(timeout_rate):
+    """Test collecting a response while flipping every frame."""
+    fps = 100
+    win = VirtualWindow(fps=fps)
+    clock = VirtualClock(win)
+    responder = ScriptedResponder(
+        win, rt_median_s=0.3, rt_sigma=0.01, timeout_rate=timeout_rate, seed=1
+    )
+    choice_stims = get_stim_factory(win).get_choice_stims(win, stream="single", state=0)
+    trigger_kwargs = dict(ser=FakeSerial(), tk=DummyEyeLink(), byte=bytes([5]))
+    key_list = KEYLIST_DICT["left"] + KEYLIST_DICT["right"]
+    done = []
+    idle_tasks = [lambda: done.append(1), lambda: done.append(2)]
+
+    key_rt, n_frames = display_response_window(
+        win, choice_stims, responder, key_list, 200, clock, trigger_kwargs, idle_tasks
+    )
+    assert len(win.flips) == n_frames
+    assert all(flip["n_draws"] == 3 for flip in win.flips)
+    assert [name for name, _ in win.flips[0]["callbacks"]] == ["reset", "send_trigger"]
+    assert done == [1, 2]
+    if timeout_rate == 1:
+        assert key_rt is None
+        assert n_frames == 200
+        return
+
+    # the response is collected on the first frame after its response time
+    key, rt = key_rt[0]
+    assert key in key_list
+    assert rt == pytest.approx((n_frames - 1) / fps)
+    assert 0.29 < rt < 0.32
+
+    # a response after the response window is a timeout
+    responder.n_timeouts = 0
+    key_rt, n_frames = display_response_window(
+        win, choice_stims, responder, key_list, 20, clock, trigger_kwargs, fps=fps
+    )
+    assert key_rt is None
+    assert n_frames == 20
+    assert responder.n_timeouts == 1
@@ -0,0 +1,62 @@
+"""Test the stimuli of the experiment."""
+
+import numpy as np
+import pytest
+
+from ecomp_experiment.define_stimuli import (
+    _get_capture_rect,
+    get_composite_fixation_stim,
+    get_fixation_stim,
+)
+
+
+@pytest.mark.parametrize("win_size", [(1920, 1080), (1001, 801), (1920, 1081)])
+def test_get_capture_rect(win_size):
+    """Test that the capture is centered on the window, in whole pixels."""
+    half_width_pix = 13
+    left, top, right, bottom = _get_capture_rect(win_size, half_width_pix)
+
+    # convert to pixels as in psychopy.visual.Window._getFrame
+    x, y = win_size
+    left_pix = int((left / 2 + 0.5) * x)
+    bottom_pix = int((bottom / 2 + 0.5) * y)
+    width_pix = int((right / 2 + 0.5) * x) - left_pix
+    height_pix = int((top / 2 + 0.5) * y) - bottom_pix
+
+    assert (width_pix, height_pix) == tuple(2 * half_width_pix + np.mod(win_size, 2))
+    assert left_pix + width_pix / 2 == x / 2
+    assert bottom_pix + height_pix / 2 == y / 2
+
+
+@pytest.mark.parametrize("win_size", [(300, 200), (301, 201)])
+def test_composite_fixation_stim(win_size):
+    """Test that the composite fixation stimulus looks the same as its parts."""
+    try:
+        from psychopy import monitors, visual
+
+        monitor = monitors.Monitor(name="test", width=30, distance=50)
+        monitor.setSizePix(win_size)
+        win = visual.Window(
+            size=win_size,
+            color=(-1, -1, -1),
+            monitor=monitor,
+            units="deg",
+            winType="pyglet",
+        )
+    except Exception as err:
+        pytest.skip(f"Cannot open a window: {err}")
+
+    try:
+        for part in get_fixation_stim(win):
+            part.draw()
+        parts = np.asarray(win.getMovieFrame(buffer="back"))
+        win.clearBuffer()
+
+        fixation_stim = get_composite_fixation_stim(win)
+        fixation_stim.draw()
+        composite = np.asarray(win.getMovieFrame(buffer="back"))
+    finally:
+        win.close()
+
+    assert (parts != parts[0, 0]).any()
+    np.testing.assert_array_equal(composite, parts)
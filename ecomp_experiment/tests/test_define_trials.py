@@ -1,9 +1,19 @@
 """Test trial definition functions."""
 
+from time import perf_counter
+
 import numpy as np
+import pytest
 
-from ecomp_experiment.define_settings import NSAMPLES
-from ecomp_experiment.define_trials import evaluate_trial_correct, gen_trials
+from ecomp_experiment.define_settings import EXPECTED_FPS, NSAMPLES
+from ecomp_experiment.define_trials import (
+    TrialStaircase,
+    calc_trial_ev_diffs,
+    evaluate_trial_correct,
+    gen_trial_with_ev_diff,
+    gen_trials,
+    get_ev_diff_range,
+)
 
 
 def test_smoke():
@@ -83,3 +93,92 @@ def test_evaluate_trial_correct():
         corrects.append(correct)
     assert True in corrects
     assert False in corrects
+
+
+@pytest.mark.parametrize("stream", ["single", "dual"])
+def test_gen_trial_with_ev_diff(stream):
+    """Test generating trials with a given expected value difference."""
+    rng = np.random.default_rng(1)
+    step, max_ev_diff = get_ev_diff_range(NSAMPLES, stream)
+    ev_diffs = np.arange(0, max_ev_diff + step / 2, step)
+    trials = np.array(
+        [
+            gen_trial_with_ev_diff(rng, NSAMPLES, ev_diff, stream)
+            for ev_diff in np.repeat(ev_diffs, 20)
+        ]
+    )
+    assert trials.shape == (ev_diffs.size * 20, NSAMPLES)
+    assert np.all((np.abs(trials) >= 1) & (np.abs(trials) <= 9))
+    assert np.all((trials < 0).sum(axis=1) == NSAMPLES / 2)
+
+    ev_diffs_single, ev_diffs_dual = calc_trial_ev_diffs(trials)
+    ev_diffs_trials = ev_diffs_single if stream == "single" else ev_diffs_dual
+    np.testing.assert_allclose(ev_diffs_trials, np.repeat(ev_diffs, 20), atol=1e-9)
+
+    # both choices are correct equally often
+    choice = "higher" if stream == "single" else "blue"
+    corrects = [evaluate_trial_correct(trial, choice, stream)[0] for trial in trials]
+    assert 0.4 < np.mean(corrects) < 0.6
+
+    # requested differences are rounded and clipped
+    trial = gen_trial_with_ev_diff(rng, NSAMPLES, max_ev_diff + 1, stream)
+    assert np.isclose(calc_trial_ev_diffs(trial)[stream == "dual"][0], max_ev_diff)
+    trial = gen_trial_with_ev_diff(rng, NSAMPLES, 1.01 * step, stream)
+    assert np.isclose(calc_trial_ev_diffs(trial)[stream == "dual"][0], step)
+
+    # generating a trial takes much less than a frame
+    start = perf_counter()
+    for _ in range(100):
+        gen_trial_with_ev_diff(rng, NSAMPLES, max_ev_diff / 2, stream)
+    assert (perf_counter() - start) / 100 < 1 / EXPECTED_FPS
+
+
+@pytest.mark.parametrize("stream, ev_diff", [("single", 1.0), ("dual", 2.0)])
+def test_gen_trial_with_ev_diff_digits(stream, ev_diff):
+    """Test that digits are as frequent as in gen_trial trials of that difficulty."""
+    rng = np.random.default_rng(1)
+
+    # trials drawn as in gen_trial, with the requested expected value difference
+    colors = np.where(np.arange(NSAMPLES) < NSAMPLES / 2, -1, 1)
+    samples = rng.integers(1, 10, (100000, NSAMPLES)) * colors
+    ev_diffs_single, ev_diffs_dual = calc_trial_ev_diffs(samples)
+    ev_diffs = ev_diffs_single if stream == "single" else ev_diffs_dual
+    accepted = samples[np.isclose(ev_diffs, ev_diff)]
+    assert accepted.shape[0] > 4000
+
+    trials = np.array(
+        [gen_trial_with_ev_diff(rng, NSAMPLES, ev_diff, stream) for _ in range(4000)]
+    )
+    expected = np.bincount(np.abs(accepted).ravel(), minlength=10)[1:] / accepted.size
+    freqs = np.bincount(np.abs(trials).ravel(), minlength=10)[1:] / trials.size
+    np.testing.assert_allclose(freqs, expected, atol=0.01)
+
+
+@pytest.mark.parametrize("stream", ["single", "dual"])
+def test_trial_staircase(stream):
+    """Test that the staircase converges to the target accuracy."""
+    rng = np.random.default_rng(2)
+    staircase = TrialStaircase(NSAMPLES, stream, 0.75, 2.0, 0.05, seed=3)
+    corrects = []
+    for itrial in range(2000):
+        if itrial % 2 == 0:
+            staircase.prepare()
+        trial = staircase.next_trial()
+        ev_diff = calc_trial_ev_diffs(trial)[stream == "dual"][0]
+        assert np.isclose(ev_diff, staircase.ev_diffs[-1], atol=0.1)
+
+        # a participant who is more accurate for larger expected value differences
+        p_correct = 1 - 0.5 * np.exp(-ev_diff)
+        correct = bool(rng.random() < p_correct)
+        corrects.append(correct)
+        staircase.update(correct)
+
+    assert len(staircase.ev_diffs) == 2000
+    assert abs(np.mean(corrects[500:]) - 0.75) < 0.05
+    assert abs(np.median(staircase.ev_diffs[500:]) - np.log(2)) < 0.3
+
+    # timeouts and ambiguous trials do not change the staircase
+    ev_diff = staircase.ev_diff
+    staircase.update("n/a")
+    staircase.update(False, ambiguous=True)
+    assert staircase.ev_diff == ev_diff
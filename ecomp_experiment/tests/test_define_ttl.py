@@ -46,6 +46,7 @@ def test_serials():
     ser.write(some_byte)
     stop = time.perf_counter()
     assert (stop - start) >= ser_waitsecs * 2
+    assert ser.out_waiting == 0
 
     # Close it
     ser.ser.close()
@@ -0,0 +1,113 @@
+"""Test the virtual window."""
+
+import numpy as np
+
+from ecomp_experiment.define_eyetracking import DummyEyeLink
+from ecomp_experiment.define_routines import display_iti, display_trial
+from ecomp_experiment.define_stimuli import StimFactory, get_stim_factory
+from ecomp_experiment.define_ttl import FakeSerial, get_ttl_dict, send_trigger
+from ecomp_experiment.define_window import (
+    VirtualClock,
+    VirtualStim,
+    VirtualStimFactory,
+    VirtualWindow,
+    make_clock,
+    wait,
+)
+from ecomp_experiment.utils import check_framerate
+
+
+def test_virtual_window():
+    """Test the simulated clock and the record of flips."""
+    win = VirtualWindow(fps=100)
+    clock = VirtualClock(win)
+    assert win.getActualFrameRate() == 100
+    assert check_framerate(win, 100) == 100
+    n_flips = len(win.flips)
+    assert win.getTime() == n_flips / 100
+
+    clock.reset()
+    stim = get_stim_factory(win).get_central_text_stim(win, height=1, text="Hello")
+    assert isinstance(stim, VirtualStim)
+    assert stim.text == "Hello"
+    stim.setAutoDraw(True)
+    trigger_kwargs = dict(ser=FakeSerial(), tk=DummyEyeLink(), byte=bytes([1]))
+    win.callOnFlip(send_trigger, **trigger_kwargs)
+    assert win.flip() == (n_flips + 1) / 100
+    win.wait(1)
+    stim.draw()
+    win.flip()
+    stim.setAutoDraw(False)
+    win.flip()
+    np.testing.assert_allclose(clock.getTime(), 1.03)
+
+    flips = win.flips[-3:]
+    assert [flip["n_draws"] for flip in flips] == [1, 2, 0]
+    assert flips[0]["callbacks"] == [("send_trigger", trigger_kwargs)]
+    assert flips[1]["callbacks"] == []
+
+
+def test_virtual_stimuli():
+    """Test that stimulus functions return virtual stimuli."""
+    win = VirtualWindow()
+    stimuli = get_stim_factory(win)
+    assert isinstance(stimuli, VirtualStimFactory)
+    assert stimuli.get_glyph_atlas(win, digit_height=2, choice_height=1) is None
+    assert len(stimuli.get_choice_stims(win, stream="dual", state=0)) == 3
+    assert len(stimuli.get_fixation_stim(win)) == 4
+    assert isinstance(stimuli.get_composite_fixation_stim(win), VirtualStim)
+    digit_stims = stimuli.get_digit_stims(win, height=2)
+    assert digit_stims[-3].text == "3"
+    assert digit_stims[-3].color == (1, -1, -1)
+
+
+def test_window_hooks():
+    """Test that clocks, waits, and stimuli are chosen by the window."""
+    win = VirtualWindow(fps=100)
+    clock = make_clock(win)
+    assert isinstance(clock, VirtualClock)
+    wait(win, 1.5)
+    assert win.getTime() == 1.5
+    assert clock.getTime() == 1.5
+    assert win.flips == []
+
+    # a window without hooks, such as psychopy.visual.Window, gets the defaults
+    from psychopy import core
+
+    plain_win = object()
+    assert isinstance(make_clock(plain_win), core.Clock)
+    assert isinstance(get_stim_factory(plain_win), StimFactory)
+
+
+def test_virtual_trial():
+    """Test that routines run with frame counts and trigger timing intact."""
+    fps = 60
+    win = VirtualWindow(fps=fps)
+    ttl_dict = get_ttl_dict()
+    trigger_kwargs = dict(ser=FakeSerial(), tk=DummyEyeLink(), byte=bytes([1]))
+
+    iti_ms = display_iti(win, 500, 1000, fps, np.random.default_rng(1), trigger_kwargs)
+    n_iti_frames = len(win.flips)
+    assert n_iti_frames == round(iti_ms * fps / 1000)
+    np.testing.assert_allclose(win.getTime(), iti_ms / 1000)
+
+    trial = np.array([1, -2, 3])
+    trigger_kwargs_list = [
+        dict(ser=FakeSerial(), tk=DummyEyeLink(), byte=ttl_dict[f"single_digit_{i}"])
+        for i in trial
+    ]
+    display_trial(
+        win,
+        trial,
+        digit_frames=20,
+        fade_frames=10,
+        digit_stims=get_stim_factory(win).get_digit_stims(win, height=1),
+        trigger_kwargs_list=trigger_kwargs_list,
+    )
+    trial_flips = win.flips[n_iti_frames:]
+    assert len(trial_flips) == 90
+    assert all(flip["n_draws"] == 1 for flip in trial_flips)
+    trigger_frames = [i for i, flip in enumerate(trial_flips) if flip["callbacks"]]
+    assert trigger_frames == [0, 30, 60]
+    bytes_sent = [trial_flips[i]["callbacks"][0][1]["byte"] for i in trigger_frames]
+    assert bytes_sent == [kwargs["byte"] for kwargs in trigger_kwargs_list]
@@ -0,0 +1,91 @@
+"""Test rendering glyphs into a single texture."""
+
+import numpy as np
+import pytest
+from PIL import ImageFont
+
+from ecomp_experiment.define_stimuli import get_stim_factory
+from ecomp_experiment.define_window import VirtualStim, VirtualWindow
+from ecomp_experiment.glyph_atlas import (
+    GlyphAtlas,
+    GlyphStim,
+    load_font,
+    render_glyph_atlas,
+)
+
+
+def get_glyphs():
+    """Get the digits, and the symbols of the choice stimuli in a larger size."""
+    digit_font = ImageFont.load_default(size=40)
+    choice_font = ImageFont.load_default(size=24)
+    glyphs = {("digit", str(digit)): (str(digit), digit_font) for digit in range(1, 10)}
+    glyphs.update({("choice", text): (text, choice_font) for text in "5|↑↓"})
+    return glyphs
+
+
+def test_render_glyph_atlas():
+    """Test that glyphs are rendered into separate cells."""
+    glyphs = get_glyphs()
+    image, cells = render_glyph_atlas(glyphs, max_width=128)
+    assert image.dtype == np.uint8
+    assert list(cells) == list(glyphs)
+    assert image.shape[1] <= 128
+
+    # cells do not overlap, and all pixels of the glyphs are in cells
+    covered = np.zeros(image.shape, dtype=int)
+    for key, cell in cells.items():
+        x0, y0, x1, y1 = cell["box"]
+        assert image[y0:y1, x0:x1].any(), key
+        covered[y0:y1, x0:x1] += 1
+    assert covered.max() == 1
+    assert not image[covered == 0].any()
+
+    # rows are started when the image is full
+    _, cells_one_row = render_glyph_atlas(glyphs, max_width=10000)
+    assert len({cell["box"][1] for cell in cells_one_row.values()}) == 1
+    assert len({cell["box"][1] for cell in cells.values()}) > 1
+
+    # the layout box is the advance width and the line height of the font
+    font = glyphs[("digit", "5")][1]
+    assert cells[("digit", "5")]["size"] == (
+        int(np.ceil(font.getlength("5"))),
+        sum(font.getmetrics()),
+    )
+
+
+def test_glyph_quads():
+    """Test the geometry and texture coordinates of the quads of glyphs."""
+    atlas = GlyphAtlas(None, get_glyphs(), max_width=128)
+    height, width = atlas.image.shape
+    for key, cell in atlas.cells.items():
+        x0, y0, x1, y1 = cell["box"]
+        vertices, tex_coords = atlas.get_quad(key, pos=(100, -50))
+        np.testing.assert_allclose(vertices[2] - vertices[0], [x1 - x0, y1 - y0])
+        np.testing.assert_allclose(
+            vertices.mean(axis=0), np.add((100, -50), cell["offset"])
+        )
+        np.testing.assert_allclose(tex_coords[0], [x0 / width, y1 / height])
+        np.testing.assert_allclose(tex_coords[2], [x1 / width, y0 / height])
+
+    # the layout box of a glyph is anchored at its position
+    key = ("choice", "↑")
+    layout_width, _ = atlas.get_size(key)
+    left = GlyphStim(atlas, key, pos=(10, 0), anchorHoriz="left")
+    right = GlyphStim(atlas, key, pos=(10, 0), anchorHoriz="right")
+    assert left._center == (10 + layout_width / 2, 0)
+    assert right._center == (10 - layout_width / 2, 0)
+    left.setOpacity(0.5)
+    assert left.opacity == 0.5
+    assert atlas.n_uploads == 0
+
+
+def test_glyph_atlas_virtual_window():
+    """Test that there is no atlas for a virtual window, nor a missing font."""
+    win = VirtualWindow(fps=60)
+    stimuli = get_stim_factory(win)
+    assert stimuli.get_glyph_atlas(win, digit_height=3, choice_height=2) is None
+    digit_stims = stimuli.get_digit_stims(win, height=3, atlas=None)
+    assert all(isinstance(stim, VirtualStim) for stim in digit_stims.values())
+
+    with pytest.raises(OSError, match="GLYPH_ATLAS_FONT_FILES"):
+        load_font("NoSuchFont-Regular.ttf", 20)
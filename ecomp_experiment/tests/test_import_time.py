@@ -0,0 +1,85 @@
+"""Test the startup cost of importing the public modules of the package.
+
+Heavy dependencies (psychopy, pandas, ...) must only be imported at the point of use,
+so that analyses that need only parts of the package do not pay for them.
+The import times are measured with ``python -X importtime`` and printed, so
+that they are recorded in the CI logs (pytest is run with ``-s``).
+
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+# Budgets for the total import time of each module in milliseconds.
+# These are generous, because CI machines are slow, but loading psychopy or
+# pandas would exceed them.
+IMPORT_BUDGETS_MS = {
+    "ecomp_experiment.benchmark_keyboard": 750,
+    "ecomp_experiment.bids_export": 750,
+    "ecomp_experiment.cohort": 750,
+    "ecomp_experiment.define_eyetracking": 750,
+    "ecomp_experiment.define_input": 750,
+    "ecomp_experiment.define_routines": 750,
+    "ecomp_experiment.define_settings": 750,
+    "ecomp_experiment.define_stimuli": 750,
+    "ecomp_experiment.define_trials": 750,
+    "ecomp_experiment.define_ttl": 750,
+    "ecomp_experiment.define_window": 750,
+    "ecomp_experiment.glyph_atlas": 750,
+    "ecomp_experiment.main": 750,
+    "ecomp_experiment.parse_asc": 750,
+    "ecomp_experiment.profiling": 750,
+    "ecomp_experiment.resampling": 750,
+    "ecomp_experiment.session_farm": 750,
+    "ecomp_experiment.telemetry": 750,
+    "ecomp_experiment.trial_bank": 750,
+    "ecomp_experiment.utils": 750,
+    "ecomp_experiment.validation": 750,
+    "ecomp_experiment.weighting": 750,
+}
+
+# packages that must not be loaded when importing any of the modules above
+HEAVY_PACKAGES = ["pandas", "psychopy", "pyglet", "pylink", "serial"]
+
+
+def get_import_times(module):
+    """Import a module in a fresh interpreter and get import times.
+
+    Parameters
+    ----------
+    module : str
+        The module to import.
+
+    Returns
+    -------
+    import_times : dict
+        Maps the names of all imported modules to the time in microseconds
+        that it took to import them (excluding their own imports).
+    """
+    cmd = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+    import_times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        import_times[name.strip()] = int(self_us)
+    return import_times
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS_MS)
+def test_import_time(module):
+    """Test that importing a module is cheap and does not load heavy packages."""
+    import_times = get_import_times(module)
+    assert module in import_times
+
+    for name in import_times:
+        package = name.split(".")[0]
+        assert package not in HEAVY_PACKAGES, f"{module} imports {name}"
+
+    total_ms = sum(import_times.values()) / 1000
+    print(f"\n{module}: {total_ms:.1f} ms (budget {IMPORT_BUDGETS_MS[module]} ms)")
+    assert total_ms <= IMPORT_BUDGETS_MS[module]
@@ -0,0 +1,156 @@
+"""Test parsing EyeLink ASC files."""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ecomp_experiment.parse_asc import parse_asc, read_asc_events, read_asc_samples
+
+ASC_HEADER = """** CONVERTED FROM 10191200.edf using edfapi 4.2.1 Apr 17 2020
+** DATE: Tue Oct 19 12:00:00 2021
+** RECORDED BY eComp
+**
+
+MSG\t1000 DISPLAY_COORDS = 0 0 2559 1439
+START\t1001 \tLEFT\tRIGHT\tSAMPLES\tEVENTS
+PRESCALER\t1
+SAMPLES\tGAZE\tLEFT\tRIGHT\tRATE\t1000.00\tTRACKING\tCR\tFILTER\t2
+"""
+
+
+def make_asc(n_samples, start=1002):
+    """Make the lines of an ASC file with binocular samples and some events."""
+    lines = []
+    for i in range(n_samples):
+        time = start + i
+        right = f"100.{i % 10}\t 200.0\t 1000.0"
+        if i % 7 == 3:
+            # blink in left eye
+            lines.append(f"{time}\t   .\t   .\t    0.0\t {right}\t.....")
+        else:
+            lines.append(f"{time}\t 1{i % 10}.5\t 20.5\t 1100.0\t {right}\t.....")
+        if i % 10 == 0:
+            lines.append(f"MSG\t{time} {i % 4 + 1}")
+        if i % 25 == 0:
+            efix = f"{time - 20}\t{time}\t21\t  1280.0\t  720.0\t   1000"
+            lines.append(f"EFIX R   {efix}")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.mark.parametrize("chunksize", [7, 100_000])
+def test_parse_asc(tmpdir, chunksize):
+    """Test parsing samples and events."""
+    tmpdir = Path(tmpdir)
+    asc_fname = tmpdir / "sub-01_stream-single_eyetrack.asc"
+    asc_fname.write_text(ASC_HEADER + make_asc(100) + "END\t1102 \tSAMPLES\tEVENTS\n")
+
+    out_dir = tmpdir / "parsed"
+    progress = parse_asc(asc_fname, out_dir, chunksize=chunksize)
+    assert progress["n_samples"] == 100
+    assert progress["n_columns"] == 6
+    assert progress["asc_offset"] == asc_fname.stat().st_size
+
+    times, samples = read_asc_samples(out_dir)
+    assert isinstance(samples, np.memmap)
+    np.testing.assert_array_equal(times, np.arange(1002, 1102))
+    assert samples.shape == (100, 6)
+    assert np.isnan(samples[3, :2]).all()
+    assert samples[3, 2] == 0
+    np.testing.assert_allclose(samples[:3, 0], [10.5, 11.5, 12.5])
+    np.testing.assert_allclose(samples[:, 4], 200)
+
+    events = read_asc_events(out_dir)
+    msgs = events[events["kind"] == "MSG"]
+    assert msgs.shape[0] == 11
+    assert msgs["time"].iloc[0] == 1000
+    assert msgs["text"].iloc[0] == "DISPLAY_COORDS = 0 0 2559 1439"
+    assert msgs["text"].iloc[1:].tolist() == [str(i % 4 + 1) for i in range(0, 100, 10)]
+
+    efix = events[events["kind"] == "EFIX"]
+    assert efix.shape[0] == 4
+    assert efix["time"].tolist() == [982, 1007, 1032, 1057]
+    assert efix["text"].iloc[0].startswith("R 1002")
+
+    samples_info = events[events["kind"] == "SAMPLES"]
+    assert np.isnan(samples_info["time"]).all()
+    assert events["kind"].iloc[-1] == "END"
+
+
+def test_parse_asc_resume(tmpdir):
+    """Test that parsing continues where it stopped."""
+    tmpdir = Path(tmpdir)
+    asc_fname = tmpdir / "test.asc"
+    full = ASC_HEADER + make_asc(100)
+    asc_fname.write_text(full)
+    parse_asc(asc_fname, tmpdir / "full", chunksize=10)
+
+    # Parse a file that is cut in the middle of a line, e.g., when it is still
+    # being written or copying was interrupted
+    cut = len(ASC_HEADER) + 1000
+    asc_fname.write_text(full[:cut])
+    out_dir = tmpdir / "resumed"
+    progress = parse_asc(asc_fname, out_dir, chunksize=10, complete=False)
+    assert progress["asc_offset"] < cut
+    n_partial = progress["n_samples"]
+    assert 0 < n_partial < 100
+
+    # Simulate a crash after data was written, but before progress was updated
+    with open(out_dir / "samples.dat", "ab") as fout:
+        fout.write(b"garbage")
+
+    # Resume with the complete file
+    asc_fname.write_text(full)
+    progress = parse_asc(asc_fname, out_dir, chunksize=10)
+    assert progress["n_samples"] == 100
+    samples_full = read_asc_samples(tmpdir / "full")
+    for arr_resumed, arr_full in zip(read_asc_samples(out_dir), samples_full):
+        np.testing.assert_array_equal(arr_resumed, arr_full)
+    assert read_asc_events(out_dir).equals(read_asc_events(tmpdir / "full"))
+
+    # Not resuming starts from scratch
+    progress = parse_asc(asc_fname, out_dir, resume=False)
+    with open(out_dir / "progress.json") as fin:
+        assert json.load(fin) == progress
+    assert progress["n_samples"] == 100
+
+
+def test_parse_asc_changed_file(tmpdir):
+    """Test that parsing restarts if the ASC file was replaced."""
+    tmpdir = Path(tmpdir)
+    asc_fname = tmpdir / "test.asc"
+    asc_fname.write_text(ASC_HEADER + make_asc(100, start=5000))
+    out_dir = tmpdir / "parsed"
+    parse_asc(asc_fname, out_dir, chunksize=10)
+
+    # Replace the file with a longer one of the same name, which must not be
+    # parsed from the position reached in the old one
+    asc_fname.write_text(ASC_HEADER + make_asc(150))
+    progress = parse_asc(asc_fname, out_dir, chunksize=10)
+    assert progress["n_samples"] == 150
+    times, _ = read_asc_samples(out_dir)
+    np.testing.assert_array_equal(times, np.arange(1002, 1152))
+
+    # An unchanged file is not parsed again
+    progress_again = parse_asc(asc_fname, out_dir, chunksize=10)
+    assert progress_again == progress
+    assert read_asc_events(out_dir)["kind"].tolist().count("EFIX") == 6
+
+
+def test_parse_asc_no_trailing_newline(tmpdir):
+    """Test that the last line of a complete file is parsed without a newline."""
+    tmpdir = Path(tmpdir)
+    asc_fname = tmpdir / "test.asc"
+    asc_fname.write_text(ASC_HEADER + make_asc(10) + "END\t1012 \tSAMPLES\tEVENTS")
+
+    progress = parse_asc(asc_fname, tmpdir / "partial", complete=False)
+    assert read_asc_events(tmpdir / "partial")["kind"].iloc[-1] != "END"
+    assert progress["asc_offset"] < asc_fname.stat().st_size
+
+    progress = parse_asc(asc_fname, tmpdir / "parsed")
+    assert progress["n_samples"] == 10
+    assert progress["asc_offset"] == asc_fname.stat().st_size
+    events = read_asc_events(tmpdir / "parsed")
+    assert events["kind"].iloc[-1] == "END"
+    assert events["time"].iloc[-1] == 1012
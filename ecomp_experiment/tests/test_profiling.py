@@ -0,0 +1,115 @@
+"""Test profiling the time spent per frame."""
+
+from time import perf_counter, sleep
+
+import numpy as np
+
+from ecomp_experiment.profiling import FRAME_COMPONENTS, FrameProfiler
+
+
+class FakeWindow:
+    """Call functions scheduled with callOnFlip during a flip of fixed duration."""
+
+    def __init__(self, flip_s):
+        """Start without scheduled functions."""
+        self.flip_s = flip_s
+        self.to_call = []
+
+    def callOnFlip(self, function, *args, **kwargs):
+        """Schedule a function for the next flip."""
+        self.to_call.append((function, args, kwargs))
+
+    def flip(self):
+        """Wait, then call the scheduled functions."""
+        sleep(self.flip_s)
+        for function, args, kwargs in self.to_call:
+            function(*args, **kwargs)
+        self.to_call = []
+        return perf_counter()
+
+
+class SlowStim:
+    """A stimulus whose draw calls take a fixed time."""
+
+    def __init__(self, draw_s):
+        """Set the duration of draw calls."""
+        self.draw_s = draw_s
+        self.n_draws = 0
+
+    def draw(self):
+        """Pretend to draw."""
+        sleep(self.draw_s)
+        self.n_draws += 1
+
+
+def test_frame_profiler(tmpdir):
+    """Test recording the time spent in each component of a frame."""
+    fps = 20
+    win = FakeWindow(flip_s=0.01)
+    stim = SlowStim(draw_s=0.01)
+    profiler = FrameProfiler(fps)
+    profiler.attach(win)
+    profiler.attach_stims([stim])
+
+    profiler.phase = "trial"
+    called = []
+    for frame in range(3):
+        win.callOnFlip(lambda byte: called.append(byte) or sleep(0.005), byte=frame)
+        stim.draw()
+        sleep(0.002)
+        win.flip()
+    assert called == [0, 1, 2]
+    assert stim.n_draws == 3
+
+    # waiting for a key press is not counted as logic
+    sleep(0.1)
+    profiler.pause()
+    profiler.phase = "feedback"
+    win.flip()
+    win.flip()
+
+    frames = profiler.get_frames()
+    assert frames["phase"].tolist() == ["trial"] * 3 + ["feedback"] * 2
+    # sleeping takes at least as long as requested, but may take longer
+    assert np.isnan(frames["logic"][[0, 3]]).all()
+    assert (frames["logic"][[1, 2]] >= 0.002).all()
+    assert (frames["logic"][[1, 2, 4]] < 0.05).all()
+    assert (frames["draw"][:3] >= 0.01).all()
+    assert (frames["draw"][3:] == 0).all()
+    assert (frames["callback"][:3] >= 0.005).all()
+    assert (frames["callback"][3:] == 0).all()
+    assert (frames["flip"] >= 0.01 - 1e-6).all()
+    assert (frames["draw"] + frames["callback"] + frames["flip"] < 0.1).all()
+    assert (frames["budget_use"][:3] > 0.3).all()
+    assert frames["budget_use"][3] == 0
+
+    histograms, bins = profiler.get_histograms()
+    assert list(histograms) == ["trial", "feedback"]
+    assert histograms["trial"].sum() == 3
+    assert histograms["feedback"][0] == 2
+    assert len(bins) == len(histograms["trial"]) + 1
+
+    summary = profiler.summary().splitlines()
+    assert len(summary) == 3
+    assert summary[1].startswith("trial\t3\t")
+    assert summary[1].endswith("draw")
+
+    fname = tmpdir / "frameprofile.tsv"
+    profiler.save(fname)
+    lines = fname.read_text(encoding="utf-8").splitlines()
+    assert lines[0].split("\t")[1:-1] == [f"{comp}_ms" for comp in FRAME_COMPONENTS]
+    assert len(lines) == 6
+    assert lines[1].split("\t")[1] == "n/a"
+
+
+def test_frame_profiler_disabled():
+    """Test that a disabled profiler does not change the window and stimuli."""
+    win = FakeWindow(flip_s=0)
+    stim = SlowStim(draw_s=0)
+    profiler = FrameProfiler(60, enabled=False)
+    profiler.attach(win)
+    profiler.attach_stims([stim])
+    assert "flip" not in vars(win)
+    assert "draw" not in vars(stim)
+    win.flip()
+    assert profiler.get_frames()["phase"].size == 0
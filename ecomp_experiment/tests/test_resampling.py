@@ -0,0 +1,120 @@
+"""Test comparing measures between streams by resampling."""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecomp_experiment.define_settings import NSAMPLES
+from ecomp_experiment.define_trials import gen_trials
+from ecomp_experiment.resampling import (
+    bootstrap_ci,
+    compare_streams,
+    get_paired_measures,
+    permutation_test,
+)
+
+
+def make_cohort(n_subjects, ntrials, seed):
+    """Make a cohort table with random choices and response times."""
+    rng = np.random.default_rng(seed)
+    dfs = []
+    for isub, stream in itertools.product(range(n_subjects), ["single", "dual"]):
+        choices = ["lower", "higher"] if stream == "single" else ["red", "blue"]
+        df = pd.DataFrame(
+            gen_trials(ntrials, NSAMPLES, seed=rng.integers(2**32)).astype(int),
+            columns=[f"sample{i + 1}" for i in range(NSAMPLES)],
+        )
+        df["subject"] = f"{isub + 1:02}"
+        df["stream"] = stream
+        df["choice"] = rng.choice(choices, ntrials)
+        df["correct"] = pd.array(rng.random(ntrials) < 0.7, dtype="boolean")
+        df["rt"] = rng.lognormal(
+            np.log(0.6 if stream == "single" else 0.8), 0.3, ntrials
+        )
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def test_get_paired_measures():
+    """Test getting the values of each participant in each stream."""
+    df = pd.DataFrame(
+        dict(
+            subject=["01", "01", "01", "01", "02", "03", "03"],
+            stream=["single", "single", "dual", "dual", "single", "single", "dual"],
+            correct=pd.array([True, None, True, True, True, False, True], "boolean"),
+            rt=[0.5, np.nan, 0.7, 0.9, 0.4, 0.6, 0.3],
+        )
+    )
+    subjects, names, single, dual = get_paired_measures(df, "accuracy")
+    np.testing.assert_array_equal(subjects, ["01", "03"])
+    assert names == ["accuracy"]
+    np.testing.assert_allclose(single, [[0.5], [0]])
+    np.testing.assert_allclose(dual, [[1], [1]])
+
+    subjects, names, single, dual = get_paired_measures(df, "rt")
+    np.testing.assert_allclose(single, [[0.5], [0.6]])
+    np.testing.assert_allclose(dual, [[0.8], [0.3]])
+
+    with pytest.raises(ValueError, match="Unknown measure"):
+        get_paired_measures(df, "bonus")
+
+
+def test_bootstrap_ci():
+    """Test bootstrap confidence intervals, independent of the number of jobs."""
+    rng = np.random.default_rng(1)
+    diffs = rng.normal([0, 1], 1, size=(40, 2))
+    ci_low, ci_high = bootstrap_ci(diffs, n_resamples=2500, block_size=500, seed=2)
+    assert np.all(ci_low < diffs.mean(axis=0))
+    assert np.all(ci_high > diffs.mean(axis=0))
+    sem = diffs.std(axis=0, ddof=1) / np.sqrt(40)
+    np.testing.assert_allclose(ci_high - ci_low, 2 * 1.96 * sem, rtol=0.2)
+    assert ci_low[0] < 0 < ci_high[0]
+    assert ci_low[1] > 0
+
+    ci_parallel = bootstrap_ci(
+        diffs, n_resamples=2500, block_size=500, n_jobs=2, seed=2
+    )
+    np.testing.assert_array_equal(ci_parallel, (ci_low, ci_high))
+
+
+def test_permutation_test():
+    """Test sign-flip permutation tests."""
+    rng = np.random.default_rng(1)
+    diffs = np.stack([rng.normal(0, 1, 30), rng.normal(2, 1, 30)], axis=1)
+    p_values = permutation_test(diffs, n_resamples=2000, block_size=300, seed=3)
+    assert p_values[0] > 0.05
+    assert p_values[1] == 1 / 2001
+
+    # with few participants, the p-value approaches the exact one
+    diffs = np.array([[1.0], [2.0], [-0.5], [3.0], [1.5]])
+    signs = np.array(list(itertools.product([-1, 1], repeat=5)))
+    exact = np.mean(np.abs(signs @ diffs[:, 0]) >= np.abs(diffs.sum()))
+    p_values = permutation_test(diffs, n_resamples=20000, seed=4)
+    np.testing.assert_allclose(p_values, exact, atol=0.01)
+
+    p_parallel = permutation_test(diffs, n_resamples=20000, n_jobs=2, seed=4)
+    np.testing.assert_array_equal(p_parallel, p_values)
+
+
+def test_compare_streams():
+    """Test comparing all measures between streams in a cohort table."""
+    df = make_cohort(8, 100, seed=1)
+    stats = compare_streams(df, n_resamples=1000, seed=5)
+    assert (
+        stats["measure"].tolist()
+        == ["accuracy", "rt"] + ["position"] * 10 + ["value"] * 9
+    )
+    assert stats["n_subjects"].eq(8).all()
+    assert np.all(stats["ci_low"] <= stats["diff"])
+    assert np.all(stats["diff"] <= stats["ci_high"])
+    assert np.all((stats["p_value"] > 0) & (stats["p_value"] <= 1))
+
+    # response times are longer in the dual stream
+    rt = stats[stats["measure"] == "rt"].iloc[0]
+    assert rt["ci_low"] > 0.1
+    assert rt["p_value"] < 0.01
+
+    stats_again = compare_streams(df, measures=["rt"], n_resamples=1000, seed=5)
+    np.testing.assert_array_equal(stats_again["ci_low"], [rt["ci_low"]])
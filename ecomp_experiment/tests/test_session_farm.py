@@ -0,0 +1,89 @@
+"""Test running simulated sessions without a display."""
+
+import functools
+
+import numpy as np
+
+from ecomp_experiment.cohort import load_cohort
+from ecomp_experiment.define_eyetracking import SimulatedGaze
+from ecomp_experiment.define_settings import (
+    BLOCKSIZE,
+    MAX_ITI_EXTENSION_MS,
+    MAX_ITI_MS,
+    MIN_ITI_MS,
+    NSAMPLES,
+    STAIRCASE_START_EV_DIFF,
+)
+from ecomp_experiment.define_trials import calc_trial_ev_diffs
+from ecomp_experiment.session_farm import run_farm, run_virtual_session, summarize_farm
+
+
+def test_run_farm(tmpdir):
+    """Test running complete sessions, including block breaks, in parallel."""
+    ntrials = 2 * BLOCKSIZE
+    results, data_dir = run_farm(
+        2, n_jobs=2, data_dir=tmpdir / "experiment_data", ntrials=ntrials, seed=1
+    )
+    assert [(result["subject"], result["stream"]) for result in results] == [
+        ("01", "single"),
+        ("01", "dual"),
+        ("02", "single"),
+        ("02", "dual"),
+    ]
+    for result in results:
+        assert result["error"] is None
+        assert result["n_trials"] == ntrials
+        assert result["n_flips"] > 0
+        assert result["simulated_s"] > 10 * result["duration_s"]
+
+    df = load_cohort(data_dir)
+    assert df.shape[0] == 4 * ntrials
+    np.testing.assert_array_equal(df["trial"][:ntrials], np.arange(ntrials))
+    assert (df["experiment_version"].notna()).all()
+
+    # same trials over conditions, but different responses
+    single = df[(df["subject"] == "01") & (df["stream"] == "single")]
+    dual = df[(df["subject"] == "01") & (df["stream"] == "dual")]
+    np.testing.assert_array_equal(single["sample1"], dual["sample1"])
+    assert not np.array_equal(single["rt"], dual["rt"])
+
+    # sessions that fail are reported
+    result = run_virtual_session(data_dir, "01", "single", ntrials=ntrials)
+    assert "FileExistsError" in result["error"]
+    summary = summarize_farm(results + [result], wall_s=1)
+    assert summary.startswith("Sessions: 5 (1 failed)\n")
+    assert "sub-01 single failed:" in summary
+
+
+def test_run_virtual_session_adaptive(tmpdir, monkeypatch):
+    """Test a session with trials generated by a staircase."""
+    monkeypatch.setattr("ecomp_experiment.main.ADAPTIVE_DIFFICULTY", True)
+    ntrials = BLOCKSIZE + 1
+    result = run_virtual_session(tmpdir, "01", "dual", seed=1, ntrials=ntrials)
+    assert result["error"] is None
+    assert result["n_trials"] == ntrials
+
+    df = load_cohort(tmpdir)
+    samples = df[[f"sample{i + 1}" for i in range(NSAMPLES)]].to_numpy()
+    _, ev_diffs_dual = calc_trial_ev_diffs(samples)
+    assert ev_diffs_dual[0] == STAIRCASE_START_EV_DIFF
+    assert not df["ambiguous"].any()
+
+
+def test_run_virtual_session_gaze_contingent(tmpdir, monkeypatch):
+    """Test a session with inter-trial-intervals extended by simulated gaze."""
+    monkeypatch.setattr("ecomp_experiment.session_farm.GAZE_CONTINGENT_ITI", True)
+    # look away often, so that some inter-trial-intervals are extended
+    monkeypatch.setattr(
+        "ecomp_experiment.define_eyetracking.SimulatedGaze",
+        functools.partial(SimulatedGaze, lapse_rate=5),
+    )
+    ntrials = BLOCKSIZE + 1
+    result = run_virtual_session(tmpdir, "01", "single", seed=1, ntrials=ntrials)
+    assert result["error"] is None
+    assert result["n_trials"] == ntrials
+
+    df = load_cohort(tmpdir)
+    assert (df["iti"] >= MIN_ITI_MS).all()
+    assert (df["iti"] > MAX_ITI_MS).any()
+    assert (df["iti"] <= MAX_ITI_MS + MAX_ITI_EXTENSION_MS + 1).all()
@@ -0,0 +1,193 @@
+"""Test publishing trial records while the experiment is running."""
+
+import json
+import os
+import socket
+
+import numpy as np
+import pytest
+
+from ecomp_experiment.define_eyetracking import DummyEyeLink
+from ecomp_experiment.define_input import ScriptedResponder
+from ecomp_experiment.define_settings import BLOCKSIZE, EXPECTED_FPS
+from ecomp_experiment.define_ttl import FakeSerial, MySerial
+from ecomp_experiment.define_window import VirtualWindow
+from ecomp_experiment.main import run_session
+from ecomp_experiment.telemetry import RollingStats, TelemetryPublisher, parse_address
+
+
+def read_records(fin, n_records):
+    """Read JSON line records from a socket file."""
+    return [json.loads(fin.readline()) for _ in range(n_records)]
+
+
+def get_free_port():
+    """Get a TCP port on localhost that is not in use."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_client_socket(address):
+    """Get an unconnected client socket for a TCP or Unix socket address."""
+    _, port = parse_address(address)
+    family = socket.AF_INET if port is not None else socket.AF_UNIX
+    return socket.socket(family, socket.SOCK_STREAM)
+
+
+def get_connect_address(address):
+    """Get the address to connect a client socket to."""
+    host_or_path, port = parse_address(address)
+    return host_or_path if port is None else (host_or_path, port)
+
+
+@pytest.fixture(params=["tcp", "unix"])
+def address(request, tmp_path):
+    """Get a TCP address, or a Unix socket address where available."""
+    if request.param == "tcp":
+        return f"127.0.0.1:{get_free_port()}"
+    if not hasattr(socket, "AF_UNIX"):
+        pytest.skip("Unix sockets are not available on this platform.")
+    return str(tmp_path / "telemetry.sock")
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("127.0.0.1:8765", ("127.0.0.1", 8765)),
+        ("localhost:0", ("localhost", 0)),
+        ("/tmp/ecomp.sock", ("/tmp/ecomp.sock", None)),
+        ("ecomp.sock", ("ecomp.sock", None)),
+        ("/tmp/a:1", ("/tmp/a:1", None)),
+        ("C:\\ecomp:1", ("C:\\ecomp:1", None)),
+    ],
+)
+def test_parse_address(address, expected):
+    """Test parsing TCP and Unix socket addresses."""
+    assert parse_address(address) == expected
+
+
+def test_publisher_disabled():
+    """Test that a publisher without address does nothing."""
+    telemetry = TelemetryPublisher(None)
+    assert not telemetry.enabled
+    telemetry.publish(dict(trial=0))
+    assert telemetry.n_published == 0
+    telemetry.close()
+
+
+def test_publisher(address):
+    """Test publishing records on a TCP or Unix socket."""
+    telemetry = TelemetryPublisher(address, history=2)
+    assert telemetry.enabled
+
+    # nobody is listening, but publishing does not block
+    for itrial in range(3):
+        telemetry.publish(dict(trial=np.int64(itrial), correct=np.bool_(True)))
+    assert telemetry.n_published == 3
+
+    # a new client gets the most recent records, then new ones
+    with get_client_socket(address) as sock:
+        sock.connect(get_connect_address(address))
+        with sock.makefile("r") as fin:
+            records = read_records(fin, 2)
+            telemetry.publish(dict(trial=3, correct=False))
+            records += read_records(fin, 1)
+        assert [record["trial"] for record in records] == [1, 2, 3]
+        assert records[0]["correct"] is True
+        assert records[-1]["correct"] is False
+
+    with pytest.raises(TypeError, match="not JSON serializable"):
+        telemetry.publish(dict(trial=object()))
+    telemetry.close()
+    host_or_path, port = parse_address(address)
+    if port is None:
+        assert not os.path.exists(host_or_path)
+
+    # a TCP address that is in use cannot be served on
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        host, port = sock.getsockname()
+        with pytest.raises(OSError):
+            TelemetryPublisher(f"{host}:{port}")
+
+
+def test_publisher_slow_client(address):
+    """Test that records are dropped for clients that do not keep up."""
+    telemetry = TelemetryPublisher(address, max_queue=5)
+    with get_client_socket(address) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+        sock.connect(get_connect_address(address))
+        telemetry.publish(dict(trial=0))
+        with sock.makefile("r") as fin:
+            read_records(fin, 1)
+
+        # the client stops reading, so its queue fills up
+        for itrial in range(1, 2000):
+            telemetry.publish(dict(trial=itrial, padding="x" * 1000))
+        telemetry.close(timeout=0.1)
+    assert telemetry.n_dropped > 0
+
+
+def test_publisher_no_unix_sockets(tmp_path, monkeypatch):
+    """Test that Unix socket addresses fail clearly without Unix sockets."""
+    monkeypatch.delattr(socket, "AF_UNIX", raising=False)
+    with pytest.raises(ValueError, match="Unix sockets are not available"):
+        TelemetryPublisher(str(tmp_path / "telemetry.sock"))
+
+
+def test_rolling_stats():
+    """Test summarizing the most recent trials."""
+    stats = RollingStats(window=3)
+    records = [
+        dict(trial=0, correct=False, rt=0.5, dropped_frames=2, trigger_queue=0),
+        dict(trial=1, correct=True, rt=0.4, dropped_frames=0, trigger_queue=3),
+        dict(trial=2, correct="n/a", rt="n/a", dropped_frames=0, trigger_queue=0),
+        dict(trial=3, correct=True, rt=0.6, dropped_frames=1, trigger_queue=1),
+    ]
+    for record in records:
+        stats.update(record)
+    assert stats.n_trials == 4
+    assert stats.format() == (
+        "trial 4: accuracy 67%, median RT 500 ms, timeouts 1 (last 3 trials) | "
+        "dropped frames 3, max trigger queue 3"
+    )
+
+
+def test_run_session_telemetry(tmp_path):
+    """Test that a session publishes a record per trial."""
+    port = get_free_port()
+    telemetry = TelemetryPublisher(f"127.0.0.1:{port}")
+    ntrials = BLOCKSIZE + 1
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        win = VirtualWindow(fps=EXPECTED_FPS)
+        logfile = run_session(
+            win,
+            EXPECTED_FPS,
+            ScriptedResponder(win=win, seed=1),
+            DummyEyeLink(),
+            MySerial(FakeSerial(), waitsecs=0),
+            "experiment",
+            tmp_path,
+            "single",
+            "01",
+            ntrials=ntrials,
+            telemetry=telemetry,
+        )
+        with sock.makefile("r") as fin:
+            records = read_records(fin, ntrials)
+    telemetry.close()
+
+    assert win.recordFrameIntervals
+    assert [record["trial"] for record in records] == list(range(ntrials))
+    with open(logfile, "r") as fin:
+        header = fin.readline().rstrip("\n").split("\t")
+        rows = [dict(zip(header, line.rstrip("\n").split("\t"))) for line in fin]
+    for record, row in zip(records, rows):
+        assert record["stream"] == "single"
+        assert record["choice"] == row["choice"]
+        assert str(record["correct"]) == row["correct"]
+        assert record["dropped_frames"] == 0
+        assert record["trigger_queue"] == 0
+        assert (record["rt"] == "n/a") == (row["rt"] == "n/a")
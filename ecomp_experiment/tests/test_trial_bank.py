@@ -0,0 +1,173 @@
+"""Test the indexed bank of pre-generated trials."""
+
+import numpy as np
+import pytest
+
+from ecomp_experiment.define_settings import NSAMPLES
+from ecomp_experiment.define_trials import (
+    calc_trial_difficulty_diffs,
+    calc_trial_ev_diffs,
+    evaluate_trial_correct,
+)
+from ecomp_experiment.trial_bank import TrialBank, pack_trials
+
+
+@pytest.fixture(scope="module")
+def bank():
+    """Generate a small trial bank."""
+    return TrialBank.generate(20000, seed=1, chunk_size=7000)
+
+
+def test_generate(bank):
+    """Test that generated trials follow the rules and have correct keys."""
+    assert len(bank) == 20000
+    assert bank.trials.dtype == np.int8
+    assert bank.trials.shape == (20000, NSAMPLES)
+    assert np.all((np.abs(bank.trials) >= 1) & (np.abs(bank.trials) <= 9))
+    assert np.all((bank.trials < 0).sum(axis=1) == NSAMPLES / 2)
+
+    ev_diffs_single, ev_diffs_dual = calc_trial_ev_diffs(bank.trials)
+    ids = np.arange(len(bank))
+    np.testing.assert_allclose(bank.get_ev_diffs(ids)[0], ev_diffs_single)
+    np.testing.assert_allclose(bank.get_ev_diffs(ids)[1], ev_diffs_dual)
+    np.testing.assert_allclose(
+        bank.keys["gap"] * bank.units["gap"],
+        calc_trial_difficulty_diffs(bank.trials),
+        atol=1e-9,
+    )
+
+    for itrial, trial in enumerate(bank.trials[:500]):
+        ambiguous_single = evaluate_trial_correct(trial, "lower", "single")[1]
+        ambiguous_dual = evaluate_trial_correct(trial, "red", "dual")[1]
+        assert bank.keys["ambiguous_single"][itrial] == ambiguous_single
+        assert bank.keys["ambiguous_dual"][itrial] == ambiguous_dual
+        assert bank.keys["ambiguous"][itrial] == (ambiguous_single or ambiguous_dual)
+
+    np.testing.assert_array_equal(
+        bank.trials, TrialBank.generate(20000, seed=1, chunk_size=7000).trials
+    )
+
+
+@pytest.mark.parametrize(
+    "conditions",
+    [
+        dict(dual=(0.5, 1.0), ambiguous=False),
+        dict(single=(0.25, 0.75), gap=(0, 0.3)),
+        dict(single=(0, 0)),
+        dict(ambiguous=True),
+        dict(single=(0.5, 1.0), ambiguous_dual=False),
+        dict(ambiguous_single=True, ambiguous_dual=False),
+        dict(dual=(7.5, 8)),
+        dict(),
+    ],
+)
+def test_query(bank, conditions):
+    """Test that queries find exactly the matching trials."""
+    ev_diffs_single, ev_diffs_dual = calc_trial_ev_diffs(bank.trials)
+    matches = np.ones(len(bank), dtype=bool)
+    values = dict(
+        single=ev_diffs_single,
+        dual=ev_diffs_dual,
+        gap=np.abs(ev_diffs_single - ev_diffs_dual),
+    )
+    ambiguous = dict(
+        ambiguous_single=ev_diffs_single == 0,
+        ambiguous_dual=ev_diffs_dual == 0,
+        ambiguous=(ev_diffs_single == 0) | (ev_diffs_dual == 0),
+    )
+    for key, value in conditions.items():
+        if key in ambiguous:
+            matches &= ambiguous[key] == value
+        else:
+            low, high = value
+            matches &= (values[key] >= low - 1e-9) & (values[key] <= high + 1e-9)
+
+    ids = bank.query(len(bank), **conditions)
+    np.testing.assert_array_equal(np.sort(ids), np.flatnonzero(matches))
+
+    # a limited number of trials, reproducible with a seeded generator, and
+    # different ones for each query otherwise
+    n_matches = matches.sum()
+    n_trials = min(10, n_matches)
+    ids = bank.query(n_trials, rng=np.random.default_rng(1), **conditions)
+    assert ids.size == n_trials
+    assert matches[ids].all()
+    np.testing.assert_array_equal(
+        ids, bank.query(n_trials, rng=np.random.default_rng(1), **conditions)
+    )
+    ids_random = bank.query(n_trials, **conditions)
+    assert matches[ids_random].all()
+    if n_matches > 100:
+        assert not np.array_equal(ids, ids_random)
+        assert not np.array_equal(ids_random, bank.query(n_trials, **conditions))
+
+
+@pytest.mark.parametrize("rng", [None, np.random.default_rng(2)])
+@pytest.mark.parametrize("n_trials", [200, 3000])
+def test_query_unbiased(bank, rng, n_trials):
+    """Test that found trials are spread over the matching EV differences."""
+    conditions = dict(dual=(0.5, 1.0), ambiguous_single=False)
+    all_ids = bank.query(len(bank), **conditions)
+    ids = bank.query(n_trials, rng=rng, **conditions)
+    assert ids.size == n_trials
+
+    # the proportion of each EV difference is as among all matching trials
+    ev_diffs_dual = bank.get_ev_diffs(all_ids)[1]
+    ev_diffs_found = bank.get_ev_diffs(ids)[1]
+    for ev_diff in np.unique(ev_diffs_dual):
+        expected = np.mean(ev_diffs_dual == ev_diff)
+        found = np.mean(ev_diffs_found == ev_diff)
+        assert abs(found - expected) < 4 * np.sqrt(expected / n_trials)
+
+
+def test_query_few_matches(bank):
+    """Test finding trials when a random sample of candidates has too few matches."""
+    conditions = dict(gap=(0, 0.2), dual=(1.0, 2.0))
+    all_ids = bank.query(len(bank), **conditions)
+    assert all_ids.size < 1000
+    ids = bank.query(all_ids.size - 50, rng=np.random.default_rng(1), **conditions)
+    assert ids.size == all_ids.size - 50
+    assert np.unique(ids).size == ids.size
+    assert np.isin(ids, all_ids).all()
+
+
+def test_query_exclude(bank):
+    """Test excluding trials that were seen before."""
+    conditions = dict(dual=(1, 1.4), ambiguous_single=False)
+    all_ids = bank.query(len(bank), **conditions)
+    seen = bank.trials[all_ids[:50]]
+    ids = bank.query(len(bank), exclude=seen, **conditions)
+    assert ids.size == all_ids.size - 50
+    assert not np.isin(pack_trials(bank.trials[ids]), pack_trials(seen)).any()
+
+    # no matches
+    assert bank.query(10, dual=(9, 10)).size == 0
+    assert bank.query(10, single=(0.1, 0.1), gap=(0, 0)).size == 0
+
+
+def test_pack_trials():
+    """Test that packed trials are equal only for equal trials."""
+    trials = np.array([[-9] * 10, [9] * 10, [1, -1] * 5, [-1, 1] * 5])
+    packed = pack_trials(trials)
+    assert np.unique(packed).size == 4
+    assert pack_trials(trials[2])[0] == packed[2]
+
+
+def test_save_load(bank, tmp_path):
+    """Test saving and loading a trial bank with its indexes."""
+    fname = tmp_path / "trial_bank.npz"
+    bank.save(fname)
+    loaded = TrialBank.load(fname)
+    np.testing.assert_array_equal(loaded.trials, bank.trials)
+    for key, order in bank.orders.items():
+        np.testing.assert_array_equal(loaded.orders[key], order)
+    np.testing.assert_array_equal(
+        loaded.query(20, dual=(0.5, 1.0), rng=np.random.default_rng(1)),
+        bank.query(20, dual=(0.5, 1.0), rng=np.random.default_rng(1)),
+    )
+
+    # banks saved before an index was added get it calculated on load
+    np.savez(fname, trials=bank.trials, order_single=bank.orders["single"])
+    loaded = TrialBank.load(fname)
+    for key, order in bank.orders.items():
+        np.testing.assert_array_equal(loaded.orders[key], order)
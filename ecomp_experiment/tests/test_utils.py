@@ -1,5 +1,7 @@
 """Test utility functions."""
 import itertools
+import os
+import zipfile
 from pathlib import Path
 
 import numpy as np
@@ -8,13 +10,80 @@ import pytest
 
 from ecomp_experiment.define_settings import KEYLIST_DICT
 from ecomp_experiment.utils import (
+    AccuracyTracker,
+    BehSidecar,
+    TrialLogger,
     calc_accuracy,
     calc_bonus,
+    check_framerate,
     map_key_to_choice,
+    measure_refresh_rate,
+    read_beh_sidecar,
     save_dict,
 )
 
 
+class FakeFlipWindow:
+    """Return simulated flip times with a refresh rate, jitter, and dropped frames."""
+
+    def __init__(self, fps, jitter_s=0.0001, p_drop=0, seed=1):
+        """Initialize the window."""
+        self.fps = fps
+        self.jitter_s = jitter_s
+        self.p_drop = p_drop
+        self.rng = np.random.default_rng(seed)
+        self.n_flips = 0
+        self.n_frames = 0
+        self.closed = False
+
+    def flip(self):
+        """Return the time of the next flip."""
+        self.n_flips += 1
+        self.n_frames += 2 if self.rng.random() < self.p_drop else 1
+        jitter = self.rng.normal(0, self.jitter_s)
+        return self.n_frames / self.fps + jitter
+
+    def close(self):
+        """Close the window."""
+        self.closed = True
+
+
+@pytest.mark.parametrize(
+    "fps, expected_fps, verified",
+    [(144, 144, True), (143.8, 144, True), (60, 144, False), (143, 144, False)],
+)
+@pytest.mark.parametrize("p_drop", [0, 0.1])
+def test_measure_refresh_rate(fps, expected_fps, verified, p_drop):
+    """Test measuring the refresh rate until confident."""
+    win = FakeFlipWindow(fps, p_drop=p_drop)
+    fps_measured, is_verified = measure_refresh_rate(win, expected_fps)
+    assert is_verified == verified
+    assert np.abs(fps_measured - fps) < 0.5
+    # stops early
+    assert win.n_flips < 100
+
+
+def test_check_framerate(tmpdir):
+    """Test checking the framerate and caching it per monitor."""
+    cache_fname = Path(tmpdir) / "cache" / "refresh_rates.json"
+    win = FakeFlipWindow(144)
+    fps = check_framerate(win, 144, monitor_name="benq", cache_fname=cache_fname)
+    assert fps == 144
+    assert cache_fname.exists()
+
+    # re-validation with a cached refresh rate measures at most 60 frames
+    win = FakeFlipWindow(144, seed=2)
+    fps = check_framerate(win, 144, monitor_name="benq", cache_fname=cache_fname)
+    assert fps == 144
+    assert win.n_flips <= 61
+
+    # a wrong refresh rate is not accepted, also with cache
+    win = FakeFlipWindow(60)
+    with pytest.raises(ValueError, match="expecting 144 fps"):
+        check_framerate(win, 144, monitor_name="benq", cache_fname=cache_fname)
+    assert win.closed
+
+
 @pytest.mark.parametrize(
     "keys", list(itertools.product(KEYLIST_DICT["left"], KEYLIST_DICT["right"]))
 )
@@ -62,6 +131,135 @@ def test_save_dict(tmpdir):
     np.testing.assert_array_equal(df["c"].to_numpy(), [33, 22])
 
 
+@pytest.mark.parametrize("flush_policy", ["trial", "block", "break"])
+def test_trial_logger(tmpdir, flush_policy):
+    """Test writing trial data with a persistent logger."""
+    fname = Path(tmpdir) / "try.tsv"
+    savedict = dict(a=55, b=22, c=33)
+    logger = TrialLogger(fname, flush_policy=flush_policy, fsync=True)
+    logger.write(savedict)
+    if flush_policy == "trial":
+        # line buffered, so the row is already in the file
+        assert len(fname.read_text().splitlines()) == 2
+
+    savedict.update(a=44, b=33, c=22)
+    logger.write(savedict)
+    logger.end_block(hard_break=True)
+    assert len(fname.read_text().splitlines()) == 3
+    logger.close()
+    logger.close()  # closing twice is fine
+
+    # appending to existing files does not write the header again
+    with TrialLogger(fname, flush_policy=flush_policy) as logger:
+        logger.write(savedict)
+
+    df = pd.read_csv(fname, sep="\t")
+    assert df.columns.to_list() == ["a", "b", "c"]
+    np.testing.assert_array_equal(df["a"].to_numpy(), [55, 44, 44])
+
+    # same output as save_dict
+    fname_save_dict = Path(tmpdir) / "try_save_dict.tsv"
+    for row in df.to_dict(orient="records"):
+        save_dict(fname_save_dict, row)
+    assert fname_save_dict.read_text() == fname.read_text()
+
+    with pytest.raises(ValueError, match="Unknown flush_policy"):
+        TrialLogger(fname, flush_policy="never")
+
+
+@pytest.mark.parametrize("flush_policy", ["trial", "block", "break"])
+def test_trial_logger_flush_pending(tmpdir, monkeypatch, flush_policy):
+    """Test that pending flushes follow the flush policy, with one fsync per row."""
+    fsyncs = []
+    monkeypatch.setattr(os, "fsync", fsyncs.append)
+    fname = Path(tmpdir) / "try.tsv"
+    logger = TrialLogger(fname, flush_policy=flush_policy, fsync=True)
+    for itrial in range(3):
+        logger.write(dict(trial=itrial))
+        for frame in range(5):
+            logger.flush_pending()
+    n_fsyncs = 3 if flush_policy == "trial" else 0
+    assert len(fsyncs) == n_fsyncs
+
+    # without idle frames, the row is fsynced before the next one is written
+    logger.write(dict(trial=3))
+    logger.write(dict(trial=4))
+    assert len(fsyncs) == n_fsyncs + (1 if flush_policy == "trial" else 0)
+
+    # a "block" logger is flushed at the end of each block, but not per trial
+    logger.end_block()
+    assert len(fsyncs) == {"trial": 4, "block": 1, "break": 0}[flush_policy]
+    logger.flush_pending()
+    assert len(fsyncs) == {"trial": 5, "block": 1, "break": 0}[flush_policy]
+    logger.close()
+    assert len(fname.read_text().splitlines()) == 6
+
+
+@pytest.mark.parametrize("stream", ["single", "dual"])
+def test_beh_sidecar(tmpdir, stream):
+    """Test writing a typed sidecar next to the logfile."""
+    test_data = Path(__file__).parent.resolve() / "data"
+    df = pd.read_csv(test_data / f"samples-10_stream-{stream}_beh.tsv", sep="\t")
+    df = df.fillna("n/a")
+    rows = df.to_dict(orient="records")
+
+    fname = Path(tmpdir) / f"sub-01_stream-{stream}_beh.tsv"
+    fname_sidecar = fname.with_suffix(".npz")
+    logger = TrialLogger(fname, sidecar=True)
+    for row in rows[:5]:
+        logger.write(row)
+    logger.end_block()
+
+    # written per block, but not yet finalized
+    data = read_beh_sidecar(fname_sidecar)
+    assert not data["finalized"]
+    assert data["trial"].shape == (5,)
+    with zipfile.ZipFile(fname_sidecar) as zf:
+        first_block = {info.filename: info.header_offset for info in zf.infolist()}
+
+    for row in rows[5:]:
+        logger.write(row)
+    logger.close()
+
+    # later blocks are appended, without re-writing earlier blocks
+    with zipfile.ZipFile(fname_sidecar) as zf:
+        infos = {info.filename: info.header_offset for info in zf.infolist()}
+    assert "rt/0000.npy" in first_block and "rt/0001.npy" in infos
+    assert {name: infos[name] for name in first_block} == first_block
+
+    data = read_beh_sidecar(fname_sidecar)
+    assert data["finalized"]
+    assert data["samples"].dtype == np.int8
+    assert data["samples"].shape == (10, 10)
+    assert data["rt"].dtype == np.float32
+    assert data["correct"].dtype == bool
+    assert data["choice"].tolist() == df["choice"].tolist()
+    np.testing.assert_array_equal(
+        data["samples"], df[[f"sample{i}" for i in range(1, 11)]].to_numpy()
+    )
+    timeouts = ~data["validity"]
+    assert np.isnan(data["rt"][timeouts]).all()
+    assert not data["correct"][timeouts].any()
+
+    # column projection
+    data = read_beh_sidecar(fname_sidecar, columns=["rt"])
+    assert list(data) == ["rt"]
+
+    # values read from a logfile as strings are converted the same way,
+    # also when re-opening an existing logfile
+    sidecar = BehSidecar(Path(tmpdir) / "from_tsv.npz")
+    with TrialLogger(fname, sidecar=True) as logger:
+        pass
+    for row in rows:
+        sidecar.append({key: str(val) for key, val in row.items()})
+    sidecar.close()
+    data_from_tsv = read_beh_sidecar(sidecar.fname)
+    data_appended = read_beh_sidecar(fname_sidecar)
+    assert data_from_tsv.keys() == data_appended.keys()
+    for key, arr in data_from_tsv.items():
+        np.testing.assert_array_equal(arr, data_appended[key])
+
+
 def test_calc_accuracy():
     """Test calculating the accuracy."""
     test_data = Path(__file__).parent.resolve() / "data"
@@ -85,6 +283,37 @@ def test_calc_accuracy():
     assert acc_block == 50
 
 
+@pytest.mark.parametrize("stream", ["single", "dual"])
+@pytest.mark.parametrize("blocksize", [1, 2, 3, 5, 10])
+def test_accuracy_tracker(stream, blocksize):
+    """Test that running accuracy statistics match calc_accuracy."""
+    test_data = Path(__file__).parent.resolve() / "data"
+    logfile = test_data / f"samples-10_stream-{stream}_beh.tsv"
+    df = pd.read_csv(logfile, sep="\t", keep_default_na=False)
+
+    tracker = AccuracyTracker(blocksize)
+    assert tracker.get_accuracy() == (0, 0)
+    for correct in df["correct"]:
+        tracker.update({"True": True, "False": False}.get(correct, correct))
+    assert tracker.get_accuracy() == calc_accuracy(logfile, blocksize)
+
+    assert tracker.n_trials == 10
+    assert tracker.n_correct == 6
+    assert tracker.n_timeout == (1 if stream == "single" else 0)
+    assert tracker.n_valid == tracker.n_trials - tracker.n_timeout
+
+    # recovering from a file yields the same statistics
+    recovered = AccuracyTracker.from_logfile(logfile, blocksize)
+    assert recovered.get_accuracy() == tracker.get_accuracy()
+    assert recovered.n_timeout == tracker.n_timeout
+
+    # other values are rejected, also when running with python -O
+    for correct in ["True", "timeout", None, 1]:
+        with pytest.raises(ValueError, match="correct must be"):
+            tracker.update(correct)
+    assert tracker.n_trials == 10
+
+
 def test_calc_bonus():
     """Test calculating bonus money."""
     test_data = Path(__file__).parent.resolve() / "data"
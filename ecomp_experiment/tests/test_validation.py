@@ -0,0 +1,168 @@
+"""Test checking the integrity of behavioral logfiles."""
+
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecomp_experiment.cohort import load_cohort
+from ecomp_experiment.define_settings import KEYLIST_DICT, NSAMPLES
+from ecomp_experiment.define_trials import evaluate_trial_correct, gen_trials
+from ecomp_experiment.session_farm import run_farm
+from ecomp_experiment.utils import map_key_to_choice
+from ecomp_experiment.validation import (
+    CHECKS,
+    get_expected_choices,
+    rescore_trials,
+    validate_cohort,
+)
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    """Run simulated sessions of two participants."""
+    tmp_path = tmp_path_factory.mktemp("validation")
+    _, data_dir = run_farm(2, data_dir=tmp_path / "experiment_data", ntrials=20, seed=1)
+    return data_dir
+
+
+def test_rescore_trials():
+    """Test that rescored trials equal trials evaluated one by one."""
+    rng = np.random.default_rng(1)
+    ntrials = 2000
+    trials = gen_trials(ntrials, NSAMPLES, seed=1).astype(int)
+    df = pd.DataFrame(trials, columns=[f"sample{i + 1}" for i in range(NSAMPLES)])
+    df["stream"] = rng.choice(["single", "dual"], ntrials)
+    df["choice"] = np.where(
+        df["stream"] == "single",
+        rng.choice(["lower", "higher", "n/a"], ntrials),
+        rng.choice(["red", "blue", "n/a"], ntrials),
+    )
+    evaluated = [
+        evaluate_trial_correct(trial, choice, stream)
+        for trial, choice, stream in zip(trials, df["choice"], df["stream"])
+    ]
+    df["correct"] = pd.array(
+        [pd.NA if correct == "n/a" else correct for correct, _ in evaluated],
+        dtype="boolean",
+    )
+    df["choice"] = df["choice"].replace("n/a", np.nan)
+
+    rescored = rescore_trials(df)
+    ambiguous = np.array([ambiguous for _, ambiguous in evaluated])
+    assert ambiguous.any()
+    np.testing.assert_array_equal(rescored["ambiguous"], ambiguous)
+    assert rescored["correct"].equals(df["correct"])
+
+    # errors in the logged values are corrected, except for ambiguous trials
+    df["correct"] = ~df["correct"]
+    rescored_flipped = rescore_trials(df)
+    changed = (rescored_flipped["correct"] != df["correct"]).fillna(False)
+    np.testing.assert_array_equal(changed, ~ambiguous & df["choice"].notna())
+
+
+def test_get_expected_choices():
+    """Test mapping directions and states to choices."""
+    df = pd.DataFrame(
+        dict(
+            stream=["single", "single", "dual", "dual", "dual"],
+            state=[0, 1, 0, 1, 1],
+            direction=["left", "left", "right", "right", np.nan],
+        )
+    )
+    expected = [
+        map_key_to_choice(KEYLIST_DICT[direction][0], state, stream)
+        for stream, state, direction in zip(
+            df["stream"][:4], df["state"][:4], df["direction"][:4]
+        )
+    ]
+    np.testing.assert_array_equal(get_expected_choices(df), expected + ["n/a"])
+
+
+def test_validate_cohort(data_dir):
+    """Test that errors in logfiles are found in the right sessions."""
+    df = load_cohort(data_dir)
+    report = validate_cohort(df, same_trials=True)
+    assert report[["subject", "stream"]].values.tolist() == [
+        ["01", "single"],
+        ["01", "dual"],
+        ["02", "single"],
+        ["02", "dual"],
+    ]
+    assert report["fname"][1] == "sub-01/dual/sub-01_stream-dual_beh.tsv"
+    assert report["n_trials"].eq(20).all()
+    assert report[CHECKS].eq(0).all().all()
+    assert report["valid"].all()
+
+    # introduce one error of each kind in a session of the second participant
+    bad = df.copy()
+    session = bad.index[(bad["subject"] == "02") & (bad["stream"] == "dual")]
+    bad.loc[session[0], "sample1"] = 0
+    bad.loc[session[1], "ambiguous"] = ~bad.loc[session[1], "ambiguous"]
+    clear = session[~bad.loc[session, "ambiguous"] & bad.loc[session, "choice"].notna()]
+    bad.loc[clear[-1], "correct"] = ~bad.loc[clear[-1], "correct"]
+    bad.loc[clear[-2], "state"] = 1 - bad.loc[clear[-2], "state"]
+    bad = bad.drop(session[5])
+
+    report = validate_cohort(bad, same_trials=True)
+    assert report["valid"].tolist() == [True, True, False, False]
+    # the invalid sample also changes which option was correct
+    assert report.loc[3, CHECKS].tolist() == [1, 1, 2, 1, 14, 15]
+
+    # either stream could have different trials, so both sessions are reported
+    assert report.loc[2, CHECKS].tolist() == [0, 0, 0, 0, 0, 15]
+
+    # the test subject and unpaired sessions are not compared
+    bad = df[(df["subject"] != "02") | (df["stream"] == "single")].copy()
+    bad.loc[bad["subject"] == "01", "subject"] = "test"
+    columns = [f"sample{i + 1}" for i in range(NSAMPLES)]
+    dual = bad["stream"] == "dual"
+    bad.loc[dual, columns] = np.roll(bad.loc[dual, columns].to_numpy(), 1, axis=1)
+    report = validate_cohort(bad, same_trials=True)
+    assert report["n_bad_same_trials"].isna().all()
+    assert report["valid"].all()
+    assert validate_cohort(df, same_trials=False)["n_bad_same_trials"].isna().all()
+
+
+def test_validate_cohort_recorded_settings(data_dir, monkeypatch):
+    """Test that trials are compared as set when the sessions were recorded."""
+    df = load_cohort(data_dir)
+    assert df["same_trials_over_conditions"].eq(True).all()
+    assert df["adaptive_difficulty"].eq(False).all()
+    assert validate_cohort(df)["n_bad_same_trials"].eq(0).all()
+
+    # later changes of the settings do not matter for recorded sessions
+    monkeypatch.setattr("ecomp_experiment.validation.ADAPTIVE_DIFFICULTY", True)
+    assert validate_cohort(df)["n_bad_same_trials"].eq(0).all()
+
+    # a participant whose trials were generated adaptively is not compared
+    adaptive = df.copy()
+    adaptive.loc[adaptive["subject"] == "02", "adaptive_difficulty"] = True
+    report = validate_cohort(adaptive)
+    assert report["n_bad_same_trials"].isna().tolist() == [False, False, True, True]
+
+    # sessions recorded without these fields use the current settings
+    old = df.drop(columns=["same_trials_over_conditions", "adaptive_difficulty"])
+    assert validate_cohort(old)["n_bad_same_trials"].isna().all()
+    monkeypatch.setattr("ecomp_experiment.validation.ADAPTIVE_DIFFICULTY", False)
+    assert validate_cohort(old)["n_bad_same_trials"].eq(0).all()
+
+
+def test_validation_cli(data_dir, tmp_path):
+    """Test the command line interface, which fails if a session has problems."""
+    output = tmp_path / "report.tsv"
+    command = [sys.executable, "-m", "ecomp_experiment.validation"]
+    command += ["--data-dir", str(data_dir), "--output", str(output)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Sessions: 4 (0 with problems)" in result.stdout
+    assert pd.read_csv(output, sep="\t").shape[0] == 4
+
+    beh_fname = data_dir / "sub-01" / "single" / "sub-01_stream-single_beh.tsv"
+    lines = beh_fname.read_text().splitlines(keepends=True)
+    beh_fname.write_text("".join(lines[:3] + lines[4:]))
+    result = subprocess.run(command, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "Sessions: 4 (2 with problems)" in result.stdout
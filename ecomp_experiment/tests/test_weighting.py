@@ -0,0 +1,128 @@
+"""Test estimating the weighting kernels of sample influence."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ecomp_experiment.define_settings import NSAMPLES
+from ecomp_experiment.define_trials import gen_trials
+from ecomp_experiment.weighting import (
+    fit_kernels,
+    fit_logistic_batch,
+    make_design,
+    summarize_kernels,
+)
+
+
+def simulate_cohort(n_subjects, ntrials, position_weights, seed):
+    """Simulate choices of participants with a known position kernel."""
+    rng = np.random.default_rng(seed)
+    dfs = []
+    for isub in range(n_subjects):
+        for stream, choices in [
+            ("single", ["lower", "higher"]),
+            ("dual", ["red", "blue"]),
+        ]:
+            trials = gen_trials(ntrials, NSAMPLES, seed=rng.integers(2**32))
+            X, _ = make_design(trials, np.full(ntrials, stream))
+            p = 1 / (1 + np.exp(-X[:, :NSAMPLES] @ position_weights))
+            df = pd.DataFrame(
+                trials.astype(int), columns=[f"sample{i + 1}" for i in range(NSAMPLES)]
+            )
+            df["subject"] = f"{isub + 1:02}"
+            df["stream"] = stream
+            df["choice"] = np.array(choices)[(rng.random(ntrials) < p).astype(int)]
+            dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def test_make_design():
+    """Test the design matrices of the kernels."""
+    samples = np.array([[-1, 2, -9, 9], [-1, 2, -9, 9]])
+    streams = np.array(["single", "dual"])
+    X, regressors = make_design(samples, streams, kind="position")
+    assert regressors == ["sample1", "sample2", "sample3", "sample4", "intercept"]
+    np.testing.assert_array_equal(X, [[-4, -3, 4, 4, 1], [-1, 2, -9, 9, 1]])
+
+    X, regressors = make_design(samples, streams, kind="value")
+    assert regressors == [str(value) for value in range(1, 10)] + ["intercept"]
+    np.testing.assert_array_equal(
+        X,
+        [[1, 1, 0, 0, 0, 0, 0, 0, 2, 1], [-1, 1, 0, 0, 0, 0, 0, 0, 0, 1]],
+    )
+
+    with pytest.raises(ValueError, match="Unknown kind"):
+        make_design(samples, streams, kind="color")
+
+
+def test_fit_logistic_batch():
+    """Test that stacked fits equal separate fits, and maximize the likelihood."""
+    rng = np.random.default_rng(1)
+    n_fits, n_trials, n_regressors = 5, 200, 4
+    X = rng.normal(size=(n_fits, n_trials, n_regressors))
+    X[..., -1] = 1
+    true_weights = rng.normal(size=(n_fits, n_regressors))
+    p = 1 / (1 + np.exp(-np.einsum("ftr,fr->ft", X, true_weights)))
+    y = rng.random((n_fits, n_trials)) < p
+
+    # fits with fewer trials are padded and masked
+    mask = np.ones((n_fits, n_trials), dtype=bool)
+    mask[0, 150:] = False
+    X[0, 150:] = 1e3
+
+    weights, se, converged = fit_logistic_batch(X, y, mask, alpha=0)
+    assert converged.all()
+    assert np.all(se > 0)
+    for ifit in range(n_fits):
+        n_valid = mask[ifit].sum()
+        weights_single, se_single, _ = fit_logistic_batch(
+            X[ifit : ifit + 1, :n_valid], y[ifit : ifit + 1, :n_valid], alpha=0
+        )
+        np.testing.assert_allclose(weights[ifit], weights_single[0], rtol=1e-6)
+        np.testing.assert_allclose(se[ifit], se_single[0], rtol=1e-6)
+
+        # the gradient of the log-likelihood is zero at the solution
+        p = 1 / (1 + np.exp(-X[ifit, :n_valid] @ weights[ifit]))
+        gradient = X[ifit, :n_valid].T @ (y[ifit, :n_valid] - p)
+        np.testing.assert_allclose(gradient, 0, atol=1e-6)
+
+    # separable data still give finite weights with a penalty
+    X_sep = np.stack([np.linspace(-1, 1, 20), np.ones(20)], axis=1)[np.newaxis]
+    y_sep = X_sep[..., 0] > 0
+    weights, se, converged = fit_logistic_batch(X_sep, y_sep, alpha=1e-2)
+    assert converged.all()
+    assert np.all(np.isfinite(weights))
+
+
+def test_fit_kernels():
+    """Test recovering known kernels of simulated participants."""
+    position_weights = np.linspace(0.2, 0.6, NSAMPLES)
+    df = simulate_cohort(10, 300, position_weights, seed=1)
+
+    # timeouts are ignored
+    df.loc[df.index[:10], "choice"] = np.nan
+
+    kernels = fit_kernels(df, kind="position")
+    assert kernels.shape[0] == 10 * 2 * (NSAMPLES + 1)
+    assert kernels["converged"].all()
+    assert set(kernels["n_trials"]) == {290, 300}
+    group = summarize_kernels(kernels)
+    assert group["n_subjects"].eq(10).all()
+    for stream in ["single", "dual"]:
+        kernel = group[
+            (group["stream"] == stream) & (group["regressor"] != "intercept")
+        ]
+        assert kernel["regressor"].tolist() == [f"sample{i + 1}" for i in range(10)]
+        np.testing.assert_allclose(kernel["mean"], position_weights, atol=0.2)
+        assert np.corrcoef(kernel["mean"], position_weights)[0, 1] > 0.9
+
+    # with equal weights of all positions, digit values are weighted linearly
+    df = simulate_cohort(5, 300, np.full(NSAMPLES, 0.4), seed=2)
+    kernels = fit_kernels(df, kind="value")
+    group = summarize_kernels(kernels)
+    for stream in ["single", "dual"]:
+        kernel = group[
+            (group["stream"] == stream) & (group["regressor"] != "intercept")
+        ]
+        np.testing.assert_allclose(kernel["mean"], 0.4 * np.arange(-4, 5), atol=0.4)
+        assert abs(kernel["mean"].mean()) < 1e-3
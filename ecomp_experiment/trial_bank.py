@@ -0,0 +1,325 @@
+"""Store many pre-generated trials, indexed by difficulty and ambiguity.
+
+A trial bank holds trials that follow the rules of define_trials.gen_trial,
+as int8 arrays. For each trial, the expected value (EV) difference in the
+single and in the dual stream (see define_trials.calc_trial_ev_diffs), the gap
+between the two, and whether the trial is ambiguous in the single stream, in the
+dual stream, and in either stream are stored as exact integers, together with the
+order that sorts the trials by each of them. Range queries, e.g., for trials with
+a dual stream EV difference between 0.5 and 1.0 that are not ambiguous, and that
+a participant has not seen yet, then only need a binary search and a scan over
+a random sample of the matching trials.
+
+To generate a bank of 5 million trials and save it, run from the root of the
+repository::
+
+    python -m ecomp_experiment.trial_bank --n-trials 5000000 --seed 1 trial_bank.npz
+
+"""
+
+import numpy as np
+
+from ecomp_experiment.define_settings import NSAMPLES
+
+# the indexed keys of each trial, see TrialBank
+INDEX_KEYS = [
+    "single",
+    "dual",
+    "gap",
+    "ambiguous_single",
+    "ambiguous_dual",
+    "ambiguous",
+]
+
+
+def pack_trials(trials):
+    """Pack each trial into a single integer, for fast comparisons.
+
+    Parameters
+    ----------
+    trials : np.ndarray, shape(n_trials, nsamples)
+        The trials, with samples from -9 to 9. At most 14 samples per trial.
+
+    Returns
+    -------
+    packed : np.ndarray of int64, shape(n_trials,)
+        The trials as numbers in base 19, equal only for equal trials.
+    """
+    trials = np.atleast_2d(trials)
+    assert trials.shape[1] <= 14, "Cannot pack more than 14 samples per trial."
+    powers = 19 ** np.arange(trials.shape[1], dtype=np.int64)
+    return (trials.astype(np.int64) + 9) @ powers
+
+
+class TrialBank:
+    """Trials with sorted indexes on their difficulty and ambiguity.
+
+    The keys of each trial are stored in the smallest unit in which they are
+    integers: the single stream EV difference and the gap in units of
+    ``1 / nsamples``, and the dual stream EV difference in units of
+    ``2 / nsamples``.
+
+    Parameters
+    ----------
+    trials : np.ndarray of int8, shape(n_trials, nsamples)
+        The trials, see define_trials.gen_trial.
+    orders : dict | None
+        The orders that sort the trials by each of INDEX_KEYS. If None
+        (default), they are calculated, as are orders missing from the dict.
+
+    Attributes
+    ----------
+    units : dict
+        Maps "single", "dual", and "gap" to the unit of their keys.
+    keys : dict
+        Maps each of INDEX_KEYS to an array of shape(n_trials,) with the key of
+        each trial.
+    orders : dict
+        Maps each of INDEX_KEYS to the indices that sort the trials by that key.
+    """
+
+    def __init__(self, trials, orders=None):
+        """Calculate the keys of the trials, and index them."""
+        self.trials = np.asarray(trials, dtype=np.int8)
+        self.nsamples = self.trials.shape[1]
+        assert self.nsamples % 2 == 0, "Trials must have an even number of samples."
+
+        digits = np.abs(self.trials).astype(np.int16)
+        red = self.trials < 0
+        midpoint = 5
+        single = np.abs(digits.sum(axis=1) - midpoint * self.nsamples)
+        dual = np.abs((digits * red).sum(axis=1) - (digits * ~red).sum(axis=1))
+        self.keys = dict(
+            single=single.astype(np.int16),
+            dual=dual.astype(np.int16),
+            gap=np.abs(single - 2 * dual).astype(np.int16),
+            ambiguous_single=single == 0,
+            ambiguous_dual=dual == 0,
+            ambiguous=(single == 0) | (dual == 0),
+        )
+        self.units = dict(
+            single=1 / self.nsamples, dual=2 / self.nsamples, gap=1 / self.nsamples
+        )
+
+        orders = dict() if orders is None else dict(orders)
+        for key in INDEX_KEYS:
+            if key not in orders:
+                orders[key] = np.argsort(self.keys[key], kind="stable").astype(np.int32)
+        self.orders = orders
+        self._sorted = {key: self.keys[key][self.orders[key]] for key in INDEX_KEYS}
+
+    def __len__(self):
+        """Get the number of trials."""
+        return self.trials.shape[0]
+
+    @classmethod
+    def generate(cls, n_trials, nsamples=NSAMPLES, seed=None, chunk_size=1_000_000):
+        """Generate a bank of random trials.
+
+        Parameters
+        ----------
+        n_trials : int
+            The number of trials to generate.
+        nsamples : int
+            The number of digits shown per trial. Defaults to NSAMPLES in
+            define_settings.py.
+        seed : int | None
+            The seed for the random number generator.
+        chunk_size : int
+            The number of trials to generate at once. Defaults to 1000000.
+
+        Returns
+        -------
+        bank : TrialBank
+            The trial bank.
+        """
+        rng = np.random.default_rng(seed)
+        half_colors = np.repeat(np.array([-1, 1], dtype=np.int8), int(nsamples / 2))
+        trials = np.empty((n_trials, nsamples), dtype=np.int8)
+        for start in range(0, n_trials, chunk_size):
+            n_chunk = min(chunk_size, n_trials - start)
+            digits = rng.integers(1, 10, size=(n_chunk, nsamples), dtype=np.int8)
+            colors = rng.permuted(np.tile(half_colors, (n_chunk, 1)), axis=1)
+            trials[start : start + n_chunk] = digits * colors
+        return cls(trials)
+
+    def save(self, fname):
+        """Save the trials and their indexes to an .npz file."""
+        np.savez(
+            fname,
+            trials=self.trials,
+            **{f"order_{key}": order for key, order in self.orders.items()},
+        )
+
+    @classmethod
+    def load(cls, fname):
+        """Load a trial bank saved with :meth:`save`."""
+        with np.load(fname) as npz:
+            orders = {
+                key: npz[f"order_{key}"]
+                for key in INDEX_KEYS
+                if f"order_{key}" in npz.files
+            }
+            return cls(npz["trials"], orders=orders)
+
+    def _get_bounds(self, key, bounds):
+        """Convert the bounds of a condition to bounds of the integer keys.
+
+        The bounds have the type of the keys, so that searching the sorted keys
+        does not convert them.
+        """
+        dtype = self.keys[key].dtype.type
+        if dtype is np.bool_:
+            return dtype(bounds), dtype(bounds)
+        info = np.iinfo(dtype)
+        low = np.clip(np.ceil(bounds[0] / self.units[key] - 1e-9), info.min, info.max)
+        high = np.clip(np.floor(bounds[1] / self.units[key] + 1e-9), info.min, info.max)
+        return dtype(low), dtype(high)
+
+    def query(
+        self,
+        n_trials,
+        single=None,
+        dual=None,
+        gap=None,
+        ambiguous_single=None,
+        ambiguous_dual=None,
+        ambiguous=None,
+        exclude=None,
+        rng=None,
+    ):
+        """Find random trials by their EV differences and ambiguity.
+
+        The candidate trials are found in the index of the most selective
+        condition with a binary search. A random sample of them is checked for
+        the other conditions, or all of them in random order, if the sample
+        has too few matches. So the found trials are a random sample of all
+        matching trials, e.g., spread over the range of EV differences.
+
+        Parameters
+        ----------
+        n_trials : int
+            The number of trials to find.
+        single, dual, gap : tuple of float | None
+            The ``(low, high)`` bounds (inclusive) of the EV difference in the
+            single stream, in the dual stream, and of the absolute difference
+            between the two. If None (default), do not restrict.
+        ambiguous_single, ambiguous_dual : bool | None
+            Whether trials must be ambiguous (True) or not (False) in the single
+            stream, and in the dual stream. If None (default), do not restrict.
+        ambiguous : bool | None
+            Whether trials must be ambiguous in either stream (True), in neither
+            stream (False), or either (None, the default).
+        exclude : np.ndarray, shape(n_excluded, nsamples) | None
+            Trials that must not be returned, e.g., the trials that a participant
+            has seen. Defaults to None.
+        rng : np.random.Generator | None
+            The random number generator to sample the trials with. Defaults to
+            None, which uses a new generator, so that repeated queries return
+            different trials. Pass a seeded generator for reproducible queries.
+
+        Returns
+        -------
+        ids : np.ndarray of int, shape(n_found,)
+            The indices of the found trials in :attr:`trials`, in random order.
+            Fewer than `n_trials` if there are not enough matching trials.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        conditions = dict(
+            single=single,
+            dual=dual,
+            gap=gap,
+            ambiguous_single=ambiguous_single,
+            ambiguous_dual=ambiguous_dual,
+            ambiguous=ambiguous,
+        )
+        bounds = {
+            key: self._get_bounds(key, value)
+            for key, value in conditions.items()
+            if value is not None
+        }
+        if len(bounds) == 0:
+            candidates = self.orders["single"]
+        else:
+            ranges = {
+                key: (
+                    np.searchsorted(self._sorted[key], low, side="left"),
+                    np.searchsorted(self._sorted[key], high, side="right"),
+                )
+                for key, (low, high) in bounds.items()
+            }
+            key = min(ranges, key=lambda key: ranges[key][1] - ranges[key][0])
+            start, stop = ranges[key]
+            candidates = self.orders[key][start:stop]
+            del bounds[key]
+        if candidates.size == 0:
+            return np.array([], dtype=int)
+
+        excluded = None if exclude is None else np.unique(pack_trials(exclude))
+
+        # check a random sample of the candidates, and if it has too few
+        # matches, all candidates in random order, in chunks until enough are found
+        chunk_size = max(4 * n_trials, 1024)
+        n_sample = min(chunk_size, candidates.size)
+        positions = rng.choice(candidates.size, n_sample, replace=False)
+        found = self._check(candidates[positions], bounds, excluded)
+        if found.size < n_trials and n_sample < candidates.size:
+            positions = rng.permutation(candidates.size)
+            found = []
+            n_found = 0
+            for chunk_start in range(0, candidates.size, chunk_size):
+                chunk = positions[chunk_start : chunk_start + chunk_size]
+                found.append(self._check(candidates[chunk], bounds, excluded))
+                n_found += found[-1].size
+                if n_found >= n_trials:
+                    break
+            found = np.concatenate(found)
+
+        return found[:n_trials].astype(int)
+
+    def _check(self, ids, bounds, excluded):
+        """Get the trials that meet the conditions, and are not excluded."""
+        mask = np.ones(ids.size, dtype=bool)
+        for key, (low, high) in bounds.items():
+            values = self.keys[key][ids]
+            mask &= (values >= low) & (values <= high)
+        if excluded is not None:
+            mask &= ~np.isin(pack_trials(self.trials[ids]), excluded)
+        return ids[mask]
+
+    def get_ev_diffs(self, ids):
+        """Get the EV differences of trials in the single and the dual stream.
+
+        Parameters
+        ----------
+        ids : np.ndarray of int
+            The indices of the trials.
+
+        Returns
+        -------
+        ev_diffs_single, ev_diffs_dual : np.ndarray of float
+            The EV differences, as from define_trials.calc_trial_ev_diffs.
+        """
+        return (
+            self.keys["single"][ids] * self.units["single"],
+            self.keys["dual"][ids] * self.units["dual"],
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    from time import perf_counter
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("fname", help="The .npz file to save the trial bank to.")
+    parser.add_argument(
+        "--n-trials", type=int, default=1_000_000, help="Number of trials."
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+    args = parser.parse_args()
+
+    start = perf_counter()
+    bank = TrialBank.generate(args.n_trials, seed=args.seed)
+    bank.save(args.fname)
+    print(f"Generated {len(bank)} trials in {perf_counter() - start:.1f} s")
+    print(f"Written to: {args.fname}")
@@ -1,10 +1,14 @@
 """Provide utility functions for the main experiment."""
 
 import csv
+import datetime
+import json
+import os
+import re
+from pathlib import Path
+from time import perf_counter
 
 import numpy as np
-import pandas as pd
-from psychopy import core
 
 from ecomp_experiment.define_settings import KEYLIST_DICT
 
@@ -23,7 +27,13 @@ def calc_accuracy(logfile, blocksize):
     -------
     acc_overall, acc_block : int
         Accuracy as percentage correct choices overall so far, and in the last block.
+
+    See Also
+    --------
+    AccuracyTracker
     """
+    import pandas as pd
+
     df = pd.read_csv(logfile, sep="\t", usecols=["correct"])
 
     # "n/a" for "correct" means timeout, calculate as incorrect
@@ -40,22 +50,265 @@ def calc_accuracy(logfile, blocksize):
     return acc_overall, acc_block
 
 
-def check_framerate(win, expected_fps):
-    """Get and check fps of this window."""
-    fps_counter = 0
-    while True:
-        fps = win.getActualFrameRate(nMaxFrames=1000)
-        if fps is not None:
-            fps = int(round(fps))
-        if expected_fps == fps:
-            return fps
-        else:
-            fps_counter += 1
-            print(f"Found fps: {fps}, trying again.")
-            core.wait(1)
-        if fps_counter > 6:
-            win.close()
-            raise ValueError(f"Are you sure you are expecting {expected_fps} fps?")
+class AccuracyTracker:
+    """Keep running statistics of choice accuracy over the course of a session.
+
+    The statistics are updated after each trial, so that accuracies are available
+    at block breaks without re-reading the logfile. Timeouts are counted as
+    incorrect choices, as in :func:`calc_accuracy`.
+
+    Parameters
+    ----------
+    blocksize : int
+        How many trials fit into one block.
+
+    Attributes
+    ----------
+    n_trials : int
+        The number of trials seen so far.
+    n_correct : int
+        The number of correct choices so far.
+    n_timeout : int
+        The number of trials without a response so far.
+
+    See Also
+    --------
+    calc_accuracy
+    """
+
+    def __init__(self, blocksize):
+        """Initialize the counts."""
+        self.blocksize = blocksize
+        self.n_trials = 0
+        self.n_correct = 0
+        self.n_timeout = 0
+
+        # ring buffer of correct choices in the last block, and its sum
+        self._ring = np.zeros(blocksize, dtype=bool)
+        self._n_correct_block = 0
+
+    @property
+    def n_valid(self):
+        """The number of trials with a response so far."""
+        return self.n_trials - self.n_timeout
+
+    def update(self, correct):
+        """Add the outcome of a trial.
+
+        Parameters
+        ----------
+        correct : bool | "n/a"
+            Whether or not the choice in this trial was correct, "n/a" for
+            timeouts. See :func:`define_trials.evaluate_trial_correct`.
+        """
+        if isinstance(correct, str) and correct == "n/a":
+            self.n_timeout += 1
+            correct = False
+        elif not isinstance(correct, (bool, np.bool_)):
+            raise ValueError(f"correct must be True, False, or 'n/a', got: {correct!r}")
+        correct = bool(correct)
+
+        iring = self.n_trials % self.blocksize
+        self._n_correct_block += int(correct) - int(self._ring[iring])
+        self._ring[iring] = correct
+
+        self.n_correct += int(correct)
+        self.n_trials += 1
+
+    def get_accuracy(self):
+        """Get accuracy as percent correct choices overall and of last block.
+
+        Returns
+        -------
+        acc_overall, acc_block : int
+            Accuracy as percentage correct choices overall so far, and in the last
+            block. Both are 0 if no trials were seen yet.
+        """
+        if self.n_trials == 0:
+            return 0, 0
+
+        acc_overall = (self.n_correct / self.n_trials) * 100
+        acc_block = (self._n_correct_block / self.blocksize) * 100
+
+        # round up and turn into int
+        acc_overall = int(np.ceil(acc_overall))
+        acc_block = int(np.ceil(acc_block))
+
+        return acc_overall, acc_block
+
+    @classmethod
+    def from_logfile(cls, logfile, blocksize):
+        """Recover the running statistics from a logfile.
+
+        Parameters
+        ----------
+        logfile : pathlib.Path
+            Path object pointing to the logfile for this stream.
+        blocksize : int
+            How many trials fit into one block.
+
+        Returns
+        -------
+        tracker : AccuracyTracker
+            The tracker, updated with all trials in `logfile`.
+        """
+        tracker = cls(blocksize)
+        with open(logfile, "r", newline="") as fin:
+            for row in csv.DictReader(fin, delimiter="\t"):
+                correct = {"True": True, "False": False}.get(row["correct"], "n/a")
+                tracker.update(correct)
+        return tracker
+
+
+def check_framerate(
+    win, expected_fps, monitor_name=None, cache_fname=None, tol_hz=0.5, n_attempts=3
+):
+    """Get and check fps of this window.
+
+    The refresh rate is measured with :func:`measure_refresh_rate`. If the refresh
+    rate of `monitor_name` was verified before, it is only quickly re-validated.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window
+        The window to check.
+    expected_fps : int
+        The expected refresh rate.
+    monitor_name : str | None
+        The name of the monitor profile, used as key in the cache.
+    cache_fname : pathlib.Path | None
+        A JSON file in which verified refresh rates are cached per monitor.
+        If None (default), do not use a cache.
+    tol_hz : float
+        How much the refresh rate may deviate from `expected_fps`. Defaults to 0.5.
+    n_attempts : int
+        How often to measure before giving up. Defaults to 3.
+
+    Returns
+    -------
+    fps : int
+        The verified refresh rate, equal to `expected_fps`.
+    """
+    cache = dict()
+    if cache_fname is not None and Path(cache_fname).exists():
+        with open(cache_fname, "r") as fin:
+            cache = json.load(fin)
+
+    # quick re-validation of a previously verified refresh rate
+    cached = cache.get(monitor_name, dict())
+    if cached.get("expected_fps") == expected_fps:
+        fps, verified = measure_refresh_rate(
+            win, cached["fps"], tol_hz=tol_hz, max_frames=60
+        )
+        if verified and abs(fps - expected_fps) <= tol_hz:
+            return expected_fps
+
+    for _ in range(n_attempts):
+        fps, verified = measure_refresh_rate(win, expected_fps, tol_hz=tol_hz)
+        if verified:
+            break
+        print(f"Found fps: {fps:.2f}, trying again.")
+    else:
+        win.close()
+        raise ValueError(f"Are you sure you are expecting {expected_fps} fps?")
+
+    if cache_fname is not None and monitor_name is not None:
+        cache[monitor_name] = dict(
+            fps=fps,
+            expected_fps=expected_fps,
+            verified=datetime.datetime.today().isoformat(),
+        )
+        os.makedirs(Path(cache_fname).parent, exist_ok=True)
+        with open(cache_fname, "w") as fout:
+            json.dump(cache, fout, indent=4, sort_keys=True)
+
+    return expected_fps
+
+
+def measure_refresh_rate(
+    win, expected_fps, tol_hz=0.5, min_frames=20, max_frames=1000, check_every=5
+):
+    """Measure the refresh rate of a window until it is clearly (not) as expected.
+
+    The window is flipped repeatedly, and every `check_every` frames, the refresh
+    rate and its 95% confidence interval are estimated from the flip times
+    (see :func:`estimate_refresh_rate`). Measuring stops as soon as the confidence
+    interval is entirely within, or entirely outside of ``expected_fps ± tol_hz``.
+
+    Parameters
+    ----------
+    win : psychopy.visual.Window
+        The window to measure.
+    expected_fps : float
+        The expected refresh rate.
+    tol_hz : float
+        How much the refresh rate may deviate from `expected_fps`.
+    min_frames, max_frames : int
+        The minimum and maximum number of frames to measure.
+    check_every : int
+        After how many frames to check whether to stop.
+
+    Returns
+    -------
+    fps : float
+        The measured refresh rate.
+    verified : bool
+        Whether the refresh rate is within ``expected_fps ± tol_hz``. If the
+        maximum number of frames was reached before the confidence interval was
+        narrow enough, this is decided based on `fps` alone.
+    """
+    flip_times = np.zeros(max_frames + 1)
+    flip_times[0] = _flip(win)
+    for iframe in range(1, max_frames + 1):
+        flip_times[iframe] = _flip(win)
+
+        if iframe < min_frames or iframe % check_every != 0:
+            continue
+        fps, halfwidth = estimate_refresh_rate(flip_times[: iframe + 1])
+        deviation = abs(fps - expected_fps)
+        if deviation + halfwidth <= tol_hz:
+            return fps, True
+        if deviation - halfwidth > tol_hz:
+            return fps, False
+
+    fps, _ = estimate_refresh_rate(flip_times)
+    return fps, abs(fps - expected_fps) <= tol_hz
+
+
+def estimate_refresh_rate(flip_times):
+    """Estimate the refresh rate from flip times.
+
+    Each flip is assigned to a frame of the display, based on the median interval
+    between flips, so that dropped frames do not bias the estimate. The frame
+    duration is then estimated as the slope of a linear regression of flip times
+    on frames.
+
+    Parameters
+    ----------
+    flip_times : np.ndarray, shape(n_flips,)
+        The times of consecutive flips in seconds, at least 3.
+
+    Returns
+    -------
+    fps : float
+        The estimated refresh rate.
+    halfwidth : float
+        The halfwidth of the 95% confidence interval of `fps`.
+    """
+    frames = np.round((flip_times - flip_times[0]) / np.median(np.diff(flip_times)))
+    x = frames - frames.mean()
+    y = flip_times - flip_times.mean()
+    slope = (x @ y) / (x @ x)
+    residuals = y - slope * x
+    sem = np.sqrt((residuals @ residuals) / (x.size - 2) / (x @ x))
+    # delta method: d(1/T) = dT / T**2
+    return 1 / slope, 1.96 * sem / slope**2
+
+
+def _flip(win):
+    """Flip a window and return the time of the flip."""
+    t = win.flip()
+    return perf_counter() if t is None else t
 
 
 def map_key_to_choice(key, state, stream):
@@ -131,6 +384,10 @@ def save_dict(fname, savedict):
         exist yet; else, content is appended.
     savedict : dict
         The data to write.
+
+    See Also
+    --------
+    TrialLogger
     """
     if not fname.exists():
         with open(fname, "w", newline="") as fout:
@@ -143,6 +400,296 @@ def save_dict(fname, savedict):
             writer.writerow(savedict)
 
 
+class TrialLogger:
+    """Append trial data to a TSV logfile that stays open for a whole session.
+
+    Opposed to :func:`save_dict`, the file handle and ``csv.DictWriter`` are
+    created only once, so that no open/close calls happen between trials.
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        The file location to write to. Will be created if it doesn't
+        exist yet; else, content is appended.
+    flush_policy : {"trial", "block", "break"}
+        When to flush written rows to the operating system. "trial" uses a
+        line-buffered file, so that each row is handed to the operating system
+        as soon as it is written. "block" flushes at the end of each block,
+        and "break" flushes only at hard breaks (see :meth:`end_block`).
+        The file is always flushed when it is closed.
+    fsync : bool
+        Whether to additionally call ``os.fsync`` each time the file is flushed,
+        forcing the data onto the disk. Defaults to False. With flush_policy
+        "trial", each row is fsynced by the next call to :meth:`flush_pending`,
+        which can be called while waiting between frames, or else before the
+        next row is written.
+    sidecar : bool
+        Whether to also write a columnar sidecar file with typed columns next to the
+        logfile (same name, but ``.npz`` extension). It is updated at the end of
+        each block and finalized when the logger is closed. Defaults to False.
+
+    See Also
+    --------
+    save_dict
+    BehSidecar
+    """
+
+    def __init__(self, fname, flush_policy="trial", fsync=False, sidecar=False):
+        """Open the logfile."""
+        if flush_policy not in ["trial", "block", "break"]:
+            raise ValueError(f"Unknown flush_policy: {flush_policy}")
+        self.fname = fname
+        self.flush_policy = flush_policy
+        self.fsync = fsync
+        self._flush_due = False
+
+        self._write_header = not Path(fname).exists()
+        buffering = 1 if flush_policy == "trial" else -1
+        self._fout = open(fname, "a", newline="", buffering=buffering)
+        self._writer = None
+
+        self._sidecar = None
+        if sidecar:
+            self._sidecar = BehSidecar(Path(fname).with_suffix(".npz"))
+            if not self._write_header:
+                # keep the sidecar complete when appending to an existing logfile
+                with open(fname, "r", newline="") as fin:
+                    for row in csv.DictReader(fin, delimiter="\t"):
+                        self._sidecar.append(row)
+
+    def write(self, savedict):
+        """Write a dict as one row to the logfile.
+
+        Parameters
+        ----------
+        savedict : dict
+            The data to write. The keys of the first dict that is written
+            determine the columns of the logfile.
+        """
+        self.flush_pending()
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._fout, savedict.keys(), delimiter="\t")
+            if self._write_header:
+                self._writer.writeheader()
+        self._writer.writerow(savedict)
+        if self._sidecar is not None:
+            self._sidecar.append(savedict)
+        if self.flush_policy == "trial" and self.fsync:
+            self._flush_due = True
+
+    def flush_pending(self):
+        """Flush the logfile only if `flush_policy` calls for a flush not done yet.
+
+        That is the case for written rows with flush_policy "trial" and `fsync`.
+        Otherwise, this does nothing, so that it can be called every frame.
+        """
+        if self._flush_due:
+            self.flush()
+
+    def end_block(self, hard_break=False):
+        """Signal the end of a block and flush depending on `flush_policy`.
+
+        Parameters
+        ----------
+        hard_break : bool
+            Whether the block ends with a hard (non-skippable) break.
+        """
+        if self._sidecar is not None:
+            self._sidecar.end_block()
+        if self.flush_policy == "block" or (
+            self.flush_policy == "break" and hard_break
+        ):
+            self.flush()
+
+    def flush(self):
+        """Flush the logfile, and optionally fsync it."""
+        self._fout.flush()
+        if self.fsync:
+            os.fsync(self._fout.fileno())
+        self._flush_due = False
+
+    def close(self):
+        """Flush and close the logfile, and finalize the sidecar."""
+        if self._fout.closed:
+            return
+        self.flush()
+        self._fout.close()
+        if self._sidecar is not None:
+            self._sidecar.close()
+
+    def __enter__(self):
+        """Enter context."""
+        return self
+
+    def __exit__(self, *args):
+        """Exit context and close the logfile."""
+        self.close()
+
+
+# dtypes of the columns in the behavioral logfiles (see main.py), used for sidecars.
+# The "sample1", "sample2", ... columns are stored as one int8 array "samples".
+BEH_SIDECAR_DTYPES = dict(
+    trial=np.int16,
+    direction="<U5",
+    choice="<U6",
+    ambiguous=np.bool_,
+    rt=np.float32,
+    validity=np.bool_,
+    iti=np.float32,
+    correct=np.bool_,
+    stream="<U6",
+    state=np.int8,
+    samples=np.int8,
+)
+
+
+class BehSidecar:
+    """Write behavioral data to a columnar sidecar file with typed columns.
+
+    The sidecar is an uncompressed ``.npz`` (zip) file with typed arrays per column
+    of the behavioral logfile (see `BEH_SIDECAR_DTYPES`), which can be read column
+    by column with :func:`read_beh_sidecar`. "n/a" values are stored as NaN in float
+    columns, and as False in bool columns (timeouts can be identified via "validity").
+
+    Rows are collected in memory, and at the end of each block, the rows of that block
+    are appended to the file as one ``.npy`` member per column (named
+    ``<column>/<block>.npy``), so that the file always contains all completed blocks
+    and each block is written only once. A member "finalized.npy" is added when
+    :meth:`close` is called. If the experiment crashes while a block is appended,
+    the sidecar can be incomplete; it is re-created from the logfile when the
+    logfile is re-opened with :class:`TrialLogger`.
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        The file location to write to. Will be overwritten if it exists.
+
+    See Also
+    --------
+    TrialLogger
+    read_beh_sidecar
+    """
+
+    def __init__(self, fname):
+        """Prepare the sidecar."""
+        self.fname = Path(fname)
+        self.finalized = False
+        self.n_blocks = 0
+        self._rows = []
+        self._created = False
+
+    def append(self, savedict):
+        """Add a row of data, as written to the behavioral logfile.
+
+        Parameters
+        ----------
+        savedict : dict
+            The data of one trial. Values may be strings, as read from a logfile.
+        """
+        self._rows.append(savedict)
+
+    def end_block(self):
+        """Convert the rows of the current block and append them to the sidecar."""
+        self._write(self._convert_rows())
+
+    def close(self):
+        """Write remaining rows and finalize the sidecar file."""
+        if self.finalized:
+            return
+        arrays = self._convert_rows()
+        arrays["finalized"] = np.array(True)
+        self._write(arrays)
+        self.finalized = True
+
+    def _convert_rows(self):
+        """Turn the collected rows into typed arrays, named by their member."""
+        if len(self._rows) == 0:
+            return {}
+
+        block = {}
+        sample_keys = [key for key in self._rows[0] if re.fullmatch(r"sample\d+", key)]
+        if len(sample_keys) > 0:
+            samples = [[row[key] for key in sample_keys] for row in self._rows]
+            block["samples"] = np.asarray(samples).astype(np.int8)
+        for key in self._rows[0]:
+            if key in sample_keys:
+                continue
+            values = [row[key] for row in self._rows]
+            block[key] = _convert_beh_column(values, BEH_SIDECAR_DTYPES.get(key))
+
+        self._rows = []
+        self.n_blocks += 1
+        return {f"{key}/{self.n_blocks - 1:04d}": arr for key, arr in block.items()}
+
+    def _write(self, arrays):
+        """Append arrays as members to the sidecar, creating it on the first write."""
+        import zipfile
+
+        if len(arrays) == 0 and self._created:
+            return
+        mode = "a" if self._created else "w"
+        with zipfile.ZipFile(self.fname, mode=mode) as zf:
+            for name, arr in arrays.items():
+                with zf.open(f"{name}.npy", "w", force_zip64=True) as fout:
+                    np.lib.format.write_array(fout, arr, allow_pickle=False)
+        self._created = True
+
+
+def _convert_beh_column(values, dtype):
+    """Convert a list of logfile values to an array of `dtype`."""
+    if dtype is None:
+        return np.asarray([str(val) for val in values])
+
+    kind = np.dtype(dtype).kind
+    if kind == "b":
+        values = [(val == "True") if isinstance(val, str) else val for val in values]
+    elif kind == "f":
+        values = [np.nan if val == "n/a" else float(val) for val in values]
+    elif kind == "i":
+        values = [int(val) for val in values]
+    return np.asarray(values, dtype=dtype)
+
+
+def read_beh_sidecar(fname, columns=None):
+    """Read columns from a behavioral sidecar file.
+
+    Parameters
+    ----------
+    fname : pathlib.Path
+        The sidecar file to read.
+    columns : list of str | None
+        The columns to read. Only these are loaded from the file. If None,
+        read all columns.
+
+    Returns
+    -------
+    data : dict of np.ndarray
+        The columns, with the blocks concatenated, and "finalized" (whether
+        the sidecar was finalized) if `columns` is None.
+
+    See Also
+    --------
+    BehSidecar
+    """
+    import zipfile
+
+    with zipfile.ZipFile(fname) as zf:
+        names = zf.namelist()
+        blocks = {}
+        for name in [name for name in names if "/" in name]:
+            blocks.setdefault(name.split("/")[0], []).append(name)
+        data = {}
+        for key in list(blocks) if columns is None else columns:
+            arrs = []
+            for name in blocks[key]:
+                with zf.open(name) as fin:
+                    arrs.append(np.lib.format.read_array(fin, allow_pickle=False))
+            data[key] = np.concatenate(arrs)
+        if columns is None:
+            data["finalized"] = np.array("finalized.npy" in names)
+    return data
+
+
 def calc_bonus(logfile_single, logfile_dual):
     """Calculate bonus money for a study participant.
 
@@ -159,10 +706,34 @@ def calc_bonus(logfile_single, logfile_dual):
     bonus_euro : int
         The bonus money in Euros.
     """
-    acc_overall_single, _ = calc_accuracy(logfile_single, 1)
-    acc_overall_dual, _ = calc_accuracy(logfile_dual, 1)
+    tracker_single = AccuracyTracker.from_logfile(logfile_single, 1)
+    tracker_dual = AccuracyTracker.from_logfile(logfile_dual, 1)
+    acc_overall_single, _ = tracker_single.get_accuracy()
+    acc_overall_dual, _ = tracker_dual.get_accuracy()
     accuracy = np.mean([acc_overall_single, acc_overall_dual])
 
+    bonus_euro = map_accuracy_to_bonus(accuracy)
+    print(f"Overall correct: {accuracy:g}%\nBonus money: {bonus_euro}€")
+    return bonus_euro
+
+
+def map_accuracy_to_bonus(accuracy):
+    """Map accuracy to bonus money for a study participant.
+
+    Parameters
+    ----------
+    accuracy : float
+        The mean of the overall % correct trials in single and dual stream tasks.
+
+    Returns
+    -------
+    bonus_euro : int
+        The bonus money in Euros, between 0 and 10.
+
+    See Also
+    --------
+    calc_bonus
+    """
     # map accuracy to money
     acc = int(np.ceil(accuracy))
     # smaller than 55 = 0 € (should not happen = chance level)
@@ -181,5 +752,4 @@ def calc_bonus(logfile_single, logfile_dual):
 
     # We round up to next euro
     bonus_euro = int(np.ceil(bonus_euro))
-    print(f"Overall correct: {accuracy:g}%\nBonus money: {bonus_euro}€")
     return bonus_euro
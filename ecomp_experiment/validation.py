@@ -0,0 +1,280 @@
+"""Check the integrity of the behavioral logfiles of all sessions.
+
+The trials of all sessions are checked at once, in vectorized form:
+
+- the samples follow the rules of define_trials.gen_trial (digits from 1 to 9,
+  half of them of each color),
+- "ambiguous" and "correct" equal the values recomputed from the samples and the
+  choice, as in define_trials.evaluate_trial_correct (the correctness of ambiguous
+  trials is random, so for them, only its presence is checked),
+- "choice" is consistent with "direction" and "state", as in utils.map_key_to_choice,
+- the trial indices count up from 0 without gaps,
+- the single and dual stream sessions of a participant have the same trials, if
+  SAME_TRIALS_OVER_CONDITIONS was True (and ADAPTIVE_DIFFICULTY was False) when
+  they were recorded, as saved in their ``*_info.json`` files (for sessions that
+  were recorded before these settings were saved, the current settings are used).
+
+To check all sessions, e.g., after each session, run from the root of the
+repository::
+
+    python -m ecomp_experiment.validation
+
+"""
+
+import itertools
+
+import numpy as np
+
+from ecomp_experiment.define_settings import (
+    ADAPTIVE_DIFFICULTY,
+    KEYLIST_DICT,
+    NSAMPLES,
+    SAME_TRIALS_OVER_CONDITIONS,
+)
+from ecomp_experiment.utils import map_key_to_choice
+
+# the columns of the report that count problems, see validate_cohort
+CHECKS = [
+    "n_bad_samples",
+    "n_bad_ambiguous",
+    "n_bad_correct",
+    "n_bad_choice",
+    "n_bad_trial_index",
+    "n_bad_same_trials",
+]
+
+
+def rescore_trials(df):
+    """Recompute whether trials were ambiguous, and whether choices were correct.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The trials, with columns "stream", "choice", "correct", and the sample
+        columns, e.g., the cohort table (see cohort.load_cohort).
+
+    Returns
+    -------
+    rescored : pandas.DataFrame
+        The recomputed "correct" and "ambiguous" columns, with the index of `df`.
+        As in define_trials.evaluate_trial_correct, "correct" is missing if there
+        was no choice. For ambiguous trials, the logged (random) "correct" is kept.
+    """
+    import pandas as pd
+
+    samples = df[[f"sample{i + 1}" for i in range(NSAMPLES)]].to_numpy(int)
+    digits = np.abs(samples)
+    red = samples < 0
+    dual = (df["stream"] == "dual").to_numpy()
+    choice = df["choice"].to_numpy(dtype=object)
+
+    # compare means by cross-multiplying sums and counts, to stay in integers
+    n_red = red.sum(axis=1)
+    n_blue = samples.shape[1] - n_red
+    sum_red = np.where(red, digits, 0).sum(axis=1)
+    sum_blue = digits.sum(axis=1) - sum_red
+    order_dual = np.sign(sum_red * n_blue - sum_blue * n_red)
+    order_single = np.sign(digits.sum(axis=1) - 5 * samples.shape[1])
+    order = np.where(dual, order_dual, order_single)
+
+    # the first option of each stream is correct if order > 0
+    first = np.where(dual, "red", "higher")
+    second = np.where(dual, "blue", "lower")
+    ambiguous = order == 0
+    correct = ((order > 0) & (choice == first)) | ((order < 0) & (choice == second))
+
+    correct = pd.array(correct, dtype="boolean")
+    logged = df["correct"].astype("boolean").array
+    correct[ambiguous] = logged[ambiguous]
+    correct[df["choice"].isna().to_numpy()] = pd.NA
+    return pd.DataFrame(dict(correct=correct, ambiguous=ambiguous), index=df.index)
+
+
+def get_expected_choices(df):
+    """Get the choices expected from the pressed key and the state of the stimuli.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The trials, with columns "stream", "state", and "direction".
+
+    Returns
+    -------
+    choices : np.ndarray of object, shape(n_trials,)
+        The choices as mapped by utils.map_key_to_choice, and "n/a" for trials
+        without a pressed key.
+    """
+    # look up the choice of each combination of stream, state, and direction
+    streams = ["single", "dual"]
+    directions = ["left", "right"]
+    table = np.empty((len(streams), 2, len(directions)), dtype=object)
+    for (istream, stream), state, (idirection, direction) in itertools.product(
+        enumerate(streams), [0, 1], enumerate(directions)
+    ):
+        key = KEYLIST_DICT[direction][0]
+        table[istream, state, idirection] = map_key_to_choice(key, state, stream)
+
+    istream = df["stream"].map({stream: i for i, stream in enumerate(streams)})
+    idirection = df["direction"].map({d: i for i, d in enumerate(directions)})
+    valid = (istream.notna() & idirection.notna() & df["state"].isin([0, 1])).to_numpy()
+    choices = np.full(df.shape[0], "n/a", dtype=object)
+    choices[valid] = table[
+        istream.to_numpy()[valid].astype(int),
+        df["state"].to_numpy()[valid].astype(int),
+        idirection.to_numpy()[valid].astype(int),
+    ]
+    return choices
+
+
+def get_same_trials(df):
+    """Get whether each participant's sessions should have the same trials.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The cohort table, see cohort.load_cohort.
+
+    Returns
+    -------
+    same_trials : pandas.Series
+        Per subject, whether SAME_TRIALS_OVER_CONDITIONS was True and
+        ADAPTIVE_DIFFICULTY was False in all sessions, as recorded in the
+        "same_trials_over_conditions" and "adaptive_difficulty" columns. Where
+        they were not recorded, the current settings are used.
+    """
+    import pandas as pd
+
+    recorded = dict(
+        same_trials_over_conditions=SAME_TRIALS_OVER_CONDITIONS,
+        adaptive_difficulty=ADAPTIVE_DIFFICULTY,
+    )
+    for column, setting in recorded.items():
+        values = df[column] if column in df else pd.Series(None, index=df.index)
+        recorded[column] = values.astype("boolean").fillna(setting)
+    same = recorded["same_trials_over_conditions"] & ~recorded["adaptive_difficulty"]
+    return same.astype(bool).groupby(df["subject"], sort=False).all()
+
+
+def validate_cohort(df, same_trials=None):
+    """Check the integrity of the trials of all sessions.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The cohort table, see cohort.load_cohort.
+    same_trials : bool | None
+        Whether the single and dual stream sessions of each participant should
+        have the same trials. If None (default), this is decided per participant
+        from the settings their sessions were recorded with, see
+        :func:`get_same_trials`. Sessions of the "test" subject are never compared.
+
+    Returns
+    -------
+    report : pandas.DataFrame
+        One row per session (logfile), with columns "subject", "stream", "fname"
+        (relative to the experiment_data directory), "n_trials", the number of
+        trials that failed each check (see `CHECKS`, and the module docstring),
+        and "valid" (whether all checks passed). "n_bad_same_trials" is missing
+        if the trials were not compared.
+    """
+    import pandas as pd
+
+    if same_trials is None:
+        same_trials = get_same_trials(df)
+    else:
+        same_trials = pd.Series(same_trials, index=df["subject"].unique(), dtype=bool)
+
+    sample_columns = [f"sample{i + 1}" for i in range(NSAMPLES)]
+    samples = df[sample_columns].to_numpy(int)
+    digits = np.abs(samples)
+    rescored = rescore_trials(df)
+    grouped = df.groupby(["subject", "stream"], sort=False)
+    position = grouped.cumcount()
+
+    bad = pd.DataFrame(index=df.index)
+    bad["n_bad_samples"] = ((digits < 1) | (digits > 9)).any(axis=1) | (
+        (samples < 0).sum(axis=1) != NSAMPLES // 2
+    )
+    bad["n_bad_ambiguous"] = df["ambiguous"].to_numpy(bool) != rescored["ambiguous"]
+    logged = df["correct"].astype("boolean")
+    bad["n_bad_correct"] = (logged.isna() != rescored["correct"].isna()) | (
+        logged != rescored["correct"]
+    ).fillna(False)
+    choice = df["choice"].fillna("n/a").to_numpy(dtype=object)
+    bad["n_bad_choice"] = choice != get_expected_choices(df)
+    bad["n_bad_trial_index"] = df["trial"].to_numpy() != position.to_numpy()
+
+    report = bad.groupby([df["subject"], df["stream"]], sort=False).sum()
+    report.insert(0, "n_trials", grouped.size())
+
+    # compare the trials of the two streams, at the same positions in the sessions
+    n_bad = pd.Series(dtype=int)
+    if same_trials.any():
+        indexed = df[sample_columns].set_index([df["subject"], df["stream"], position])
+        single = indexed.xs("single", level="stream")
+        dual = indexed.xs("dual", level="stream")
+        single, dual = single.align(dual, join="inner")
+        n_bad = (single != dual).any(axis=1).groupby(level=0).sum()
+        n_bad = n_bad[same_trials[n_bad.index].to_numpy()]
+        n_bad = n_bad.drop("test", errors="ignore")
+    subjects = report.index.get_level_values("subject")
+    report["n_bad_same_trials"] = pd.array(subjects.map(n_bad), dtype="Int64")
+
+    report = report.reset_index()
+    report.insert(
+        2,
+        "fname",
+        [
+            f"sub-{subject}/{stream}/sub-{subject}_stream-{stream}_beh.tsv"
+            for subject, stream in zip(report["subject"], report["stream"])
+        ],
+    )
+    report["valid"] = (report[CHECKS].fillna(0) == 0).all(axis=1).astype(bool)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from pathlib import Path
+    from time import perf_counter
+
+    from ecomp_experiment.cohort import get_data_dir, load_cohort
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="The experiment_data directory. Defaults to the one in this repository.",
+    )
+    parser.add_argument(
+        "--n-jobs", type=int, default=1, help="Number of processes for parsing."
+    )
+    parser.add_argument(
+        "--include-test",
+        action="store_true",
+        help="Also check the sessions of the test subject.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="TSV file to write the report to.",
+    )
+    args = parser.parse_args()
+
+    start = perf_counter()
+    data_dir = get_data_dir() if args.data_dir is None else args.data_dir
+    df = load_cohort(data_dir, n_jobs=args.n_jobs, include_test=args.include_test)
+    report = validate_cohort(df)
+    print(report.to_string(index=False))
+    n_invalid = (~report["valid"]).sum()
+    print(
+        f"\nSessions: {report.shape[0]} ({n_invalid} with problems), "
+        f"checked in {perf_counter() - start:.2f} s"
+    )
+    if args.output is not None:
+        report.to_csv(args.output, sep="\t", index=False, na_rep="n/a")
+        print(f"Written to: {args.output}")
+    sys.exit(1 if n_invalid > 0 else 0)
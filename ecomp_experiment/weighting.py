@@ -0,0 +1,251 @@
+"""Estimate how much each sample influenced the choices of participants.
+
+Choices are regressed on the samples of each trial with a logistic regression
+(reverse correlation), which gives a weighting kernel:
+
+- "position": one weight per sample position (sample1 ... sample10), for the
+  evidence of each sample: its distance from the midpoint (5) in the single stream,
+  and its value signed by its color (blue positive) in the dual stream.
+- "value": one weight per digit value (1 ... 9), for the number of times it
+  was shown in a trial (in the dual stream, blue minus red).
+
+The models of all participants and streams are fitted at once, by iteratively
+reweighted least squares on stacked design matrices. To print the group kernels
+of all participants, run from the root of the repository::
+
+    python -m ecomp_experiment.weighting --kind position
+
+"""
+
+import numpy as np
+
+from ecomp_experiment.define_settings import NSAMPLES
+
+# the choice that is coded as 1 in each stream, i.e., the direction of the kernels
+POSITIVE_CHOICES = dict(single="higher", dual="blue")
+
+
+def make_design(samples, streams, kind="position"):
+    """Make the design matrix of a weighting kernel.
+
+    Parameters
+    ----------
+    samples : np.ndarray, shape(n_trials, nsamples)
+        The samples of each trial, negative for red and positive for blue.
+    streams : np.ndarray of str, shape(n_trials,)
+        The stream of each trial, "single" or "dual".
+    kind : {"position", "value"}
+        The kind of kernel, see the module docstring.
+
+    Returns
+    -------
+    X : np.ndarray, shape(n_trials, n_regressors + 1)
+        The design matrix, with the intercept in the last column.
+    regressors : list of str
+        The names of the columns of `X`.
+    """
+    samples = np.asarray(samples)
+    digits = np.abs(samples)
+    dual = (np.asarray(streams) == "dual")[:, np.newaxis]
+    midpoint = 5
+
+    if kind == "position":
+        evidence = np.where(dual, np.sign(samples) * digits, digits - midpoint)
+        regressors = [f"sample{i + 1}" for i in range(samples.shape[1])]
+    elif kind == "value":
+        values = np.arange(1, 10)
+        shown = digits[..., np.newaxis] == values
+        signs = np.where(dual, np.sign(samples), 1)[..., np.newaxis]
+        evidence = (shown * signs).sum(axis=1)
+        regressors = [str(value) for value in values]
+    else:
+        raise ValueError(f"Unknown kind of kernel: {kind}")
+
+    X = np.concatenate([evidence, np.ones((samples.shape[0], 1))], axis=1)
+    return X.astype(float), regressors + ["intercept"]
+
+
+def fit_logistic_batch(X, y, mask=None, alpha=1e-3, max_iter=100, tol=1e-8):
+    """Fit many logistic regressions at once.
+
+    Each regression is fitted by Newton's method (iteratively reweighted least
+    squares), with all regressions in one stack of matrices. The weights are
+    penalized by ``alpha / 2`` times their squared sum, except for the last
+    column (the intercept). The penalty keeps the fits finite for separable data,
+    and selects the solution with the smallest weights if they are not identified,
+    e.g., weights of digit values are only identified up to an added constant.
+
+    Parameters
+    ----------
+    X : np.ndarray, shape(n_fits, n_trials, n_regressors)
+        The design matrices, with the intercept in the last column.
+    y : np.ndarray, shape(n_fits, n_trials)
+        The binary outcomes.
+    mask : np.ndarray of bool, shape(n_fits, n_trials) | None
+        Which trials to include in each fit, e.g., to stack fits with
+        different numbers of trials. If None (default), include all trials.
+    alpha : float
+        The strength of the penalty. Defaults to 1e-3.
+    max_iter : int
+        The maximum number of Newton steps. Defaults to 100.
+    tol : float
+        Stop when no weight changes by more than `tol`. Defaults to 1e-8.
+
+    Returns
+    -------
+    weights : np.ndarray, shape(n_fits, n_regressors)
+        The fitted weights.
+    se : np.ndarray, shape(n_fits, n_regressors)
+        The standard errors of the weights, from the inverse Hessian.
+    converged : np.ndarray of bool, shape(n_fits,)
+        Whether each fit converged within `max_iter` steps.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mask = np.ones(y.shape, dtype=bool) if mask is None else np.asarray(mask)
+    n_fits, _, n_regressors = X.shape
+
+    penalty = np.full(n_regressors, alpha)
+    penalty[-1] = 0
+    weights = np.zeros((n_fits, n_regressors))
+    converged = np.zeros(n_fits, dtype=bool)
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-np.einsum("ftr,fr->ft", X, weights)))
+        w = mask * p * (1 - p)
+        hessian = np.einsum("ftr,ft,fts->frs", X, w, X) + np.diag(penalty)
+        gradient = np.einsum("ftr,ft->fr", X, mask * (y - p)) - penalty * weights
+        step = np.linalg.solve(hessian, gradient[..., np.newaxis])[..., 0]
+
+        # only update the fits that have not converged yet
+        step[converged] = 0
+        weights += step
+        converged |= np.abs(step).max(axis=1) < tol
+        if converged.all():
+            break
+
+    # standard errors at the solution
+    p = 1 / (1 + np.exp(-np.einsum("ftr,fr->ft", X, weights)))
+    w = mask * p * (1 - p)
+    hessian = np.einsum("ftr,ft,fts->frs", X, w, X) + np.diag(penalty)
+    se = np.sqrt(np.diagonal(np.linalg.inv(hessian), axis1=1, axis2=2))
+    return weights, se, converged
+
+
+def fit_kernels(df, kind="position", alpha=1e-3):
+    """Fit the weighting kernel of each participant and stream.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The cohort table, see cohort.load_cohort. Trials without a valid
+        choice (timeouts) are ignored.
+    kind : {"position", "value"}
+        The kind of kernel, see the module docstring.
+    alpha : float
+        The strength of the penalty, see :func:`fit_logistic_batch`.
+
+    Returns
+    -------
+    kernels : pandas.DataFrame
+        One row per participant, stream, and regressor, with columns "subject",
+        "stream", "regressor", "weight", "se", "n_trials", and "converged".
+        Positive weights mean that evidence made "higher" (single stream) or
+        "blue" (dual stream) choices more likely.
+    """
+    import pandas as pd
+
+    df = df[df["choice"].isin(["lower", "higher", "red", "blue"])]
+    samples = df[[f"sample{i + 1}" for i in range(NSAMPLES)]].to_numpy()
+    streams = df["stream"].to_numpy(dtype=str)
+    X, regressors = make_design(samples, streams, kind=kind)
+    y = (df["choice"] == df["stream"].map(POSITIVE_CHOICES)).to_numpy()
+
+    # stack the trials of each participant and stream, padded to equal lengths
+    grouped = df.groupby(["subject", "stream"], sort=True)
+    ifit = grouped.ngroup().to_numpy()
+    itrial = grouped.cumcount().to_numpy()
+    n_fits = grouped.ngroups
+    n_trials = np.bincount(ifit, minlength=n_fits)
+    n_max = n_trials.max(initial=0)
+    X_stack = np.zeros((n_fits, n_max, X.shape[1]))
+    y_stack = np.zeros((n_fits, n_max))
+    mask = np.zeros((n_fits, n_max), dtype=bool)
+    X_stack[ifit, itrial] = X
+    y_stack[ifit, itrial] = y
+    mask[ifit, itrial] = True
+
+    weights, se, converged = fit_logistic_batch(X_stack, y_stack, mask, alpha=alpha)
+
+    # the keys of the fits, in the order of their numbers from ngroup
+    keys = grouped.size().index
+    n_regressors = len(regressors)
+    kernels = pd.DataFrame(
+        dict(
+            subject=np.repeat(keys.get_level_values("subject"), n_regressors),
+            stream=np.repeat(keys.get_level_values("stream"), n_regressors),
+            regressor=np.tile(regressors, n_fits),
+            weight=weights.ravel(),
+            se=se.ravel(),
+            n_trials=np.repeat(n_trials, n_regressors),
+            converged=np.repeat(converged, n_regressors),
+        )
+    )
+    return kernels
+
+
+def summarize_kernels(kernels):
+    """Summarize the kernels of participants at the group level.
+
+    Parameters
+    ----------
+    kernels : pandas.DataFrame
+        The kernels of each participant, see :func:`fit_kernels`.
+
+    Returns
+    -------
+    group : pandas.DataFrame
+        One row per stream and regressor (in the order of the regressors), with
+        columns "stream", "regressor", "mean", "sem" (standard error of the mean
+        over participants), and "n_subjects".
+    """
+    grouped = kernels.groupby(["stream", "regressor"], sort=False)["weight"]
+    group = grouped.agg(["mean", "sem", "count"]).reset_index()
+    return group.rename(columns=dict(count="n_subjects"))
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    from ecomp_experiment.cohort import get_data_dir, load_cohort
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="The experiment_data directory. Defaults to the one in this repository.",
+    )
+    parser.add_argument(
+        "--kind",
+        choices=["position", "value"],
+        default="position",
+        help="The kind of kernel.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="TSV file to write the kernels of each participant to.",
+    )
+    args = parser.parse_args()
+
+    data_dir = get_data_dir() if args.data_dir is None else args.data_dir
+    kernels = fit_kernels(load_cohort(data_dir), kind=args.kind)
+    n_failed = (~kernels.groupby(["subject", "stream"])["converged"].all()).sum()
+    if n_failed > 0:
+        print(f"Fits that did not converge: {n_failed}")
+    print(summarize_kernels(kernels).to_string(index=False))
+    if args.output is not None:
+        kernels.to_csv(args.output, sep="\t", index=False)
+        print(f"\nWritten to: {args.output}")